@@ -0,0 +1,79 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+ACCESS_LOG_PATH = os.getenv("ACCESS_LOG_PATH", "access_log.jsonl")
+# The log is rotated to ACCESS_LOG_PATH + ".1" once it grows past this size
+ACCESS_LOG_MAX_BYTES = int(os.getenv("ACCESS_LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+# Free-text request fields that may identify a student; they are stored as
+# digests, so their popularity is still counted without keeping the text
+ACCESS_LOG_PRIVATE_FIELDS = ("question", "background")
+# Secret mixed into the digests, so common questions cannot be confirmed by hashing them
+ACCESS_LOG_HASH_KEY = os.getenv("ACCESS_LOG_HASH_KEY", "")
+
+_DIGEST_PREFIX = "hmac:"
+
+
+def redact(fields):
+    """Replace the private fields of a request with short keyed digests."""
+    return {
+        name: _digest(value) if name in ACCESS_LOG_PRIVATE_FIELDS and value is not None else value
+        for name, value in fields.items()
+    }
+
+
+def _digest(value):
+    mac = hmac.new(ACCESS_LOG_HASH_KEY.encode("utf-8"), str(value).encode("utf-8"), hashlib.sha256)
+    return _DIGEST_PREFIX + mac.hexdigest()[:16]
+
+
+def is_redacted(value):
+    return isinstance(value, str) and value.startswith(_DIGEST_PREFIX)
+
+
+class AccessLog:
+    """
+    Append-only JSON Lines log of generation requests.
+
+    One line per /quiz or /tutor request with its kind, timestamp and the
+    fields that identify the generated content. Only one rotated file is
+    kept, so disk usage stays bounded.
+    """
+
+    def __init__(self, path=ACCESS_LOG_PATH, max_bytes=ACCESS_LOG_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def record(self, kind, **fields):
+        entry = {"ts": round(time.time(), 3), "kind": kind, **fields}
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except OSError as e:
+            logger.warning(f"Failed to write access log: {str(e)}")
+
+    def entries(self, since=None):
+        """Stream entries (oldest first), optionally only those newer than `since`."""
+        for path in (self.path + ".1", self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash
+                        continue
+                    if since is None or entry.get("ts", 0) >= since:
+                        yield entry
@@ -0,0 +1,242 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Per-endpoint limits; the queue deadline is the longest a request may wait
+# for a slot before it is shed with a 503
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+ADMISSION_QUEUE_DEADLINE = float(os.getenv("ADMISSION_QUEUE_DEADLINE", "10"))
+# Waiting requests one tenant may hold, so it cannot fill the whole queue
+ADMISSION_TENANT_MAX_QUEUE = int(os.getenv("ADMISSION_TENANT_MAX_QUEUE", "8"))
+
+# Initial guess for how long one generation takes, refined as requests finish
+_INITIAL_SERVICE_TIME = 5.0
+_SERVICE_TIME_SMOOTHING = 0.2
+# How often a running generation checks whether its client went away
+_DISCONNECT_POLL_INTERVAL = 0.5
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted within the queue deadline."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client goes away while its generation is running."""
+
+
+class AdmissionController:
+    """
+    Bounded concurrency with a bounded, deadline-aware, fair-share wait queue.
+
+    Queue time is estimated from the number of requests ahead and a moving
+    average of recent service times. Requests whose estimated wait exceeds
+    the deadline are rejected up front instead of timing out in the queue.
+
+    Waiting requests are queued per tenant. A freed slot goes to the tenant
+    with the fewest generations in flight (the least recently served among
+    equals), and a tenant never holds more than its `tenant_max_in_flight`
+    slots, so one class running a batch cannot starve the others.
+
+    Queue capacity is shared the same way: when the queue is full, a tenant
+    holding less than an equal share of it takes the place of the newest
+    waiter of the tenant holding the most, which is shed with a 503.
+    """
+
+    def __init__(self, name, max_in_flight=ADMISSION_MAX_IN_FLIGHT, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_deadline=ADMISSION_QUEUE_DEADLINE, tenant_max_in_flight=None,
+                 tenant_max_queue=ADMISSION_TENANT_MAX_QUEUE):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_deadline = queue_deadline
+        # int, or a callable mapping a tenant to its limit; unlimited if None
+        self.tenant_max_in_flight = tenant_max_in_flight
+        self.tenant_max_queue = tenant_max_queue
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.service_time = _INITIAL_SERVICE_TIME
+        self._tenant_in_flight = {}
+        # Tenant -> deque of futures; kept while the tenant has requests in flight
+        self._queues = OrderedDict()
+        # Ties go to the tenant served least recently, or never
+        self._served = 0
+        self._served_at = {}
+
+    def _tenant_limit(self, tenant):
+        if self.tenant_max_in_flight is None:
+            return self.max_in_flight
+        if callable(self.tenant_max_in_flight):
+            return self.tenant_max_in_flight(tenant)
+        return self.tenant_max_in_flight
+
+    def _can_start(self, tenant):
+        return (self.in_flight < self.max_in_flight
+                and self._tenant_in_flight.get(tenant, 0) < self._tenant_limit(tenant))
+
+    def _grant(self, tenant):
+        self.in_flight += 1
+        self._tenant_in_flight[tenant] = self._tenant_in_flight.get(tenant, 0) + 1
+
+    def _dispatch(self):
+        """Hand free slots to waiting requests, least-served eligible tenant first."""
+        while self.in_flight < self.max_in_flight:
+            eligible = [tenant for tenant, queue in self._queues.items() if queue and self._can_start(tenant)]
+            if not eligible:
+                return
+            tenant = min(eligible, key=lambda t: (self._tenant_in_flight.get(t, 0), self._served_at.get(t, 0)))
+            future = self._queues[tenant].popleft()
+            self._served += 1
+            self._served_at[tenant] = self._served
+            self.waiting -= 1
+            self._grant(tenant)
+            future.set_result(None)
+
+    def estimated_wait(self, waiting=None):
+        """Seconds a new request would wait for a slot, with `waiting` requests (default: current) ahead of it."""
+        waiting = self.waiting if waiting is None else waiting
+        if self.in_flight < self.max_in_flight and waiting == 0:
+            return 0.0
+        ahead = waiting + 1
+        return math.ceil(ahead / self.max_in_flight) * self.service_time
+
+    def _reject(self, reason):
+        self.rejected += 1
+        retry_after = max(1, math.ceil(self.estimated_wait()))
+        logger.warning(f"Shedding {self.name} request: {reason}")
+        raise Overloaded(reason, retry_after)
+
+    async def acquire(self, tenant=None):
+        """Wait for a slot, or raise Overloaded if none will free up in time."""
+        if self._can_start(tenant):
+            # Free slots are always handed to eligible waiters first, so none are ahead
+            self._grant(tenant)
+            return time.monotonic()
+
+        # Every rejection is decided before another tenant's waiter is shed,
+        # so one slot never costs two clients a 503
+        victim = None
+        if self.waiting >= self.max_queue:
+            victim = self._eviction_victim(tenant)
+            if victim is None:
+                self._reject("wait queue is full")
+        if len(self._queues.get(tenant, ())) >= self.tenant_max_queue:
+            self._reject("tenant wait queue is full")
+        if self.estimated_wait(self.waiting - (victim is not None)) > self.queue_deadline:
+            self._reject("estimated queue time exceeds deadline")
+        if victim is not None:
+            self._evict(victim, tenant)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(tenant, deque()).append(future)
+        self.waiting += 1
+        try:
+            await asyncio.wait({future}, timeout=self.queue_deadline)
+        except BaseException:
+            # Cancelled while waiting: give back a slot granted in the meantime
+            if future.done() and future.exception() is None:
+                self._free(tenant)
+            else:
+                self._withdraw(tenant, future)
+            raise
+        if not future.done():
+            self._withdraw(tenant, future)
+            self._reject("queue deadline exceeded")
+        if future.exception() is not None:
+            raise future.exception()
+        return time.monotonic()
+
+    def _eviction_victim(self, tenant):
+        """The tenant whose newest waiter would make room for `tenant` in a full queue, or None."""
+        tenants = {t for t, queue in self._queues.items() if queue} | {tenant}
+        share = self.max_queue // len(tenants)
+        if len(self._queues.get(tenant, ())) >= share:
+            return None
+        heaviest = max(self._queues, key=lambda t: len(self._queues[t]))
+        if len(self._queues[heaviest]) <= share:
+            return None
+        return heaviest
+
+    def _evict(self, heaviest, tenant):
+        """Shed the newest waiter of `heaviest` to make room for `tenant`."""
+        future = self._queues[heaviest].pop()
+        self.waiting -= 1
+        self._forget_if_idle(heaviest)
+        self.rejected += 1
+        logger.warning(f"Shedding {self.name} request of {heaviest}: queue share taken by {tenant}")
+        future.set_exception(Overloaded("wait queue is full", max(1, math.ceil(self.estimated_wait()))))
+
+    def _withdraw(self, tenant, future):
+        future.cancel()
+        queue = self._queues.get(tenant)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self.waiting -= 1
+            self._forget_if_idle(tenant)
+
+    def _free(self, tenant):
+        self.in_flight -= 1
+        self._tenant_in_flight[tenant] -= 1
+        if not self._tenant_in_flight[tenant]:
+            del self._tenant_in_flight[tenant]
+            self._forget_if_idle(tenant)
+        self._dispatch()
+
+    def _forget_if_idle(self, tenant):
+        if not self._queues.get(tenant, True) and tenant not in self._tenant_in_flight:
+            del self._queues[tenant]
+            self._served_at.pop(tenant, None)
+
+    def release(self, started, tenant=None):
+        """Free a slot and fold the elapsed time into the service time estimate."""
+        elapsed = time.monotonic() - started
+        self.service_time += _SERVICE_TIME_SMOOTHING * (elapsed - self.service_time)
+        self._free(tenant)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": self.waiting,
+            "max_queue": self.max_queue,
+            "saturation": round(self.in_flight / self.max_in_flight, 2),
+            "estimated_wait_seconds": round(self.estimated_wait(), 2),
+            "avg_service_seconds": round(self.service_time, 2),
+            "rejected": self.rejected,
+            "tenants": {
+                tenant: {"in_flight": self._tenant_in_flight.get(tenant, 0),
+                         "waiting": len(self._queues.get(tenant, ()))}
+                for tenant in set(self._tenant_in_flight) | set(self._queues)
+            },
+        }
+
+
+async def run_until_disconnect(request, func, *args, **kwargs):
+    """
+    Run a blocking generation in a worker thread, abandoning it if the client disconnects.
+
+    The thread itself cannot be interrupted, so the task is stored on
+    `request.state.generation` and the admission middleware keeps the slot
+    held until it really finishes; only the response is skipped.
+    """
+
+    task = asyncio.ensure_future(asyncio.to_thread(func, *args, **kwargs))
+    request.state.generation = task
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=_DISCONNECT_POLL_INTERVAL)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            logger.info(f"Client disconnected from {request.url.path}; abandoning generation")
+            raise ClientDisconnected()
@@ -1,12 +1,28 @@
 import os
 import json
 import re
+import time
 import logging
+import threading
+import contextvars
 import httpx
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from openai import OpenAI
 from dotenv import load_dotenv
 from langchain_core.messages import HumanMessage
 
+from quiz_validation import QuestionIndex, validate_questions
+from quiz_model import Question, to_dicts
+from quiz_html import _format_quiz_with_reveal
+from llm_replay import RecordingClient, ReplayClient
+from retrieval import retrieve_context
+from profiles import get_profile, profile_metrics
+from tutor_cache import answer_key, get_tutor_cache
+from tenants import current_tenant, get_usage_store
+from translation import (TRANSLATION_MODE, TRANSLATION_SOURCE_LANGUAGE, TranslationIncomplete, needs_translation,
+                         translate_text, translate_questions)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -19,9 +35,34 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://openrouter.ai/api/v1")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "openai/gpt-3.5-turbo")
 
+# Record every completion to a corpus, or serve completions from one (see llm_replay.py)
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH")
+LLM_REPLAY_PATH = os.getenv("LLM_REPLAY_PATH")
+LLM_REPLAY_SPEED = float(os.getenv("LLM_REPLAY_SPEED", "1.0"))
+# Fail requests that have no recorded completion instead of replaying an unrelated one
+LLM_REPLAY_STRICT = os.getenv("LLM_REPLAY_STRICT", "0") == "1"
+
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in the .env file.")
 
+# Repairing a quiz: invalid or missing questions are re-requested in small
+# concurrent batches until the latency budget (seconds) runs out
+QUIZ_REPAIR_BUDGET_SECONDS = float(os.getenv("QUIZ_REPAIR_BUDGET_SECONDS", "15"))
+QUIZ_REPAIR_BATCH_SIZE = int(os.getenv("QUIZ_REPAIR_BATCH_SIZE", "2"))
+QUIZ_REPAIR_MAX_WORKERS = 4
+QUIZ_REPAIR_MAX_ROUNDS = 2
+
+# Recently generated questions kept per (subject, level); new quizzes may not
+# near-duplicate them, so consecutive and banked quizzes differ. 0 disables.
+QUIZ_DEDUP_WINDOW = int(os.getenv("QUIZ_DEDUP_WINDOW", "500"))
+# Recent questions listed in repair prompts as "do not repeat"
+QUIZ_DEDUP_AVOID = 20
+
+# Translations go through a separate (ideally smaller, cheaper) model
+TRANSLATION_MODEL = os.getenv("TRANSLATION_MODEL", OPENAI_MODEL)
+# Generation profile whose timeout bounds translation calls; GENERATION_PROFILE if unset
+TRANSLATION_PROFILE = os.getenv("TRANSLATION_PROFILE")
+
 
 # Initialize the OpenAI client at module level
 client = None
@@ -30,8 +71,14 @@ client = None
 
 # In ai_engine.py, update the client initialization to include headers required by OpenRouter
 
-def get_llm():
+def get_llm(profile=None, kind="tutor"):
+    """
+    Return a prompt -> completion function using the decoding parameters of
+    a generation profile (see profiles.py). `kind` labels its calls in the
+    per-profile metrics.
+    """
     global client
+    profile = get_profile(profile)
     try:
         if client is None:
             # Initialize the OpenAI client with proper configuration
@@ -49,12 +96,8 @@ def get_llm():
         
         def generate_response(prompt):
             try:
-                response = client.chat.completions.create(
-                    model=OPENAI_MODEL,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=0.7
-                )
-                return response.choices[0].message.content
+                return _chat_completion([{"role": "user", "content": prompt}], profile, kind,
+                                        profile.tutor_params())
             except Exception as e:
                 logger.error(f"Error generating response: {str(e)}")
                 raise Exception(f"Failed to generate response: {str(e)}")
@@ -110,11 +153,41 @@ except Exception as e:
     logger.error(f"Failed to initialize OpenAI client: {str(e)}")
     raise
 
+if LLM_REPLAY_PATH:
+    logger.info(f"Replaying LLM completions from {LLM_REPLAY_PATH}")
+    client = ReplayClient(LLM_REPLAY_PATH, speed=LLM_REPLAY_SPEED, strict=LLM_REPLAY_STRICT)
+elif LLM_RECORD_PATH:
+    logger.info(f"Recording LLM completions to {LLM_RECORD_PATH}")
+    client = RecordingClient(client, LLM_RECORD_PATH)
+
 
-def generate_tutoring_response(subject, level, question, learning_style, background, language):
+def _chat_completion(messages, profile, kind, params, model=OPENAI_MODEL):
+    """Helper function to call the chat completions API and record per-profile and per-tenant usage"""
+
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(model=model, messages=messages, **params)
+    except Exception as e:
+        profile_metrics.record(profile.name, kind, time.perf_counter() - started, error=e)
+        get_usage_store().record(current_tenant.get(), time.perf_counter() - started, error=e)
+        raise
+
+    choice = response.choices[0]
+    latency = time.perf_counter() - started
+    usage = getattr(response, "usage", None)
+    profile_metrics.record(profile.name, kind, latency, usage=usage, finish_reason=getattr(choice, "finish_reason", None))
+    get_usage_store().record(current_tenant.get(), latency, usage=usage)
+    return choice.message.content
+
+
+def generate_tutoring_response(subject, level, question, learning_style, background, language, profile=None):
     """
     Generate a personalized tutoring response based on user preferences.
 
+    Answers are generated once in TRANSLATION_SOURCE_LANGUAGE, persisted in the
+    tutor answer cache and translated segment by segment for other languages
+    (see translation.py).
+
     Args:
          subject (str): The academic subject
          level (str): Learning level (Beginner, Intermediate, Advanced)
@@ -122,13 +195,44 @@ def generate_tutoring_response(subject, level, question, learning_style, backgro
          learning_style (str): Preferred learning style (visual Text-based, Hands-on)
          background (str): User's background knowledge
          language (str): Preferred language for response
+         profile (str): Generation profile name (fast, balanced, thorough)
 
     Returns:
          str: Formatted tutoring response
     """
-    
+
+    if TRANSLATION_MODE != "memory":
+        return _generate_tutoring_text(subject, level, question, learning_style, background, language, profile)
+
+    cache = get_tutor_cache()
+    key = answer_key(subject, level, question, learning_style, background, get_profile(profile).name)
+    canonical = cache.get(key)
+    if canonical is None:
+        canonical = _generate_tutoring_text(subject, level, question, learning_style, background,
+                                            TRANSLATION_SOURCE_LANGUAGE, profile)
+        cache.put(key, canonical)
+    else:
+        get_usage_store().record_cache_hit(current_tenant.get())
+
+    if not needs_translation(language):
+        return canonical
+    failed = []
+    try:
+        translated = translate_text(canonical, language, _request_translation, failed=failed)
+    except Exception as e:
+        logger.error(f"Error translating tutoring response: {str(e)}")
+        raise Exception(f"Error translating explanation: {str(e)}")
+    if failed:
+        # A half-English answer must not be served or cached as the translation
+        raise TranslationIncomplete(language, len(failed))
+    return translated
+
+
+def _generate_tutoring_text(subject, level, question, learning_style, background, language, profile=None):
+    """Helper function to generate a tutoring response directly in `language`"""
+
     # Get LLM instance
-    llm = get_llm()
+    llm = get_llm(profile)
     
     # Construct an effective prompt
     prompt = f"""
@@ -146,6 +250,9 @@ def generate_tutoring_response(subject, level, question, learning_style, backgro
     while considering all the above factors.
     """
 
+    # Ground the answer in the most relevant course material, if an index exists
+    prompt += _format_course_material(subject, question)
+
     try:
         # Generate response with error handling
         logger.info(f"Generating tutoring response for subject: {subject}, level: {level}")
@@ -159,6 +266,26 @@ def generate_tutoring_response(subject, level, question, learning_style, backgro
         raise Exception(f"Error generating explanation: {str(e)}")
 
 
+def _format_course_material(subject, question):
+    """Helper function to build a prompt section from the top-k retrieved chunks"""
+
+    try:
+        chunks = retrieve_context(f"{subject} {question}")
+    except Exception as e:
+        logger.warning(f"Course material retrieval failed: {str(e)}")
+        return ""
+
+    if not chunks:
+        return ""
+
+    material = "\n\n".join(f"[{i}] {chunk['text']}" for i, chunk in enumerate(chunks, 1))
+    return f"""
+    Use the following course material where it is relevant:
+
+    {material}
+    """
+
+
 def _create_tutoring_prompt(subject, level, question, learning_style, background, language):
     """Helper function to create a well-structured tutoring prompt"""
      
@@ -213,13 +340,14 @@ def _create_quiz_prompt(subject, level, num_questions):
     3. Include an explanation for the correct answer
     4. Questions should cover different aspects of {subject}
     5. Format your response as a JSON array of question objects
+    6. "correct_answer" must be the exact text of the correct option
     
     RESPONSE FORMAT:
     [
         {{
             "question": "Sample question?",
             "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
-            "correct_answer": "a",
+            "correct_answer": "Option 1",
             "explanation": "Explanation of why this is the correct answer"
         }}
     ]
@@ -260,84 +388,197 @@ def generate_quiz(subject, level, num_questions):
 
 
 
-def _create_fallback_quiz(subject, num_questions):
-    """Helper function to create a fallback quiz if parsing fails"""
+_question_indexes = {}
+_question_indexes_lock = threading.Lock()
 
-    logger.warning(f"Using feedback quiz for {subject}")
-    return [
-        {
-            "question": f"Sample {subject} question #{i+1}",
-            "options": ["Option A", "Option B", "Option C", "Option D"],
-            "correct_answer": "Option A",
-            "explanation": "This is a fallback explanation."
-        }
-        for i in range (num_questions)
-    ]
 
+def _question_index(subject, level):
+    """Index of the questions recently generated for a subject and level, or None if disabled"""
 
-def _validate_quiz_data(quiz_data):
-    """Helper function to validate quiz data structure"""
+    if QUIZ_DEDUP_WINDOW <= 0:
+        return None
+    with _question_indexes_lock:
+        index = _question_indexes.get((subject, level))
+        if index is None:
+            index = _question_indexes[(subject, level)] = QuestionIndex(max_size=QUIZ_DEDUP_WINDOW)
+        return index
 
-    if not isinstance(quiz_data, list):
-        raise ValueError("Quiz data must be a list of questions")
 
-    for question in quiz_data:
-        if not isinstance(question, dict):
-            raise ValueError("Each quiz item must be a dictionary")
+def _extract_quiz_json(response_content):
+    """Helper function to pull the JSON array out of an LLM completion"""
 
-        if not all(key in question for key in ["question", "options", "correct_answer"]):
-            raise ValueError("Each quiz item must have question, options, correct_answer")
+    # Try to find JSON content using regex
+    json_match = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', response_content)
 
-    if not isinstance(question["options"], list) or len(question["options"]) !=4:
-        raise ValueError("Each question must have exactly 4 options")
+    if json_match:
+        # Extract JSON from code block
+        return json_match.group(1)
 
+    # Try to find raw JSON array
+    json_match = re.search(r'\[\s*\{.*\}\s*\]', response_content, re.DOTALL)
+    if json_match:
+        return json_match.group(0)
 
+    # Assume the entire response is JSON
+    return response_content
 
 
-def _parse_quiz_response(response_content, subject, num_questions):
-    """Helper function to parse and validate the quiz response"""
+def _request_quiz_completion(subject, level, prompt, num_questions, profile):
+    """Helper function to send a quiz prompt to the chat completions API"""
 
-    try:
-        # Try to find JSON content using regex
-        json_match = re.search(r'```json\s*(\[[\s\S]*?\])\s*```', response_content)
+    content = _chat_completion(
+        [
+            {"role": "system", "content": f"You are an expert quiz creator for {subject} at the {level} level."},
+            {"role": "user", "content": prompt}
+        ],
+        profile,
+        "quiz",
+        profile.quiz_params(num_questions)
+    )
+    # The stop sequence swallows the closing bracket of the array
+    if content and content.rstrip().endswith("}") and "[" in content:
+        content = content.rstrip() + "\n]"
+    return content
+
+
+def _request_translation(prompt):
+    """Helper function to send a translation prompt to TRANSLATION_MODEL"""
+
+    profile = get_profile(TRANSLATION_PROFILE)
+    return _chat_completion(
+        [
+            {"role": "system", "content": "You are a professional translator of educational content."},
+            {"role": "user", "content": prompt}
+        ],
+        profile,
+        "translation",
+        profile.translation_params(len(prompt)),
+        model=TRANSLATION_MODEL
+    )
+
+
+def translate_quiz(quiz_result, language):
+    """
+    Translate a generate_quiz result into `language` through the translation memory.
+
+    The questions are translated as one batch of segments and the HTML is
+    re-rendered from them. Returns the result unchanged for the source language.
+    "untranslated" counts segments that failed and were left in the source language.
+    """
+
+    if not needs_translation(language):
+        return quiz_result
+    failed = []
+    translated = translate_questions(quiz_result["quiz"], language, _request_translation, failed=failed)
+    quiz_result = {**quiz_result, "quiz": translated}
+    if failed:
+        quiz_result["untranslated"] = len(failed)
+    if "formatted_quiz" in quiz_result:
+        quiz_result["formatted_quiz"] = _format_quiz_with_reveal(translated)
+    return quiz_result
+
+
+def _request_replacement_questions(subject, level, count, avoid, profile):
+    """Helper function to request `count` new questions that differ from `avoid`"""
+
+    prompt = _create_quiz_prompt(subject, level, count)
+    if avoid:
+        prompt += "\n    Do not repeat any of these existing questions:\n"
+        prompt += "\n".join(f"    - {question}" for question in avoid)
+
+    candidates = json.loads(_extract_quiz_json(_request_quiz_completion(subject, level, prompt, count, profile)))
+    return candidates if isinstance(candidates, list) else []
 
-        if json_match:
-            # Extract JSON from code block
-            quiz_json = json_match.group(1)
+
+def _merge_valid_questions(valid, candidates, num_questions, subject, index=None):
+    """Append the candidates that pass validation against `valid` and `index`, up to num_questions"""
+
+    issues = validate_questions(to_dicts(valid) + candidates, index=index)[len(valid):]
+    for candidate, problems in zip(candidates, issues):
+        if len(valid) >= num_questions:
+            break
+        if problems:
+            logger.warning(f"Replacement {subject} question rejected: {'; '.join(problems)}")
         else:
-            # Try to find raw JSON array
-            json_match = re.search(r'\[\s*\{.*\}\s*\]', response_content, re.DOTALL)
-            if json_match:
-                quiz_json = json_match.group(0)
-            else:
-                # Assume the entire response is JSON
-                quiz_json = response_content
-        # Parse the JSON 
-        quiz_data = json.loads(quiz_json)
-
-        # Validate the data structure
-        _validate_quiz_data(quiz_data)
-
-        # Ensure we have the requested number of questions
-        if len(quiz_data) > num_questions:
-            quiz_date = quiz_data[:num_questions]
-
-        # Add explanation field if missing
-        for question in quiz_data:
-            if "explanation" not in question:
-                question["explanation"] = f"The correct answer is {question['correct_answer']}."
-
-        return quiz_data
-
-    except (json.json.JSONDecodeError, ValueError) as e:
+            valid.append(Question.from_dict(candidate))
+
+
+def _repair_quiz(valid, subject, level, num_questions, budget=None, profile=None, index=None):
+    """
+    Fill the missing questions of a quiz with small, concurrent follow-up prompts.
+
+    Args:
+        valid (list): Question objects that already passed validation (extended in place)
+        subject (str): The academic subject
+        level (str): Learning level
+        num_questions (int): Target quiz size
+        budget (float): Latency budget in seconds, defaults to QUIZ_REPAIR_BUDGET_SECONDS
+        profile (str): Generation profile name for the follow-up prompts
+        index (QuestionIndex): Recently generated questions the replacements must not repeat
+
+    Returns:
+        bool: True if the quiz is complete, False if the budget ran out first
+    """
+
+    budget = QUIZ_REPAIR_BUDGET_SECONDS if budget is None else budget
+    profile = get_profile(profile)
+    deadline = time.monotonic() + budget
+    pool = ThreadPoolExecutor(max_workers=QUIZ_REPAIR_MAX_WORKERS)
+
+    try:
+        for _ in range(QUIZ_REPAIR_MAX_ROUNDS):
+            missing = num_questions - len(valid)
+            remaining = deadline - time.monotonic()
+            if missing <= 0 or remaining <= 0:
+                break
+
+            logger.info(f"Requesting {missing} replacement {subject} question(s)")
+            avoid = [question.question for question in valid]
+            if index is not None:
+                avoid += index.recent(QUIZ_DEDUP_AVOID)
+            sizes = [min(QUIZ_REPAIR_BATCH_SIZE, missing - i) for i in range(0, missing, QUIZ_REPAIR_BATCH_SIZE)]
+            # Each worker runs in a copy of this context, so its calls are billed to the same tenant
+            futures = [pool.submit(contextvars.copy_context().run, _request_replacement_questions,
+                                   subject, level, size, avoid, profile) for size in sizes]
+
+            try:
+                for future in as_completed(futures, timeout=remaining):
+                    try:
+                        _merge_valid_questions(valid, future.result(), num_questions, subject, index)
+                    except Exception as e:
+                        logger.warning(f"Replacement request for {subject} failed: {str(e)}")
+            except FutureTimeoutError:
+                logger.warning(f"Quiz repair budget of {budget}s exhausted for {subject}")
+                break
+    finally:
+        # Do not wait for stragglers; their results are simply discarded
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return len(valid) >= num_questions
+
+
+def _collect_quiz_questions(response_content, subject, num_questions, index=None):
+    """Helper function to parse a completion into Question objects, keeping only the valid ones"""
+
+    try:
+        quiz_data = json.loads(_extract_quiz_json(response_content))
+        if not isinstance(quiz_data, list):
+            raise ValueError("Quiz data must be a list of questions")
+    except (json.JSONDecodeError, ValueError) as e:
         logger.error(f"Error parsing quiz response: {str(e)}")
+        quiz_data = []
 
-        # Create a fallback quiz if parsing fails
-        return _create_fallback_quiz(subject, num_questions)
+    issues = validate_questions(quiz_data, index=index)
+    for i, problems in enumerate(issues):
+        if problems:
+            logger.warning(f"Rejected {subject} question {i + 1}: {'; '.join(problems)}")
 
+    # Ensure we have the requested number of questions
+    valid = [question for question, problems in zip(quiz_data, issues) if not problems][:num_questions]
+    return [Question.from_dict(question) for question in valid]
 
 
-def generate_quiz(subject, level, num_questions=5, reveal_answer=True):
+def generate_quiz(subject, level, num_questions=5, reveal_answer=True, profile=None):
     """
     Generate a quiz with multiple-choice questions based on subject and level.
 
@@ -346,43 +587,53 @@ def generate_quiz(subject, level, num_questions=5, reveal_answer=True):
         level (str): Learning level (Beginner, Intermediate, Advanced)
         num_questions (int): Number of questions to generate
         reveal_answer (bool): Whether to format the response with hidden answers that can be revealed 
+        profile (str): Generation profile name (fast, balanced, thorough)
 
     Returns:
-         dict: Contains quiz data (list of questions) and formatted HTML if reveal_answer is True
+         dict: Contains quiz data (list of Question objects), formatted HTML if reveal_answer is True,
+               and "partial" set when the repair budget ran out before the quiz was complete
+
+    Raises:
+        Exception: If no valid question could be generated at all
     """
 
     try:
         # Get LLM response
-        llm = get_llm()
+        llm = get_llm(profile)
+        generation_profile = get_profile(profile)
 
         # Create a structured prompt for quiz generation
         prompt = _create_quiz_prompt(subject, level, num_questions)
 
         # Generate response using the chat completions API
         logger.info(f"Generating quiz for subject: {subject}, level: {level}, questions: {num_questions}")
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": f"You are an expert quiz creator for {subject} at the {level} level."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7
-        )
-        response_content = response.choices[0].message.content
-
-        # Parse and validate the response
-        quiz_data = _parse_quiz_response(response_content, subject, num_questions)
+        response_content = _request_quiz_completion(subject, level, prompt, num_questions, generation_profile)
+
+        # Parse and validate the response, then regenerate only the failing questions
+        index = _question_index(subject, level)
+        quiz_data = _collect_quiz_questions(response_content, subject, num_questions, index)
+        complete = len(quiz_data) >= num_questions or _repair_quiz(quiz_data, subject, level, num_questions,
+                                                                       profile=generation_profile.name, index=index)
+
+        if index is not None and quiz_data:
+            index.add([question.question for question in quiz_data])
+        if not quiz_data:
+            # Nothing usable within the budget: placeholder questions would be stored,
+            # banked and graded like real ones, so fail instead
+            raise Exception(f"No valid {subject} questions could be generated, please retry")
 
         # Format the quiz with hidden answers if requested 
         if reveal_answer:
             formatted_quiz = _format_quiz_with_reveal(quiz_data)
             return {
                 "quiz": quiz_data,  # Changed from quiz_data to quiz to match frontend expectation
-                "formatted_quiz": formatted_quiz
+                "formatted_quiz": formatted_quiz,
+                "partial": not complete
             }
         else:
             return {
-                "quiz": quiz_data  # Changed from quiz_data to quiz to match frontend expectation
+                "quiz": quiz_data,  # Changed from quiz_data to quiz to match frontend expectation
+                "partial": not complete
             }
 
     except Exception as e:
@@ -390,240 +641,20 @@ def generate_quiz(subject, level, num_questions=5, reveal_answer=True):
         raise Exception(f"Failed to generate quiz: {str(e)}")
 
 
-
-def _format_quiz_with_reveal(quiz_data):
-    """
-    Format quiz data into HTML with hidden answers that can be revealed on click.
-
-    Args:
-       quiz data (list): List of question dictionaries
-
-    Returns:
-        str: HTML string with quiz questions and hidden answers 
-    """
-
-    html = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-      <meta charset="UTF-8">
-      <meta name="viewport" content="width=device-width, initial-scale=1.0">
-      <style>
-          body {
-            font-family: Arial, sans-serif;
-            color: white;
-            background-color: #121212;
-          }
-
-        .quiz-container {
-           max-width: 800px;
-           margin: 0 auto;
-           padding: 20px;
-        }
-
-        .question {
-            margin-bottom: 30px;
-            padding: 20px;
-            border: 1px solid #444;
-            border-radius: 10px;
-            background-color: #1e1e2f;
-        }
-
-        .question h3 {
-          margin-top: 0;
-          color: #90caf9
-        }
-
-        .options {
-          margin-left: 10px;
-        }
-
-        .option {
-           margin: 10px 0;
-           padding: 12px;
-           border: 1px solid #555;
-           border-radius: 6px;
-           cursor: pointer;
-           background-color: #2d2d44;
-           transition: background-color 0.2s;
-        }
-
-
-        .option:hover {
-           background-color: #3a3a5a;
-        }
-
-        .reveal-btn {
-          background-color: #2196f3;
-          color: white;
-          border: none;
-          padding: 10px 20px;
-          border-radius: 5px;
-          cursor: pointer;
-          font-weight: bold;
-          margin-top: 15px;
-          transition: background-color 0.2s;
-        }
-
-        .reveal-btn:hover {
-          background-color: #0d8bf2;
-        }
-
-        .answer-section {
-          margin-top: 20px;
-          border: 2px solid #ffeb3b;
-          border-radius: 8px;
-          padding: 0;
-          overflow: hidden;
-          display: none;
-        }
-
-        .answer-header {
-          background-color: #ffeb3b:
-          color: #000;
-          padding: 10px;
-          font-weight: bold;
-          font-size: 16px;
-          text-align: center;
-        }
-         
-        .answer-content {
-         padding: 15px;
-         background-color: #1a237e;
-        }
-
-        .correct-answer {
-           font-size: 18px;
-           font-weight: bold;
-           color: white;
-           margin-bottom: 15px;  
-        }
-
-        .explanation {
-          color: #e1f5fe;
-          font-size: 16px;
-          line-height: 1.5;
-        }
-
-        .selected-correct{
-          background-color: #1b5e20 !important;
-          border-color: #4caf50 !important;
-        }
-
-        .selected-incorrect {
-          background-color: #b71c1c !important;
-          border-color: #f44336 !important;
-        }
-
-      </style>
-
-    </head>
-    <body>
-          <div class="quiz-container">
-          <h2 style="color: #2196f3; text-align: center;
-          margin-bottom: 30px;">Interactive Quiz</h2>
-    """
-
-    for i, question in enumerate(quiz_data, 1):
-        option_letters = ["A", "B", "C", "D"]
-        correct_index = question["options"].index(question["correct_answer"]) if question["correct_answer"] in question["options"] else 0
-
-        html += f"""
-             <div class="question" id="question-{i}">
-                <h3>Question {i}</h3>
-                <p>{question["question"]}</p>
-                <div class="options">
-        """
-
-        for j, option in enumerate(question["options"]):
-            is_correct = j == correct_index
-            html += f"""
-                <div class="option" id="option-{i}-{j}"
-                onclick="selectOption({i}, {j}, {str(is_correct).lower()})">
-                <strong>{option_letters[j]}.</strong>
-                {option}
-                </div>
-            """
-
-        html += f""" 
-                </div>
-                <button class="reveal-btn" onclick="revealAnswer({i})">SHOW ANSWER</button>
-                <div class="answer-section" id="answer-{i}">
-                    <div class="answer-header">CORRECT ANSWER</div>
-                    <div class="answer-content">
-                        <div class="correct-answer">
-                            {option_letters[correct_index]}. {question["correct_answer"]}
-                        </div>
-                        <div class="explanation">{question.get("explanation", "")}</div>
-                    </div>
-                </div>
-            </div>
-        """
-
-    html += """
-           </div>
-           <script>
-               function selectOption(questionNum, optionNum, isCorrect) {
-                   const questionId = `question-${questionNum}`;
-                   const options = document.querySelectorAll(`#${questionId} .option`);
-
-                   // Reset all options
-                   options.forEach(option => {
-                       option.className = 'option';
-                   });
-
-                   // Highlight selected option
-                   const selectedOption = document.getElementById(`option-${questionNum}-${optionNum}`);
-                   if (isCorrect === 'true') {
-                       selectedOption.className = 'option selected-correct';
-                   } else {
-                       selectedOption.className = 'option selected-incorrect';
-                       // Show answer if incorrect
-                       revealAnswer(questionNum);
-                   }
-               }
-
-               function revealAnswer(questionNum) {
-                   const answerDiv = document.getElementById(`answer-${questionNum}`);
-                   answerDiv.style.display = 'block';
-
-                   // Scroll to answer
-                   setTimeout(() => {
-                       answerDiv.scrollIntoView({behavior: 'smooth', block: 'nearest'});
-                   }, 100);
-
-                   // Add animation for attention 
-                   answerDiv.animate([
-                       { transform: 'scale(1)', boxShadow: '0 0 0 rgba(255, 235, 59, 0)'},
-                       { transform: 'scale(1.02)', boxShadow: '0 0 20px rgba(255, 235, 59, 0.7)'}, 
-                       { transform: 'scale(1)', boxShadow: '0 0 10px rgba(255, 235, 59, 0.3)'}
-                   ], {
-                       duration: 1000,
-                       iterations: 1
-                   });
-               }
-           </script>
-        </body>
-        </html>
-    """
-
-    return html
-
-
 # Export quiz to file (new function)
 def export_quiz_to_html(quiz_data, file_path="quiz.html"):
     """ 
     Export the formatted quiz to an HTML file
 
     Args:
-      quiz_data (list): List of questions dictionaries
+      quiz_data (list): Question objects or question dictionaries
       file_path (str): Path to save the HTML file
     """
 
     try:
-        html_content = _format_quiz_with_reveal(quiz_data)
+        from quiz_export import export_questions
 
-        with open(file_path, "w", encoding="utf-8") as f: f.write(html_content)
+        export_questions(quiz_data, file_path, fmt="html")
 
         logger.info(f"Quiz exported successfully to {file_path}")
         return True
@@ -0,0 +1,345 @@
+import os
+import json
+import hashlib
+import sqlite3
+import logging
+import threading
+import unicodedata
+from collections import deque
+
+from ai_engine import _extract_quiz_json
+
+logger = logging.getLogger(__name__)
+
+CURRICULUM_DB_PATH = os.getenv("CURRICULUM_DB_PATH", "curriculum.db")
+# Size of the initial graph generated for a new subject/level
+CURRICULUM_INITIAL_TOPICS = int(os.getenv("CURRICULUM_INITIAL_TOPICS", "12"))
+DEFAULT_TOPIC_HOURS = 2.0
+
+# Punctuation that only formats a title; any other symbol ("C++", "C#") is
+# meaningful, so ids of titles containing one carry a hash of the full title
+_SLUG_FORMATTING = set(" \t\n-\u2010\u2013\u2014_'\u2019\".,:;!?()[]/")
+
+
+def topic_id(title):
+    """
+    Normalized node id used to match titles from the LLM and from users.
+
+    Letters, marks and digits of any script are kept, so Hindi or accented
+    titles get distinct ids. A short hash of the title is appended when the
+    slug would drop a meaningful symbol, and used alone when it is empty.
+    """
+
+    text = " ".join(unicodedata.normalize("NFKC", str(title)).casefold().split())
+    kept = "".join(c if unicodedata.category(c)[0] in "LMN" else " " for c in text)
+    slug = "-".join(kept.split())
+    if slug and all(c in _SLUG_FORMATTING or unicodedata.category(c)[0] in "LMN" for c in text):
+        return slug
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}" if slug else f"topic-{digest}"
+
+
+def _graph_key(subject, level):
+    return subject.strip().lower(), level.strip().lower()
+
+
+def _create_curriculum_prompt(subject, level, goals, existing, count):
+    """Helper function to create the topic graph generation prompt"""
+
+    if goals:
+        task = f"List the topics needed to learn: {', '.join(goals)}. Include each of these topics itself."
+    else:
+        task = f"List about {count} core topics that make up {subject} at the {level} level."
+
+    known = ""
+    if existing:
+        known = (
+            "\n    These topics already exist. Do not list them again, but use their exact titles as "
+            f"prerequisites where relevant: {'; '.join(existing)}\n"
+        )
+
+    return f"""
+    You are an expert curriculum designer for {subject} at the {level} level.
+
+    TASK:
+    {task}
+    {known}
+    For every topic give its direct prerequisites (titles of other topics), a one sentence
+    description and an estimate of study hours.
+
+    RESPONSE FORMAT (JSON array only):
+    [
+      {{
+        "title": "Topic title",
+        "description": "What the student learns",
+        "hours": 2,
+        "prerequisites": ["Other topic title"]
+      }}
+    ]
+    """
+
+
+class CurriculumStore:
+    """
+    Prerequisite graphs per (subject, level), cached in memory and persisted in SQLite.
+
+    A node is a dict with id, title, description, hours and prerequisites
+    (a list of node ids). Graphs are only ever extended, never regenerated.
+    """
+
+    def __init__(self, path=CURRICULUM_DB_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._db_lock = threading.Lock()
+        self._graphs = {}
+        self._graph_locks = {}
+        self._locks_lock = threading.Lock()
+        with self._db_lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS topics ("
+                "subject TEXT, level TEXT, node_id TEXT, title TEXT, description TEXT, hours REAL, "
+                "prerequisites TEXT, PRIMARY KEY (subject, level, node_id))"
+            )
+
+    def _lock_for(self, key):
+        with self._locks_lock:
+            return self._graph_locks.setdefault(key, threading.Lock())
+
+    def graph(self, subject, level):
+        """Return the cached graph (node id -> node), loading it from disk once."""
+        key = _graph_key(subject, level)
+        graph = self._graphs.get(key)
+        if graph is None:
+            with self._db_lock:
+                rows = self._conn.execute(
+                    "SELECT node_id, title, description, hours, prerequisites FROM topics "
+                    "WHERE subject = ? AND level = ?", key
+                ).fetchall()
+            graph = {
+                node_id: {"id": node_id, "title": title, "description": description,
+                          "hours": hours, "prerequisites": json.loads(prerequisites)}
+                for node_id, title, description, hours, prerequisites in rows
+            }
+            self._graphs[key] = graph
+        return graph
+
+    def add_nodes(self, subject, level, nodes):
+        key = _graph_key(subject, level)
+        graph = self.graph(subject, level)
+        with self._db_lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO topics VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(*key, node["id"], node["title"], node["description"], node["hours"],
+                  json.dumps(node["prerequisites"])) for node in nodes]
+            )
+        # Publish a new dict so concurrent readers never see a half-updated graph
+        self._graphs[key] = {**graph, **{node["id"]: node for node in nodes}}
+
+    def ensure_topics(self, subject, level, goals, generate):
+        """
+        Make sure the graph exists and contains every goal, generating only what is missing.
+
+        Args:
+            generate (callable): prompt -> completion text, called only on a miss
+
+        Returns:
+            int: Number of nodes generated
+        """
+
+        key = _graph_key(subject, level)
+        graph = self.graph(subject, level)
+        missing = [goal for goal in goals if topic_id(goal) not in graph]
+        if graph and not missing:
+            return 0
+
+        with self._lock_for(key):
+            # Another request may have generated them while we waited
+            graph = self.graph(subject, level)
+            missing = [goal for goal in goals if topic_id(goal) not in graph]
+            if graph and not missing:
+                return 0
+
+            existing = [node["title"] for node in graph.values()]
+            logger.info(f"Generating curriculum topics for {subject} ({level}): {missing or 'initial graph'}")
+            prompt = _create_curriculum_prompt(subject, level, missing, existing, CURRICULUM_INITIAL_TOPICS)
+            nodes = _parse_topics(generate(prompt), graph)
+
+            # A goal the LLM renamed would otherwise miss the cache on every
+            # request; record it as a node that depends on the new topics
+            generated_ids = {node["id"] for node in nodes}
+            needed = {p for node in nodes for p in node["prerequisites"]}
+            sinks = [node["id"] for node in nodes if node["id"] not in needed]
+            for goal in missing:
+                if topic_id(goal) not in generated_ids:
+                    nodes.append({"id": topic_id(goal), "title": goal, "description": "", "hours": DEFAULT_TOPIC_HOURS,
+                                  "prerequisites": sinks})
+
+            self.add_nodes(subject, level, nodes)
+            return len(nodes)
+
+
+def _parse_topics(response_content, graph):
+    """Turn the LLM topic list into nodes whose prerequisites reference known ids."""
+    try:
+        items = json.loads(_extract_quiz_json(response_content))
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Curriculum response is not valid JSON: {str(e)}")
+    if not isinstance(items, list):
+        raise ValueError("Curriculum response must be a list of topics")
+
+    nodes = {}
+    for item in items:
+        if not isinstance(item, dict) or not item.get("title"):
+            continue
+        node_id = topic_id(item["title"])
+        if node_id in graph or node_id in nodes:
+            continue
+        try:
+            hours = float(item.get("hours", DEFAULT_TOPIC_HOURS))
+        except (TypeError, ValueError):
+            hours = DEFAULT_TOPIC_HOURS
+        nodes[node_id] = {
+            "id": node_id,
+            "title": str(item["title"]).strip(),
+            "description": str(item.get("description", "")),
+            "hours": hours,
+            "prerequisites": [topic_id(p) for p in item.get("prerequisites") or [] if isinstance(p, str)],
+        }
+
+    known = set(graph) | set(nodes)
+    for node in nodes.values():
+        node["prerequisites"] = [p for p in dict.fromkeys(node["prerequisites"]) if p in known and p != node["id"]]
+    return list(nodes.values())
+
+
+def plan_topics(graph, goals=None, mastered=None, dropped=None):
+    """
+    Order the topics a student still needs, prerequisites first.
+
+    Traversal walks prerequisites back from the goals (or every topic when no
+    goals are given) and stops at mastered topics, so prerequisites that are
+    only needed for something already mastered are skipped as well.
+    Cycles produced by the LLM are broken one edge at a time: the edge that
+    closes the cycle is logged and ignored, and appended to `dropped` as a
+    (topic id, prerequisite id) pair if a list is given.
+
+    Returns:
+        list: Nodes in study order
+    """
+
+    mastered = {topic_id(m) for m in mastered or []}
+    targets = [topic_id(g) for g in goals] if goals else list(graph)
+
+    required = set()
+    stack = [t for t in targets if t in graph and t not in mastered]
+    while stack:
+        node_id = stack.pop()
+        if node_id in required:
+            continue
+        required.add(node_id)
+        stack.extend(p for p in graph[node_id]["prerequisites"] if p in graph and p not in mastered)
+
+    # Kahn's algorithm restricted to the required subgraph; ties keep graph order
+    order_index = {node_id: i for i, node_id in enumerate(graph)}
+    indegree = {node_id: 0 for node_id in required}
+    dependents = {node_id: [] for node_id in required}
+    for node_id in required:
+        for prerequisite in dict.fromkeys(graph[node_id]["prerequisites"]):
+            if prerequisite in required:
+                indegree[node_id] += 1
+                dependents[prerequisite].append(node_id)
+
+    ready = deque(sorted((n for n, d in indegree.items() if d == 0), key=order_index.get))
+    ordered = []
+    placed = set()
+    ignored = set()
+    while len(ordered) < len(required):
+        if not ready:
+            # Every unplaced topic waits on another unplaced one, so there is a cycle
+            node_id, prerequisite = _cycle_edge(graph, required - placed, ignored, order_index)
+            ignored.add((node_id, prerequisite))
+            indegree[node_id] -= 1
+            dependents[prerequisite].remove(node_id)
+            if dropped is not None:
+                dropped.append((node_id, prerequisite))
+            if indegree[node_id] == 0:
+                ready.append(node_id)
+            continue
+        node_id = ready.popleft()
+        ordered.append(graph[node_id])
+        placed.add(node_id)
+        for dependent in dependents[node_id]:
+            indegree[dependent] -= 1
+            if indegree[dependent] == 0:
+                ready.append(dependent)
+    return ordered
+
+
+def _cycle_edge(graph, unplaced, ignored, order_index):
+    """
+    Find a prerequisite cycle among `unplaced` topics, not using `ignored`
+    edges, and return the edge that closes it, as (topic id, prerequisite id).
+    """
+
+    # Walking back through unplaced prerequisites must revisit a topic
+    node_id = min(unplaced, key=order_index.get)
+    path = []
+    position = {}
+    while node_id not in position:
+        position[node_id] = len(path)
+        path.append(node_id)
+        prerequisite = next(p for p in graph[node_id]["prerequisites"]
+                            if p in unplaced and (node_id, p) not in ignored)
+        last, node_id = node_id, prerequisite
+    cycle = path[position[node_id]:] + [node_id]
+    logger.warning(f"Prerequisite cycle: {' requires '.join(graph[n]['title'] for n in cycle)}; "
+                   f"ignoring that {graph[last]['title']} requires {graph[node_id]['title']}")
+    return last, node_id
+
+
+def build_study_plan(store, subject, level, goals=None, mastered=None, hours_per_week=None, generate=None):
+    """
+    Build a personalized study plan from the cached curriculum graph.
+
+    Args:
+        store (CurriculumStore): Graph store
+        subject (str): The academic subject
+        level (str): Learning level
+        goals (list): Topic titles the student wants to reach (all topics if empty)
+        mastered (list): Topic titles the student already knows
+        hours_per_week (float): If given, each step is assigned a study week
+        generate (callable): prompt -> completion text, used only for missing topics
+
+    Returns:
+        dict: Plan steps in study order, total hours and number of generated nodes
+    """
+
+    goals = goals or []
+    generated = store.ensure_topics(subject, level, goals, generate) if generate else 0
+    graph = store.graph(subject, level)
+    dropped = []
+    ordered = plan_topics(graph, goals, mastered, dropped)
+    dropped = set(dropped)
+
+    steps = []
+    elapsed = 0.0
+    for position, node in enumerate(ordered, 1):
+        step = {
+            "step": position,
+            "topic": node["title"],
+            "description": node["description"],
+            "hours": node["hours"],
+            "prerequisites": [graph[p]["title"] for p in node["prerequisites"]
+                              if p in graph and (node["id"], p) not in dropped],
+        }
+        if hours_per_week:
+            step["week"] = int(elapsed // hours_per_week) + 1
+        elapsed += node["hours"]
+        steps.append(step)
+
+    return {
+        "subject": subject,
+        "level": level,
+        "plan": steps,
+        "total_hours": elapsed,
+        "generated_topics": generated,
+    }
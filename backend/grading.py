@@ -0,0 +1,129 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+UNANSWERED = -1
+_OPTION_LETTERS = ["A", "B", "C", "D", "E", "F"]
+
+
+def _option_lookup(question):
+    """Map option text, normalized text and letters to the option index."""
+    lookup = {}
+    for j, option in enumerate(question.options):
+        lookup[option] = j
+        lookup[str(option).strip().lower()] = j
+        if j < len(_OPTION_LETTERS):
+            lookup[_OPTION_LETTERS[j]] = j
+            lookup[_OPTION_LETTERS[j].lower()] = j
+    return lookup
+
+
+def answer_key(questions):
+    """Index of the correct option for each question, as an int8 vector."""
+    return np.array([question.correct_index for question in questions], dtype=np.int8)
+
+
+def encode_answers(questions, answer_rows):
+    """
+    Encode submitted answers as a (students, questions) int8 matrix of option indices.
+
+    Answers may be option text, a letter (A-D) or a 0-based option index;
+    missing, extra or unrecognised answers count as unanswered.
+    """
+
+    lookups = [_option_lookup(question) for question in questions]
+    sizes = [len(question.options) for question in questions]
+    num_questions = len(questions)
+    responses = np.full((len(answer_rows), num_questions), UNANSWERED, dtype=np.int8)
+
+    for row, answers in enumerate(answer_rows):
+        for column, answer in enumerate(answers[:num_questions]):
+            if answer is None:
+                continue
+            if isinstance(answer, int):
+                if 0 <= answer < sizes[column]:
+                    responses[row, column] = answer
+                continue
+            lookup = lookups[column]
+            index = lookup.get(answer)
+            if index is None:
+                index = lookup.get(str(answer).strip().lower(), UNANSWERED)
+            responses[row, column] = index
+    return responses
+
+
+def item_statistics(correct):
+    """
+    Per-question difficulty and discrimination from a boolean correctness matrix.
+
+    Difficulty is the proportion of students answering correctly. Discrimination
+    is the corrected point-biserial correlation between getting the item right
+    and the score on the remaining items (NaN when undefined).
+    """
+
+    item = correct.astype(np.float64)
+    rest = item.sum(axis=1, keepdims=True) - item
+    item_centered = item - item.mean(axis=0)
+    rest_centered = rest - rest.mean(axis=0)
+    numerator = (item_centered * rest_centered).sum(axis=0)
+    denominator = np.sqrt((item_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        discrimination = np.where(denominator > 0, numerator / denominator, np.nan)
+    return item.mean(axis=0), discrimination
+
+
+def _rounded(value, digits=3):
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def grade_submissions(questions, submissions):
+    """
+    Score a batch of submissions against a quiz in one vectorized pass.
+
+    Args:
+        questions (list): Question objects (the answer key)
+        submissions (list): Dicts with student_id and answers
+
+    Returns:
+        dict: Per-student scores, per-question statistics and a summary
+    """
+
+    responses = encode_answers(questions, [submission["answers"] for submission in submissions])
+    key = answer_key(questions)
+    correct = responses == key[None, :]
+
+    scores = correct.sum(axis=1)
+    total = len(questions)
+    percents = scores * (100.0 / total) if total else np.zeros(len(scores))
+    difficulty, discrimination = item_statistics(correct)
+
+    # Option choice counts per question: column 0 is "unanswered"
+    width = max(len(question.options) for question in questions) + 1
+    flat = (np.arange(total)[None, :] * width + responses.astype(np.int64) + 1).ravel()
+    option_counts = np.bincount(flat, minlength=total * width).reshape(total, width)
+
+    students = [
+        {"student_id": submission["student_id"], "correct": int(score), "total": total,
+         "percent": round(float(percent), 1)}
+        for submission, score, percent in zip(submissions, scores, percents)
+    ]
+    question_stats = [
+        {
+            "index": i + 1,
+            "question": question.question,
+            "difficulty": _rounded(difficulty[i]),
+            "discrimination": _rounded(discrimination[i]),
+            "unanswered": int(option_counts[i, 0]),
+            "option_counts": option_counts[i, 1:len(question.options) + 1].tolist(),
+        }
+        for i, question in enumerate(questions)
+    ]
+    summary = {
+        "students": len(submissions),
+        "mean_percent": round(float(percents.mean()), 1) if len(percents) else 0.0,
+        "median_percent": round(float(np.median(percents)), 1) if len(percents) else 0.0,
+        "std_percent": round(float(percents.std()), 1) if len(percents) else 0.0,
+    }
+    return {"students": students, "questions": question_stats, "summary": summary}
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HOTKEYS_PATH = os.getenv("HOTKEYS_PATH", "hot_keys.json")
+# How often the sketches are written to HOTKEYS_PATH
+HOTKEYS_PERSIST_SECONDS = float(os.getenv("HOTKEYS_PERSIST_SECONDS", "60"))
+# Heavy hitters kept per request kind
+HOTKEYS_TOP_K = int(os.getenv("HOTKEYS_TOP_K", "50"))
+# Counts are halved this often, so old popularity fades; 0 disables ageing
+HOTKEYS_HALF_LIFE_HOURS = float(os.getenv("HOTKEYS_HALF_LIFE_HOURS", "24"))
+CMS_WIDTH = int(os.getenv("HOTKEYS_CMS_WIDTH", "2048"))
+CMS_DEPTH = int(os.getenv("HOTKEYS_CMS_DEPTH", "4"))
+HLL_PRECISION = int(os.getenv("HOTKEYS_HLL_PRECISION", "12"))
+
+KINDS = ("quiz", "tutor")
+
+
+def _hash(key):
+    """Two independent 64-bit hashes of a key string."""
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+def _encode_array(array):
+    return base64.b64encode(array.tobytes()).decode("ascii")
+
+
+def _decode_array(text, dtype, shape):
+    return np.frombuffer(base64.b64decode(text), dtype=dtype).reshape(shape).copy()
+
+
+class CountMinSketch:
+    """
+    Frequency estimates in fixed memory (width * depth uint32 counters).
+
+    Estimates never undercount; with the defaults they overcount by at most
+    about 0.1% of all recorded requests with high probability.
+    """
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        self.total = 0
+
+    def _columns(self, key):
+        # Double hashing (Kirsch-Mitzenmacher) gives `depth` indices from two hashes
+        h1, h2 = _hash(key)
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key, count=1):
+        """Count `key` and return its new estimate."""
+        columns = self._columns(key)
+        rows = np.arange(self.depth)
+        self.table[rows, columns] += count
+        self.total += count
+        return int(self.table[rows, columns].min())
+
+    def estimate(self, key):
+        return int(self.table[np.arange(self.depth), self._columns(key)].min())
+
+    def halve(self):
+        self.table >>= 1
+        self.total //= 2
+
+    def to_dict(self):
+        return {"width": self.width, "depth": self.depth, "total": self.total, "table": _encode_array(self.table)}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["width"], data["depth"])
+        sketch.table = _decode_array(data["table"], np.uint32, (sketch.depth, sketch.width))
+        sketch.total = data["total"]
+        return sketch
+
+
+class HyperLogLog:
+    """
+    Distinct-count estimate in 2**precision bytes (4 KB by default, ~1.6% error).
+    """
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, key):
+        h, _ = _hash(key)
+        index = h & ((1 << self.precision) - 1)
+        rest = h >> self.precision
+        bits = 64 - self.precision
+        # Position of the first set bit in the remaining hash bits
+        rank = bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.power(2.0, -self.registers.astype(np.float64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate while many registers are empty
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+    def to_dict(self):
+        return {"precision": self.precision, "registers": _encode_array(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["precision"])
+        sketch.registers = _decode_array(data["registers"], np.uint8, (1 << sketch.precision,))
+        return sketch
+
+
+class TopK:
+    """
+    The k keys with the highest Count-Min estimates seen so far.
+
+    A key enters when its estimate beats the smallest tracked count, so only
+    k keys are ever stored regardless of how many distinct keys arrive.
+    """
+
+    def __init__(self, k=HOTKEYS_TOP_K):
+        self.k = k
+        self.counts = {}
+
+    def offer(self, key, estimate):
+        if key in self.counts or len(self.counts) < self.k:
+            self.counts[key] = estimate
+            return
+        coldest = min(self.counts, key=self.counts.get)
+        if estimate > self.counts[coldest]:
+            del self.counts[coldest]
+            self.counts[key] = estimate
+
+    def halve(self):
+        self.counts = {key: count // 2 for key, count in self.counts.items() if count > 1}
+
+    def most_common(self, n=None):
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:n] if n is not None else ranked
+
+
+class HotKeyTracker:
+    """
+    Bounded-memory request analytics: per request kind, a Count-Min sketch of
+    key frequencies, a HyperLogLog of distinct keys and the top-K heavy hitters.
+
+    Keys are tuples of request fields (see `record`). The sketches are loaded
+    from `path` on startup and written back every `persist_seconds`, so the
+    hot keys survive a restart and can drive the warm-up.
+    """
+
+    def __init__(self, path=HOTKEYS_PATH, top_k=HOTKEYS_TOP_K, persist_seconds=HOTKEYS_PERSIST_SECONDS,
+                 half_life_hours=HOTKEYS_HALF_LIFE_HOURS):
+        self.path = path
+        self.top_k = top_k
+        self.persist_seconds = persist_seconds
+        self.half_life = half_life_hours * 3600
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.frequencies = {kind: CountMinSketch() for kind in KINDS}
+        self.distinct = {kind: HyperLogLog() for kind in KINDS}
+        self.heavy_hitters = {kind: TopK(self.top_k) for kind in KINDS}
+        self.aged_at = time.time()
+        self.saved_at = None
+
+    def record(self, kind, key):
+        """Count one request; `key` is a tuple of JSON-serializable fields."""
+        if kind not in self.frequencies:
+            return
+        key = json.dumps(list(key), ensure_ascii=False)
+        with self._lock:
+            estimate = self.frequencies[kind].add(key)
+            self.distinct[kind].add(key)
+            self.heavy_hitters[kind].offer(key, estimate)
+
+    def estimate(self, kind, key):
+        with self._lock:
+            return self.frequencies[kind].estimate(json.dumps(list(key), ensure_ascii=False))
+
+    def top(self, kind, n=None):
+        """Hottest keys of a kind as (key tuple, estimated count), hottest first."""
+        with self._lock:
+            ranked = self.heavy_hitters[kind].most_common(n)
+        return [(tuple(json.loads(key)), count) for key, count in ranked]
+
+    def _age(self):
+        """Halve every count once per half-life; callers hold the lock."""
+        if not self.half_life:
+            return
+        while time.time() - self.aged_at >= self.half_life:
+            for kind in KINDS:
+                self.frequencies[kind].halve()
+                self.heavy_hitters[kind].halve()
+            self.aged_at += self.half_life
+
+    def snapshot(self, n=20):
+        with self._lock:
+            snapshot = {
+                kind: {
+                    "requests": self.frequencies[kind].total,
+                    "distinct_keys": self.distinct[kind].count(),
+                    "top": [{"key": json.loads(key), "count": count}
+                            for key, count in self.heavy_hitters[kind].most_common(n)],
+                }
+                for kind in KINDS
+            }
+        snapshot["saved_at"] = self.saved_at
+        return snapshot
+
+    def save(self):
+        with self._lock:
+            self._age()
+            state = {
+                "aged_at": self.aged_at,
+                "kinds": {
+                    kind: {
+                        "frequencies": self.frequencies[kind].to_dict(),
+                        "distinct": self.distinct[kind].to_dict(),
+                        "top": self.heavy_hitters[kind].most_common(),
+                    }
+                    for kind in KINDS
+                },
+            }
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.saved_at = time.time()
+        except OSError as e:
+            logger.warning(f"Failed to persist hot keys: {str(e)}")
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except OSError:
+            return
+        except json.JSONDecodeError as e:
+            logger.warning(f"Ignoring unreadable hot key file {self.path}: {str(e)}")
+            return
+        with self._lock:
+            try:
+                for kind, data in state["kinds"].items():
+                    if kind not in self.frequencies:
+                        continue
+                    self.frequencies[kind] = CountMinSketch.from_dict(data["frequencies"])
+                    self.distinct[kind] = HyperLogLog.from_dict(data["distinct"])
+                    self.heavy_hitters[kind].counts = dict((key, count) for key, count in data["top"])
+                self.aged_at = state.get("aged_at", time.time())
+                self._age()
+            except (KeyError, ValueError, TypeError) as e:
+                logger.warning(f"Ignoring unreadable hot key file {self.path}: {str(e)}")
+                self._reset()
+
+    def start(self):
+        if self._thread is None and self.persist_seconds > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._persist_loop, name="hotkeys", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+        self._thread = None
+        self.save()
+
+    def _persist_loop(self):
+        while not self._stop.wait(self.persist_seconds):
+            self.save()
@@ -0,0 +1,401 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import ipaddress
+import threading
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+# Set to a file path to persist the queue across restarts; in-memory otherwise
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH")
+# Finished jobs are forgotten after this many seconds
+JOBS_TTL_SECONDS = int(os.getenv("JOBS_TTL_SECONDS", "3600"))
+
+CALLBACK_TIMEOUT = 10
+CALLBACK_ATTEMPTS = 3
+# Comma-separated callback hosts. If set, callbacks may only go to these hosts
+# (which may then be internal); otherwise to any host with public addresses only.
+JOBS_CALLBACK_ALLOWED_HOSTS = {host.strip().lower() for host in os.getenv("JOBS_CALLBACK_ALLOWED_HOSTS", "").split(",")
+                               if host.strip()}
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+def check_callback_url(url, allowed_hosts=None):
+    """
+    Reject callback URLs that could make the server call into its own network.
+
+    Returns:
+        str: The vetted address to connect to, or None for an allowlisted host
+
+    Raises:
+        ValueError: If the URL is not http(s), or its host is not allowed or
+            resolves to a private, loopback, link-local or otherwise non-public address
+    """
+
+    allowed_hosts = JOBS_CALLBACK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Callback URL must be an http(s) URL with a host: {url}")
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise ValueError(f"Callback host {host} is not in JOBS_CALLBACK_ALLOWED_HOSTS")
+        return
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"Callback host {host} does not resolve: {str(e)}")
+    for address in addresses:
+        # Scoped IPv6 addresses carry a "%interface" suffix
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise ValueError(f"Callback host {host} resolves to non-public address {address}")
+    return sorted(addresses)[0]
+
+
+class _PinnedTransport(httpx.HTTPTransport):
+    """
+    Connects to a vetted address instead of resolving the URL's host again.
+
+    The request keeps the Host header and TLS server name (and so certificate
+    check) of the original host, so a DNS answer that changes between the
+    check and the connection cannot redirect the callback.
+    """
+
+    def __init__(self, address, **kwargs):
+        super().__init__(**kwargs)
+        self.address = address
+
+    def handle_request(self, request):
+        request.extensions = {**request.extensions, "sni_hostname": request.url.host}
+        request.url = request.url.copy_with(host=self.address)
+        return super().handle_request(request)
+
+
+def _new_job(kind, payload, callback_url):
+    now = time.time()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": QUEUED,
+        "payload": payload,
+        "callback_url": callback_url,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class MemoryJobStore:
+    """Jobs kept in a dict; lost on restart."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, kind, payload, callback_url=None):
+        job = _new_job(kind, payload, callback_url)
+        with self._lock:
+            self._prune()
+            self._jobs[job["job_id"]] = job
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields, updated_at=time.time())
+
+    def unfinished(self):
+        return []
+
+    def _prune(self):
+        cutoff = time.time() - JOBS_TTL_SECONDS
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job["status"] in (COMPLETED, FAILED) and job["updated_at"] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class SqliteJobStore:
+    """Jobs persisted in SQLite so queued work survives a restart."""
+
+    _COLUMNS = ["job_id", "kind", "status", "payload", "callback_url", "result", "error",
+                "created_at", "updated_at"]
+    _JSON_COLUMNS = ("payload", "result")
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "job_id TEXT PRIMARY KEY, kind TEXT, status TEXT, payload TEXT, callback_url TEXT, "
+                "result TEXT, error TEXT, created_at REAL, updated_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+
+    def _to_row(self, job):
+        return [json.dumps(job[c]) if c in self._JSON_COLUMNS else job[c] for c in self._COLUMNS]
+
+    def _from_row(self, row):
+        job = dict(zip(self._COLUMNS, row))
+        for column in self._JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] is not None else None
+        return job
+
+    def create(self, kind, payload, callback_url=None):
+        job = _new_job(kind, payload, callback_url)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (COMPLETED, FAILED, time.time() - JOBS_TTL_SECONDS)
+            )
+            self._conn.execute(f"INSERT INTO jobs VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                               self._to_row(job))
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+    def update(self, job_id, **fields):
+        fields["updated_at"] = time.time()
+        for column in self._JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column])
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", [*fields.values(), job_id])
+
+    def unfinished(self):
+        """Jobs that were queued or running when the process stopped."""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+
+def create_job_store():
+    if JOBS_DB_PATH:
+        logger.info(f"Using persistent job queue at {JOBS_DB_PATH}")
+        return SqliteJobStore(JOBS_DB_PATH)
+    return MemoryJobStore()
+
+
+class JobRunner:
+    """
+    Runs jobs on a bounded worker pool, independent of HTTP request concurrency.
+
+    Queued jobs wait per tenant (the "tenant" field of the payload). A free
+    worker takes the next job of the tenant with the fewest jobs running (the
+    least recently served among equals), so one class submitting a large
+    batch does not hold up the others.
+
+    Args:
+        store: MemoryJobStore or SqliteJobStore
+        handlers (dict): Maps a job kind to a callable taking the job payload as kwargs
+        max_workers (int): Number of concurrent generations
+        tenant_max_running (int or callable): Jobs one tenant may run at once, or a
+            callable mapping a tenant to its limit; unlimited if None
+    """
+
+    def __init__(self, store, handlers, max_workers=JOBS_MAX_WORKERS, tenant_max_running=None):
+        self.store = store
+        self.handlers = handlers
+        self.max_workers = max_workers
+        self.tenant_max_running = tenant_max_running
+        self._condition = threading.Condition()
+        self._workers = []
+        # Tenant -> deque of job IDs; kept while the tenant has jobs running
+        self._queues = OrderedDict()
+        self._running = {}
+        # Ties go to the tenant served least recently, or never
+        self._served = 0
+        self._served_at = {}
+
+    def start(self):
+        with self._condition:
+            if self._workers:
+                return
+            self._workers = [threading.Thread(target=self._work, name=f"job-{index}", daemon=True)
+                             for index in range(self.max_workers)]
+        for worker in self._workers:
+            worker.start()
+        resumed = self.store.unfinished()
+        for job in resumed:
+            self._enqueue(job)
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} unfinished job(s)")
+
+    def shutdown(self):
+        # Queued jobs stay in the store and are resumed by a persistent queue
+        with self._condition:
+            self._queues.clear()
+            self._workers = []
+            self._condition.notify_all()
+
+    def submit(self, kind, payload, callback_url=None):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if callback_url:
+            check_callback_url(callback_url)
+        if not self._workers:
+            self.start()
+        job = self.store.create(kind, payload, callback_url)
+        self._enqueue(job)
+        return job
+
+    def _enqueue(self, job):
+        tenant = (job["payload"] or {}).get("tenant")
+        with self._condition:
+            self._queues.setdefault(tenant, deque()).append(job["job_id"])
+            self._condition.notify()
+
+    def _tenant_limit(self, tenant):
+        if self.tenant_max_running is None:
+            return self.max_workers
+        if callable(self.tenant_max_running):
+            return self.tenant_max_running(tenant)
+        return self.tenant_max_running
+
+    def _next(self):
+        """Block until a job may start; returns (tenant, job_id), or None once this worker is retired."""
+        with self._condition:
+            while threading.current_thread() in self._workers:
+                eligible = [tenant for tenant, queue in self._queues.items()
+                            if queue and self._running.get(tenant, 0) < self._tenant_limit(tenant)]
+                if eligible:
+                    tenant = min(eligible, key=lambda t: (self._running.get(t, 0), self._served_at.get(t, 0)))
+                    job_id = self._queues[tenant].popleft()
+                    self._served += 1
+                    self._served_at[tenant] = self._served
+                    self._running[tenant] = self._running.get(tenant, 0) + 1
+                    return tenant, job_id
+                self._condition.wait()
+            return None
+
+    def _work(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            tenant, job_id = item
+            try:
+                self._run(job_id)
+            finally:
+                with self._condition:
+                    self._running[tenant] -= 1
+                    if not self._running[tenant]:
+                        del self._running[tenant]
+                        if not self._queues.get(tenant, True):
+                            del self._queues[tenant]
+                            del self._served_at[tenant]
+                    self._condition.notify_all()
+
+    def stats(self):
+        with self._condition:
+            return {
+                "workers": self.max_workers,
+                "running": sum(self._running.values()),
+                "queued": sum(len(queue) for queue in self._queues.values()),
+                "tenants": {
+                    tenant: {"running": self._running.get(tenant, 0), "queued": len(self._queues.get(tenant, ()))}
+                    for tenant in set(self._running) | set(self._queues)
+                },
+            }
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+
+        self.store.update(job_id, status=RUNNING)
+        try:
+            result = self.handlers[job["kind"]](**job["payload"])
+            self.store.update(job_id, status=COMPLETED, result=result)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {str(e)}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+
+        if job["callback_url"]:
+            self._send_callback(self.store.get(job_id))
+
+    def _send_callback(self, job):
+        # Checked again before sending: the host may resolve differently now, and
+        # jobs resumed from a persistent queue were accepted under older settings.
+        # Every attempt then connects to the address that was checked.
+        try:
+            address = check_callback_url(job["callback_url"])
+        except ValueError as e:
+            logger.error(f"Not sending callback for job {job['job_id']}: {str(e)}")
+            return
+        body = public_view(job)
+        transport = _PinnedTransport(address) if address else None
+        # Redirects are not followed, so a public host cannot bounce the callback inward
+        with httpx.Client(transport=transport, timeout=CALLBACK_TIMEOUT, follow_redirects=False) as client:
+            for attempt in range(1, CALLBACK_ATTEMPTS + 1):
+                try:
+                    response = client.post(job["callback_url"], json=body)
+                    if response.status_code < 500:
+                        return
+                    logger.warning(f"Callback for job {job['job_id']} returned {response.status_code}")
+                except httpx.HTTPError as e:
+                    logger.warning(f"Callback for job {job['job_id']} failed: {str(e)}")
+                if attempt < CALLBACK_ATTEMPTS:
+                    time.sleep(2 ** attempt)
+        logger.error(f"Giving up on callback for job {job['job_id']}")
+
+
+def public_view(job):
+    """The fields of a job that are returned to clients."""
+    return {key: job[key] for key in ("job_id", "kind", "status", "result", "error", "created_at", "updated_at")}
+
+
+class _CallbackReceiver(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        print(json.dumps(json.loads(body or b"{}"), indent=2), flush=True)
+        self.send_response(204)
+        self.end_headers()
+
+
+def main(argv=None):
+    """Run a local receiver that prints job callbacks: python jobs.py [port]"""
+    argv = sys.argv[1:] if argv is None else argv
+    port = int(argv[0]) if argv else 9000
+    print(f"Listening for job callbacks on http://127.0.0.1:{port}/ "
+          f"(start the API with JOBS_CALLBACK_ALLOWED_HOSTS=127.0.0.1)", flush=True)
+    HTTPServer(("127.0.0.1", port), _CallbackReceiver).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
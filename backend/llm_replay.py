@@ -0,0 +1,248 @@
+import re
+import sys
+import gzip
+import json
+import time
+import types
+import atexit
+import hashlib
+import argparse
+import logging
+import threading
+from itertools import cycle
+
+logger = logging.getLogger(__name__)
+
+_QUIZ_PROMPT = re.compile(r"Create (\d+) multiple-choice questions about (.+?) suitable for")
+
+
+def request_key(model, messages, params):
+    """Stable hash of everything that determines a completion."""
+    blob = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:24]
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None),
+        "completion_tokens": getattr(usage, "completion_tokens", None),
+        "total_tokens": getattr(usage, "total_tokens", None),
+    }
+
+
+def iter_corpus(path):
+    """
+    Stream records from a gzip-compressed JSONL corpus.
+
+    A corpus whose recorder was killed lacks the end of its gzip stream; every
+    record flushed before that is still read.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                # A line without its newline was cut short mid-write
+                if line.strip() and line.endswith("\n"):
+                    yield json.loads(line)
+        except EOFError:
+            logger.warning(f"Corpus {path} ends without a gzip trailer; its recorder did not shut down cleanly")
+
+
+class _Completions:
+    def __init__(self, create):
+        self.create = create
+
+
+class RecordingClient:
+    """
+    Wraps an OpenAI client and appends every chat completion to a corpus.
+
+    Only `chat.completions.create` is intercepted, which is the one call the
+    engine makes. Each record holds the request, the raw completion text,
+    token usage and the observed latency.
+    """
+
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self.chat = types.SimpleNamespace(completions=_Completions(self._create))
+        atexit.register(self.close)
+
+    def _create(self, model, messages, **params):
+        started = time.perf_counter()
+        response = self._client.chat.completions.create(model=model, messages=messages, **params)
+        latency = time.perf_counter() - started
+
+        record = {
+            "key": request_key(model, messages, params),
+            "model": model,
+            "messages": messages,
+            "params": params,
+            "content": response.choices[0].message.content,
+            "usage": _usage_dict(getattr(response, "usage", None)),
+            "latency": round(latency, 4),
+            "recorded_at": time.time(),
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                if self._file is None:
+                    # One gzip stream per run, so records share the compression window
+                    self._file = gzip.open(self._path, "at", encoding="utf-8")
+                self._file.write(line)
+                # A sync flush makes the record readable even if the process dies before close
+                self._file.flush()
+        except OSError as e:
+            logger.warning(f"Failed to record completion: {str(e)}")
+        return response
+
+    def close(self):
+        """Finish the gzip stream."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class ReplayMiss(Exception):
+    """Raised in strict replay when a request has no recorded completion."""
+
+
+class ReplayClient:
+    """
+    Serves chat completions from a recorded corpus instead of the network.
+
+    Requests are matched by `request_key`. Unknown requests are counted and
+    logged as misses and, unless `strict`, answered with the next recorded
+    completion so load tests can run on any prompt mix. Such an answer is
+    unrelated to the prompt, so correctness tests should replay strictly.
+
+    Args:
+        path (str): Corpus file written by RecordingClient
+        speed (float): 1.0 replays recorded latency, 2.0 twice as fast, 0 at full speed
+        strict (bool): Raise ReplayMiss for unknown requests
+    """
+
+    def __init__(self, path, speed=1.0, strict=False):
+        self.speed = speed
+        self.strict = strict
+        self.hits = 0
+        self.misses = 0
+        self._by_key = {}
+        records = list(iter_corpus(path))
+        if not records:
+            raise ValueError(f"Replay corpus {path} is empty")
+        for record in records:
+            self._by_key.setdefault(record["key"], []).append(record)
+        self._cursors = {key: cycle(items) for key, items in self._by_key.items()}
+        self._fallback = cycle(records)
+        self._lock = threading.Lock()
+        self.chat = types.SimpleNamespace(completions=_Completions(self._create))
+        logger.info(f"Loaded {len(records)} recorded completions from {path}")
+
+    def _create(self, model, messages, **params):
+        key = request_key(model, messages, params)
+        with self._lock:
+            if key in self._cursors:
+                self.hits += 1
+                record = next(self._cursors[key])
+            else:
+                self.misses += 1
+                if self.strict:
+                    raise ReplayMiss(f"No recorded completion for request {key}")
+                record = next(self._fallback)
+                logger.warning(f"No recorded completion for request {key}, replaying an unrelated one "
+                               f"({self.misses} misses, {self.hits} hits)")
+        if self.speed > 0:
+            time.sleep(record["latency"] / self.speed)
+        return replay_response(record)
+
+
+def replay_response(record):
+    """Build an object shaped like an OpenAI chat completion from a record."""
+    usage = record.get("usage") or {}
+    return types.SimpleNamespace(
+        model=record["model"],
+        choices=[types.SimpleNamespace(message=types.SimpleNamespace(role="assistant", content=record["content"]))],
+        usage=types.SimpleNamespace(**usage) if usage else None,
+    )
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def benchmark(path, speed=0.0, repeat=1):
+    """
+    Replay quiz completions through the engine's parse and render path.
+
+    Returns:
+        dict: Throughput of parsing and rendering, and end-to-end latency
+              percentiles (replayed upstream latency + parse + render)
+    """
+
+    import ai_engine
+    from quiz_html import _format_quiz_with_reveal
+
+    records = []
+    for record in iter_corpus(path):
+        prompt = record["messages"][-1]["content"]
+        match = _QUIZ_PROMPT.search(prompt)
+        if match:
+            records.append((record, int(match.group(1)), match.group(2)))
+    if not records:
+        raise ValueError("No quiz completions found in corpus")
+
+    parse_time = render_time = 0.0
+    questions = 0
+    latencies = []
+    for _ in range(repeat):
+        for record, num_questions, subject in records:
+            started = time.perf_counter()
+            if speed > 0:
+                time.sleep(record["latency"] / speed)
+            content = replay_response(record).choices[0].message.content
+
+            t0 = time.perf_counter()
+            quiz_data = ai_engine._collect_quiz_questions(content, subject, num_questions)
+            t1 = time.perf_counter()
+            _format_quiz_with_reveal(quiz_data)
+            t2 = time.perf_counter()
+
+            parse_time += t1 - t0
+            render_time += t2 - t1
+            questions += len(quiz_data)
+            latencies.append(t2 - started)
+
+    completions = len(records) * repeat
+    return {
+        "completions": completions,
+        "questions": questions,
+        "parse_completions_per_sec": round(completions / parse_time, 1) if parse_time else None,
+        "render_questions_per_sec": round(questions / render_time, 1) if render_time else None,
+        "e2e_p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "e2e_p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "e2e_p99_ms": round(_percentile(latencies, 99) * 1000, 3),
+        "recorded_upstream_p50_ms": round(_percentile([r["latency"] for r, _, _ in records], 50) * 1000, 1),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the quiz pipeline over a recorded LLM corpus")
+    parser.add_argument("corpus", help="Corpus file recorded with LLM_RECORD_PATH")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Replay recorded latency at this speed (0 = no upstream delay)")
+    parser.add_argument("--repeat", type=int, default=1, help="Replay the corpus this many times")
+    args = parser.parse_args(argv)
+
+    print(json.dumps(benchmark(args.corpus, args.speed, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
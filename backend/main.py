@@ -1,21 +1,133 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
 import os
-from typing import List, Dict, Any, Optional
+import hmac
+import time
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Union, Literal
 from dotenv import load_dotenv
 from urllib3 import response
 
-from ai_engine import OPENAI_API_KEY, generate_tutoring_response, generate_quiz
+from ai_engine import OPENAI_API_KEY, generate_tutoring_response, generate_quiz, get_llm, translate_quiz
+from quiz_html import _format_quiz_with_reveal
+from admission import AdmissionController, Overloaded, ClientDisconnected, run_until_disconnect
+from jobs import JobRunner, create_job_store, public_view
+from curriculum import CurriculumStore, build_study_plan
+from quiz_store import QuizStore, QuizBank
+from access_log import AccessLog, redact
+from hotkeys import HotKeyTracker
+from warmup import WARMUP_ENABLED, WARMUP_QUIZZES_PER_KEY, WarmupRunner, hot_key_plan
+from translation import TRANSLATION_SOURCE_LANGUAGE, TranslationIncomplete, needs_translation
+from quiz_pages import QUIZ_HTML_MAX_AGE, QuizPageCache, parse_order
+from quiz_model import MSGPACK_MEDIA_TYPE, msgpack, packb, to_dicts
+from prefetch import QuizPrefetcher
+from profiles import profile_metrics
+from tenants import (QuotaExceeded, UnknownCredential, current_tenant, get_usage_store, quota_for, resolve_tenant,
+                     tenant_scope)
+from grading import grade_submissions
 
 # load_dotenv()
 # OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+logger = logging.getLogger(__name__)
+
+# Bearer token for the /admin endpoints; they are disabled while it is unset
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+# Generated quizzes by ID, so answers can be graded server-side
+quiz_store = QuizStore()
+# Quizzes generated ahead of demand for popular keys
+quiz_bank = QuizBank(quiz_store)
+# What students ask for; drives the warm-up after a restart
+access_log = AccessLog()
+# Bounded-memory popularity of request keys, persisted periodically
+hot_keys = HotKeyTracker()
+
+
+def _record_request(kind, **fields):
+    """Log a generation request and count its key; fields are given in key order."""
+    # Student questions are only ever stored as digests
+    fields = redact(fields)
+    access_log.record(kind, **fields)
+    hot_keys.record(kind, tuple(fields.values()))
+
+
+def _store_quiz(quiz_result, subject, level, language=None):
+    """
+    Persist the generated questions, translate them if needed and convert them
+    to the API's dict shape. The stored quiz stays in the source language.
+    """
+    quiz_result["quiz_id"] = quiz_store.save(quiz_result["quiz"], subject, level)
+    quiz_result = translate_quiz(quiz_result, language)
+    quiz_result["quiz"] = to_dicts(quiz_result["quiz"])
+    return quiz_result
+
+
+def _negotiate(request, payload):
+    """Return msgpack instead of JSON when the client asks for it."""
+    if msgpack is not None and MSGPACK_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(content=packb(payload), media_type=MSGPACK_MEDIA_TYPE)
+    return payload
+
+
+def _run_quiz_job(subject, level, num_questions, reveal_format=True, language="English", profile=None, tenant=None):
+    with tenant_scope(tenant):
+        quiz_result = generate_quiz(subject, level, num_questions, reveal_answer=reveal_format, profile=profile)
+        return _store_quiz(quiz_result, subject, level, language)
+
+
+def _run_tutor_job(subject, level, question, learning_style, background, language, profile=None, tenant=None):
+    with tenant_scope(tenant):
+        return {"response": generate_tutoring_response(subject, level, question, learning_style, background,
+                                                       language, profile)}
+
+
+def _tenant_max_in_flight(tenant):
+    return quota_for(tenant)["max_in_flight"]
+
+
+# Background generations for the /jobs API, decoupled from request concurrency
+job_runner = JobRunner(create_job_store(), {"quiz": _run_quiz_job, "tutor": _run_tutor_job},
+                       tenant_max_running=_tenant_max_in_flight)
+
+
+# Upstream tokens, latency and cache hits per tenant, in time buckets
+usage_store = get_usage_store()
+
+
+# Rendered /quiz-html pages and the per-question fragments they are built from
+quiz_pages = QuizPageCache()
+
+
+# Prerequisite graphs behind /study-plan, persisted across restarts
+curriculum_store = CurriculumStore()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    job_runner.start()
+    hot_keys.start()
+    usage_store.start()
+    if WARMUP_ENABLED:
+        warmup_runner.start()
+    yield
+    job_runner.shutdown()
+    quiz_prefetcher.shutdown()
+    warmup_runner.shutdown()
+    hot_keys.shutdown()
+    usage_store.shutdown()
+
+
 app = FastAPI(
     title="AI Tutor API",
     description="API for generating personalized tutoring content and quizzes",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -27,6 +139,154 @@ app.add_middleware(
 )
 
 
+# One admission controller per generation endpoint, shared fairly between tenants
+admission_controllers = {
+    "tutor": AdmissionController("tutor", tenant_max_in_flight=_tenant_max_in_flight),
+    "quiz": AdmissionController("quiz", tenant_max_in_flight=_tenant_max_in_flight),
+    # Stored quizzes served in another language, kept apart so cached pages never wait behind generations
+    "translation": AdmissionController("translation", tenant_max_in_flight=_tenant_max_in_flight),
+}
+
+
+def _prefetch_quiz(subject, level, num_questions, reveal_answer):
+    quiz_result = generate_quiz(subject, level, num_questions, reveal_answer=reveal_answer)
+    quiz_result["level"] = level
+    return quiz_result
+
+
+def _foreground_busy():
+    # Requests queueing for a generation slot: speculation would only add to it
+    return admission_controllers["quiz"].waiting > 0
+
+
+# Next quiz per session, generated while the student answers the current one
+quiz_prefetcher = QuizPrefetcher(_prefetch_quiz, is_busy=_foreground_busy)
+
+
+def _warm_quiz(subject, level, num_questions):
+    if quiz_bank.available(subject, level, num_questions) >= WARMUP_QUIZZES_PER_KEY:
+        return
+    quiz_result = generate_quiz(subject, level, num_questions, reveal_answer=False)
+    if quiz_result["partial"]:
+        raise Exception("Quiz was incomplete, not banking it")
+    quiz_bank.add(quiz_result["quiz"], subject, level)
+
+
+def _warm_tutor(subject, level, question, learning_style, background, profile=None):
+    # Fills the source-language answer cache that every language is translated from
+    generate_tutoring_response(subject, level, question, learning_style, background,
+                               TRANSLATION_SOURCE_LANGUAGE, profile)
+
+
+def _banked_quiz(subject, level, num_questions, reveal_answer):
+    record = quiz_bank.take(subject, level, num_questions)
+    if record is None:
+        return None
+    quiz_result = {"quiz": record["quiz"], "partial": False, "level": record["level"], "prefetched": True}
+    if reveal_answer:
+        quiz_result["formatted_quiz"] = _format_quiz_with_reveal(record["quiz"])
+    return quiz_result
+
+
+# Pre-generates the most requested content from the access log after startup
+warmup_runner = WarmupRunner({"quiz": _warm_quiz, "tutor": _warm_tutor},
+                             plan=lambda: hot_key_plan(hot_keys, access_log=access_log), is_busy=_foreground_busy)
+
+
+def _admission_controller_for(request):
+    path = request.url.path
+    if path == "/tutor":
+        return admission_controllers["tutor"]
+    # /quiz-html/{quiz_id} only renders a stored quiz; the three-part form generates one
+    if path == "/quiz" or (path.startswith("/quiz-html/") and path.count("/") > 2):
+        return admission_controllers["quiz"]
+    # A stored quiz costs upstream calls only when served in another language
+    if path.startswith(_STORED_QUIZ_PATHS) and needs_translation(request.query_params.get("language")):
+        return admission_controllers["translation"]
+    return None
+
+
+# Endpoints that may call the LLM and therefore count against a tenant's token quota
+_METERED_PATHS = ("/study-plan", "/jobs/quiz", "/jobs/tutor", "/grade")
+_STORED_QUIZ_PATHS = ("/quiz/", "/quiz-html/")
+
+
+class AdmissionMiddleware:
+    """
+    Bound in-flight generations per endpoint and shed load with 503 + Retry-After.
+    Tenants over their hourly token quota get a 429.
+
+    A plain ASGI middleware rather than @app.middleware("http"): Starlette's
+    BaseHTTPMiddleware does not pass http.disconnect through to the endpoint,
+    so run_until_disconnect could never notice a client going away.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        try:
+            tenant = resolve_tenant(request.headers)
+        except UnknownCredential as e:
+            response = JSONResponse(status_code=401, content={"detail": str(e)})
+            await response(scope, receive, send)
+            return
+        # Inherited by the endpoint and its worker threads, so upstream calls are billed to the tenant
+        current_tenant.set(tenant)
+        controller = _admission_controller_for(request)
+        if controller is not None or scope["path"] in _METERED_PATHS:
+            try:
+                usage_store.check_quota(tenant)
+            except QuotaExceeded as e:
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": str(e)},
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+                await response(scope, receive, send)
+                return
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            started = await controller.acquire(tenant)
+        except Overloaded as e:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Server is busy ({e.reason}), please retry"},
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        # Shared with request.state, where run_until_disconnect stores the generation task
+        state = scope.setdefault("state", {})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # An abandoned generation keeps its slot until the upstream call returns
+            generation = state.get("generation")
+            if generation is not None and not generation.done():
+                generation.add_done_callback(lambda _: controller.release(started, tenant))
+            else:
+                controller.release(started, tenant)
+
+
+app.add_middleware(AdmissionMiddleware)
+
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody is listening; 499 mirrors the nginx convention for access logs
+    return Response(status_code=499)
+
+
 class TutorRequest(BaseModel):
     subject: str = Field(..., description="Academic subject")
     level: str = Field(..., description="Learning level (Beginner, Intermediate, Advanced)")
@@ -34,6 +294,8 @@ class TutorRequest(BaseModel):
     learning_style: str = Field("Text-based", description="Preferred learning style")
     background: str = Field("Unknown", description="Background knowledge level")
     language: str = Field("English", description="Preferred language")
+    profile: Optional[Literal["fast", "balanced", "thorough"]] = Field(
+        None, description="Generation profile: decoding parameters, token cap and timeout")
 
 
 class QuizRequest(BaseModel):
@@ -41,6 +303,53 @@ class QuizRequest(BaseModel):
     level: str = Field(..., description="Learning level")
     num_questions: int = Field(5, description="Number of quiz questions", ge=1, le=10)
     reveal_format: Optional[bool] = Field(True, description="Whether to format with hidden answers")
+    language: str = Field("English", description="Language of the questions; generated once, then translated")
+    profile: Optional[Literal["fast", "balanced", "thorough"]] = Field(
+        None, description="Generation profile: decoding parameters, token cap and timeout")
+    session_id: Optional[str] = Field(None, description="Client session; enables speculative generation of the next quiz")
+
+
+class TutorJobRequest(TutorRequest):
+    callback_url: Optional[str] = Field(None, description="URL that receives the finished job as a POST")
+
+
+class QuizJobRequest(QuizRequest):
+    callback_url: Optional[str] = Field(None, description="URL that receives the finished job as a POST")
+
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    kind: str
+    status: str = Field(..., description="queued, running, completed or failed")
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+class StudyPlanRequest(BaseModel):
+    subject: str = Field(..., description="Academic subject")
+    level: str = Field(..., description="Learning level")
+    goals: List[str] = Field(default_factory=list, description="Topics to reach; the whole curriculum if empty")
+    mastered: List[str] = Field(default_factory=list, description="Topics the student already knows")
+    hours_per_week: Optional[float] = Field(None, description="Study hours per week, used to schedule weeks", gt=0)
+
+
+class StudyPlanStep(BaseModel):
+    step: int
+    topic: str
+    description: str
+    hours: float
+    prerequisites: List[str]
+    week: Optional[int] = None
+
+
+class StudyPlanResponse(BaseModel):
+    subject: str
+    level: str
+    plan: List[StudyPlanStep]
+    total_hours: float
+    generated_topics: int = Field(..., description="Topics generated by the LLM for this request")
 
 
 class QuizQuestion(BaseModel):
@@ -54,61 +363,336 @@ class TutorResponse(BaseModel):
     response: str
 
 class QuizResponse(BaseModel):
-    quiz: List[Dict[str, Any]]
+    quiz: List[QuizQuestion]
     formatted_quiz: Optional[str] = None
+    partial: bool = Field(False, description="True if fewer questions than requested could be generated in time")
+    level: Optional[str] = Field(None, description="Level of the served quiz; a prefetched quiz may be adapted to the last score")
+    prefetched: bool = Field(False, description="True if the quiz was generated ahead of the request")
+    quiz_id: Optional[str] = Field(None, description="ID to submit answers to /grade")
+    untranslated: int = Field(0, description="Segments that failed to translate and are shown in the source language; retry for a full translation")
+
+
+class GradeSubmission(BaseModel):
+    student_id: str
+    answers: List[Optional[Union[int, str]]] = Field(..., description="Per question: option text, letter, or 0-based index")
+
+
+class GradeRequest(BaseModel):
+    quiz_id: str = Field(..., description="ID returned by /quiz")
+    language: Optional[str] = Field(None, description="Language the quiz was served in; option text answers are matched in it")
+    session_id: Optional[str] = Field(None, description="Session the quiz was served to; its score steers that session's next quiz")
+    submissions: List[GradeSubmission] = Field(..., min_length=1)
+
+
+class StudentGrade(BaseModel):
+    student_id: str
+    correct: int
+    total: int
+    percent: float
+
+
+class QuestionStats(BaseModel):
+    index: int
+    question: str
+    difficulty: Optional[float] = Field(None, description="Proportion of students answering correctly")
+    discrimination: Optional[float] = Field(None, description="Corrected point-biserial correlation with the rest score")
+    unanswered: int
+    option_counts: List[int]
+
+
+class GradeResponse(BaseModel):
+    quiz_id: str
+    subject: str
+    level: str
+    students: List[StudentGrade]
+    questions: List[QuestionStats]
+    summary: Dict[str, Any]
 
 
 @app.post("/tutor", response_model=TutorResponse)
-async def handle_tutoring_request(data: TutorRequest):
+async def handle_tutoring_request(data: TutorRequest, request: Request):
     """
      Generate a personalized tutoring explanation based on user preferences.
     """
+    _record_request("tutor", subject=data.subject, level=data.level, question=data.question,
+                    learning_style=data.learning_style, background=data.background, profile=data.profile)
     try:
-        explanation = generate_tutoring_response(
+        explanation = await run_until_disconnect(
+            request,
+            generate_tutoring_response,
             data.subject,
             data.level,
             data.question,
             data.learning_style,
             data.background,
-            data.language
+            data.language,
+            data.profile
         )
         return {"response": explanation}
+    except ClientDisconnected:
+        raise
+    except TranslationIncomplete as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating explanation: {str(e)}")
 
 
 @app.post("/quiz", response_model=QuizResponse)
-async def generate_quiz_api(data: QuizRequest):
+async def generate_quiz_api(data: QuizRequest, request: Request):
     """
      Generate a quiz with multiple-choice questions based on subject and level.
+     Send `Accept: application/msgpack` to receive the response as msgpack.
+     With a session_id, the session's next quiz is generated in the background.
     """
     try:
-        quiz_result = generate_quiz(
-            data.subject,
-            data.level,
-            data.num_questions,
-            reveal_answer=data.reveal_format
-        )
-        # The generate_quiz function now returns the correct format directly
-        return quiz_result
+        _record_request("quiz", subject=data.subject, level=data.level, num_questions=data.num_questions)
+        quiz_result = None
+        prefetched = quiz_prefetcher.claim(data.session_id, data.subject, data.level, data.num_questions,
+                                           data.reveal_format) if data.session_id else None
+        if prefetched is not None:
+            try:
+                quiz_result = await asyncio.wrap_future(prefetched)
+                quiz_result["prefetched"] = True
+            except Exception as e:
+                logger.warning(f"Prefetched quiz failed, generating a fresh one: {str(e)}")
+
+        if quiz_result is None:
+            quiz_result = _banked_quiz(data.subject, data.level, data.num_questions, data.reveal_format)
+
+        if quiz_result is not None:
+            usage_store.record_cache_hit(current_tenant.get())
+        else:
+            quiz_result = await run_until_disconnect(
+                request,
+                generate_quiz,
+                data.subject,
+                data.level,
+                data.num_questions,
+                reveal_answer=data.reveal_format,
+                profile=data.profile
+            )
+            quiz_result["level"] = data.level
 
+        level = quiz_result["level"]
+        # Translation may call the LLM; keep it off the event loop
+        quiz_result = await asyncio.to_thread(_store_quiz, quiz_result, data.subject, level, data.language)
+        if data.session_id:
+            quiz_prefetcher.schedule(data.session_id, data.subject, level, data.num_questions,
+                                     data.reveal_format, quiz_id=quiz_result["quiz_id"], requested_level=data.level)
+        return _negotiate(request, quiz_result)
+
+    except ClientDisconnected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating quiz: {str(e)}")
 
 
-@app.get("/quiz-html/{subject}/{level}/{num_questions}", response_class=HTMLResponse)
-async def generate_quiz_html(subject: str, level: str, num_questions: int = 5):
+@app.get("/quiz-html/{subject}/{level}/{num_questions}")
+async def generate_quiz_html(subject: str, level: str, request: Request, num_questions: int = 5):
     """ 
-    Get a formatted HTML quiz page.
+    Generate a quiz and redirect to its shareable /quiz-html/{quiz_id} page.
     """
+    _record_request("quiz", subject=subject, level=level, num_questions=num_questions)
     try:
-        quiz_result = generate_quiz(subject, level, num_questions, reveal_answer=True)
-        return quiz_result["formatted_quiz"]
+        quiz_result = _banked_quiz(subject, level, num_questions, reveal_answer=False)
+        if quiz_result is not None:
+            usage_store.record_cache_hit(current_tenant.get())
+        else:
+            # The page is rendered from cached fragments, not by generate_quiz
+            quiz_result = await run_until_disconnect(request, generate_quiz, subject, level, num_questions,
+                                                     reveal_answer=False)
+        quiz_id = await asyncio.to_thread(quiz_store.save, quiz_result["quiz"], subject, level)
+    except ClientDisconnected:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating quiz HTML: {str(e)}")
+    return RedirectResponse(f"/quiz-html/{quiz_id}", status_code=303)
+
+
+@app.get("/quiz-html/{quiz_id}", response_class=HTMLResponse)
+async def get_quiz_html(quiz_id: str, request: Request, questions: Optional[str] = None, language: str = "English"):
+    """
+    Serve the HTML page of a stored quiz from the page cache.
+    `questions` selects and orders questions, e.g. "3,1" (1-based).
+    """
+    record = None
+    if questions:
+        # The selection is validated against the quiz length before the cache lookup
+        record = quiz_store.get(quiz_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Quiz {quiz_id} not found")
+        try:
+            order = parse_order(questions, len(record["quiz"]))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid question selection: {str(e)}")
+    else:
+        order = None
+
+    cached = quiz_pages.get(quiz_id, order, language)
+    if cached is None:
+        record = record or quiz_store.get(quiz_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail=f"Quiz {quiz_id} not found")
+        try:
+            translated = await asyncio.to_thread(translate_quiz, {"quiz": record["quiz"]}, language)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error translating quiz: {str(e)}")
+        if translated.get("untranslated"):
+            # Failed segments are shown in the source language and retried on the next request
+            page, _ = quiz_pages.render(quiz_id, translated["quiz"], order, language, cache=False)
+            return HTMLResponse(page, headers={"Cache-Control": "no-store"})
+        cached = quiz_pages.render(quiz_id, translated["quiz"], order, language)
+
+    page, etag = cached
+    # A quiz ID is derived from its content, so a fully translated page never changes
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={QUIZ_HTML_MAX_AGE}, immutable"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return HTMLResponse(page, headers=headers)
+
+
+@app.get("/quiz/{quiz_id}", response_model=QuizResponse)
+async def get_quiz(quiz_id: str, request: Request, language: str = "English"):
+    """
+    Serve a stored quiz, optionally translated. Each language costs a
+    translation of the segments not yet in the translation memory, not a new generation.
+    """
+    record = quiz_store.get(quiz_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Quiz {quiz_id} not found")
+
+    quiz_result = {"quiz": record["quiz"], "level": record["level"], "quiz_id": quiz_id}
+    try:
+        quiz_result = await asyncio.to_thread(translate_quiz, quiz_result, language)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error translating quiz: {str(e)}")
+    quiz_result["quiz"] = to_dicts(quiz_result["quiz"])
+    return _negotiate(request, quiz_result)
+
 
+@app.post("/grade", response_model=GradeResponse)
+async def grade_quiz(data: GradeRequest, request: Request):
+    """
+    Score one or many submissions against a stored quiz and report per-question statistics.
+    """
+    record = quiz_store.get(data.quiz_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Quiz {data.quiz_id} not found")
+
+    questions = record["quiz"]
+    if needs_translation(data.language):
+        # The quiz is stored in the source language; the served translation comes from the translation
+        # memory. The language is in the body, so admission happens here rather than in the middleware.
+        controller = admission_controllers["translation"]
+        tenant = current_tenant.get()
+        try:
+            started = await controller.acquire(tenant)
+        except Overloaded as e:
+            raise HTTPException(status_code=503, detail=f"Server is busy ({e.reason}), please retry",
+                                headers={"Retry-After": str(e.retry_after)})
+        try:
+            questions = (await asyncio.to_thread(translate_quiz, {"quiz": questions}, data.language))["quiz"]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Error translating quiz: {str(e)}")
+        finally:
+            controller.release(started, tenant)
+
+    submissions = [submission.model_dump() for submission in data.submissions]
+    # Large class batches are CPU work; keep them off the event loop
+    result = await asyncio.to_thread(grade_submissions, questions, submissions)
+    if data.session_id and len(submissions) == 1:
+        # A single student's score steers the level of their prefetched next quiz
+        quiz_prefetcher.record_accuracy(data.quiz_id, data.session_id, result["students"][0]["percent"] / 100)
+    return _negotiate(request, {"quiz_id": data.quiz_id, "subject": record["subject"], "level": record["level"], **result})
+
+
+@app.post("/study-plan", response_model=StudyPlanResponse)
+async def generate_study_plan(data: StudyPlanRequest, request: Request):
+    """
+    Build a study plan from the cached curriculum graph, generating only missing topics.
+    """
+    try:
+        return await run_until_disconnect(
+            request,
+            build_study_plan,
+            curriculum_store,
+            data.subject,
+            data.level,
+            goals=data.goals,
+            mastered=data.mastered,
+            hours_per_week=data.hours_per_week,
+            # Topic graphs are long JSON lists; give them the largest token budget
+            generate=get_llm("thorough", kind="curriculum")
+        )
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating study plan: {str(e)}")
+
+
+@app.post("/jobs/tutor", response_model=JobStatusResponse, status_code=202)
+async def submit_tutor_job(data: TutorJobRequest):
+    """
+    Queue a tutoring explanation and return its job ID immediately.
+    """
+    payload = {**data.model_dump(exclude={"callback_url"}), "tenant": current_tenant.get()}
+    try:
+        # Checking the callback URL resolves its host, so keep it off the event loop
+        job = await asyncio.to_thread(job_runner.submit, "tutor", payload, data.callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return public_view(job)
 
 
+@app.post("/jobs/quiz", response_model=JobStatusResponse, status_code=202)
+async def submit_quiz_job(data: QuizJobRequest):
+    """
+    Queue a quiz generation and return its job ID immediately.
+    """
+    payload = {**data.model_dump(exclude={"callback_url", "session_id"}), "tenant": current_tenant.get()}
+    try:
+        # Checking the callback URL resolves its host, so keep it off the event loop
+        job = await asyncio.to_thread(job_runner.submit, "quiz", payload, data.callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return public_view(job)
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str):
+    """
+    Get the status of a queued job, including its result once completed.
+    """
+    job = job_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return public_view(job)
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Dependency of the /admin endpoints: "Authorization: Bearer <ADMIN_TOKEN>"."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.get("/admin/hot-keys", dependencies=[Depends(require_admin)])
+async def get_hot_keys(n: int = 20):
+    """
+    Most requested quiz keys and tutoring questions, with request and distinct-key counts.
+    """
+    return hot_keys.snapshot(n)
+
+
+@app.get("/admin/usage", dependencies=[Depends(require_admin)])
+async def get_usage(tenant: Optional[str] = None, hours: float = 24):
+    """
+    Upstream calls, tokens, latency and cache hits per tenant over the last `hours`.
+    """
+    return await asyncio.to_thread(usage_store.report, tenant, time.time() - hours * 3600)
+
 
 @app.get("/health")
 async def health_check():
@@ -116,4 +700,14 @@ async def health_check():
     Health check endpoint to verify the API is running.
     """
 
-    return {"status": "healthy"}
\ No newline at end of file
+    admission = {name: controller.stats() for name, controller in admission_controllers.items()}
+    return {
+        "status": "healthy",
+        "saturated": any(stats["waiting"] > 0 for stats in admission.values()),
+        "admission": admission,
+        "jobs": job_runner.stats(),
+        "prefetch": quiz_prefetcher.stats(),
+        "warmup": {**warmup_runner.stats(), "banked_quizzes": quiz_bank.size()},
+        "quiz_pages": quiz_pages.stats(),
+        "profiles": profile_metrics.snapshot()
+    }
\ No newline at end of file
@@ -0,0 +1,207 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Background generations never compete with requests for more than this many threads
+PREFETCH_MAX_WORKERS = int(os.getenv("PREFETCH_MAX_WORKERS", "1"))
+# Upstream calls per minute the prefetcher may spend; 0 disables prefetching
+PREFETCH_MAX_PER_MINUTE = float(os.getenv("PREFETCH_MAX_PER_MINUTE", "20"))
+PREFETCH_TTL_SECONDS = int(os.getenv("PREFETCH_TTL_SECONDS", "600"))
+PREFETCH_MAX_SESSIONS = int(os.getenv("PREFETCH_MAX_SESSIONS", "1000"))
+
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+PROMOTE_ACCURACY = 0.8
+DEMOTE_ACCURACY = 0.4
+
+
+def next_level(level, accuracy):
+    """Move one level up after a strong score, one down after a weak one."""
+    if accuracy is None or level not in LEVELS:
+        return level
+    i = LEVELS.index(level)
+    if accuracy >= PROMOTE_ACCURACY:
+        i = min(i + 1, len(LEVELS) - 1)
+    elif accuracy < DEMOTE_ACCURACY:
+        i = max(i - 1, 0)
+    return LEVELS[i]
+
+
+class _Slot:
+    __slots__ = ("subject", "requested_level", "base_level", "level", "num_questions", "reveal", "future",
+                 "expires_at")
+
+    def __init__(self, subject, requested_level, base_level, level, num_questions, reveal, future, expires_at):
+        # requested_level is what the client asks for, base_level the level of
+        # the quiz just served (adaptation starts from it), level the prefetch's
+        self.subject = subject
+        self.requested_level = requested_level
+        self.base_level = base_level
+        self.level = level
+        self.num_questions = num_questions
+        self.reveal = reveal
+        self.future = future
+        self.expires_at = expires_at
+
+    def serves(self, subject, level, num_questions, reveal):
+        # A quiz adapted from the requested level still counts: the student
+        # is continuing the same track
+        return (self.subject == subject and level in (self.requested_level, self.base_level, self.level)
+                and self.num_questions == num_questions and self.reveal == reveal)
+
+
+class QuizPrefetcher:
+    """
+    Speculatively generates the next quiz of each session in the background.
+
+    Every session has at most one slot. A new quiz is only started when the
+    per-minute upstream budget allows it and `is_busy` reports no foreground
+    pressure. Slots expire after `ttl` seconds and are cancelled when the
+    session asks for a different subject.
+
+    Args:
+        generate (callable): (subject, level, num_questions, reveal_answer) -> quiz result
+        is_busy (callable): Returns True while foreground requests need the upstream
+    """
+
+    def __init__(self, generate, is_busy=None, max_per_minute=PREFETCH_MAX_PER_MINUTE,
+                 ttl=PREFETCH_TTL_SECONDS, max_sessions=PREFETCH_MAX_SESSIONS, max_workers=PREFETCH_MAX_WORKERS):
+        self._generate = generate
+        self._is_busy = is_busy or (lambda: False)
+        self._rate = max_per_minute / 60.0
+        self._capacity = max(1.0, max_per_minute / 10.0)
+        self._tokens = self._capacity
+        self._refilled_at = time.monotonic()
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_workers = max_workers
+        self._slots = OrderedDict()
+        # (quiz_id, session_id) of quizzes served to a session, so its grade can steer its next level
+        self._served = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self.counters = {"scheduled": 0, "hits": 0, "misses": 0, "cancelled": 0, "expired": 0, "skipped": 0}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _take_token(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+        if self._rate <= 0 or self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _drop(self, session_id, counter):
+        slot = self._slots.pop(session_id, None)
+        if slot is not None:
+            # A generation that already started cannot be interrupted; its result is discarded
+            slot.future.cancel()
+            self.counters[counter] += 1
+
+    def _expire(self):
+        now = time.monotonic()
+        for session_id in [s for s, slot in self._slots.items() if slot.expires_at <= now]:
+            self._drop(session_id, "expired")
+
+    def claim(self, session_id, subject, level, num_questions, reveal):
+        """
+        Take the prefetched quiz for this request, if there is one.
+
+        Returns:
+            Future: Resolves to the quiz result (running or done), or None on a miss
+        """
+
+        with self._lock:
+            self._expire()
+            slot = self._slots.get(session_id)
+            if slot is None:
+                self.counters["misses"] += 1
+                return None
+            if not slot.serves(subject, level, num_questions, reveal):
+                # Subject or settings changed: the speculation is useless now
+                self._drop(session_id, "cancelled")
+                self.counters["misses"] += 1
+                return None
+            if not (slot.future.running() or slot.future.done()):
+                # Still queued behind other sessions: a foreground generation is faster
+                self._drop(session_id, "cancelled")
+                self.counters["misses"] += 1
+                return None
+            del self._slots[session_id]
+            self.counters["hits"] += 1
+            return slot.future
+
+    def _allowed(self):
+        if self._is_busy() or not self._take_token():
+            self.counters["skipped"] += 1
+            return False
+        return True
+
+    def _start(self, session_id, subject, requested_level, base_level, level, num_questions, reveal):
+        """Start a speculative generation (called with the lock held)."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+        future = self._executor.submit(self._generate, subject, level, num_questions, reveal)
+        self._slots[session_id] = _Slot(subject, requested_level, base_level, level, num_questions, reveal, future,
+                                        time.monotonic() + self.ttl)
+        while len(self._slots) > self.max_sessions:
+            self._drop(next(iter(self._slots)), "expired")
+        self.counters["scheduled"] += 1
+        logger.info(f"Prefetching {level} {subject} quiz for session {session_id}")
+
+    def schedule(self, session_id, subject, level, num_questions, reveal, quiz_id=None, requested_level=None):
+        """
+        Queue the likely next quiz after one was served to a session.
+
+        The next quiz starts at the same level; `record_accuracy` moves it
+        up or down once the served quiz is graded.
+
+        Args:
+            level (str): Level of the quiz just served
+            quiz_id (str): ID of the quiz just served, so a later grade can retarget the slot
+            requested_level (str): Level the client asked for, which its next request will repeat
+        """
+
+        with self._lock:
+            self._expire()
+            if quiz_id:
+                # A banked or cached quiz can be served to many sessions
+                self._served[(quiz_id, session_id)] = True
+                while len(self._served) > self.max_sessions * 4:
+                    self._served.popitem(last=False)
+            self._drop(session_id, "cancelled")
+            if self._allowed():
+                self._start(session_id, subject, requested_level or level, level, level, num_questions, reveal)
+
+    def record_accuracy(self, quiz_id, session_id, accuracy):
+        """Retarget a session's pending quiz once the quiz served to it has been graded."""
+        with self._lock:
+            if (quiz_id, session_id) not in self._served:
+                return
+            slot = self._slots.get(session_id)
+            if slot is None:
+                return
+            level = next_level(slot.base_level, accuracy)
+            # Without budget for a replacement, the quiz at the old level is still useful
+            if level == slot.level or not self._allowed():
+                return
+            self._drop(session_id, "cancelled")
+            self._start(session_id, slot.subject, slot.requested_level, slot.base_level, level, slot.num_questions,
+                        slot.reveal)
+
+    def cancel(self, session_id):
+        with self._lock:
+            self._drop(session_id, "cancelled")
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._slots), "tokens": round(self._tokens, 2), **self.counters}
@@ -0,0 +1,113 @@
+import os
+import threading
+from dataclasses import dataclass
+
+# Profile used when a request does not name one
+DEFAULT_PROFILE = os.getenv("GENERATION_PROFILE", "balanced")
+
+# Tokens for the JSON array brackets and any preamble the model adds
+_QUIZ_OVERHEAD_TOKENS = 40
+# A pretty-printed quiz array closes with a bracket on its own line; stopping
+# there drops any trailing commentary (the bracket is put back before parsing)
+QUIZ_STOP = "\n]"
+# A translation is rarely longer in tokens than its source is in characters
+_TRANSLATION_TOKENS_PER_CHAR = 1.0
+_TRANSLATION_OVERHEAD_TOKENS = 100
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """
+    Decoding parameters for one speed/quality trade-off.
+
+    Quiz completions are capped at tokens_per_question for every requested
+    question, so a short quiz can never produce a long completion.
+    """
+
+    name: str
+    temperature: float
+    tokens_per_question: int
+    tutor_max_tokens: int
+    timeout: float
+
+    def quiz_params(self, num_questions):
+        return {
+            "temperature": self.temperature,
+            "max_tokens": _QUIZ_OVERHEAD_TOKENS + num_questions * self.tokens_per_question,
+            "stop": [QUIZ_STOP],
+            "timeout": self.timeout,
+        }
+
+    def tutor_params(self):
+        return {
+            "temperature": self.temperature,
+            "max_tokens": self.tutor_max_tokens,
+            "timeout": self.timeout,
+        }
+
+    def translation_params(self, source_chars):
+        return {
+            "temperature": 0,
+            "max_tokens": _TRANSLATION_OVERHEAD_TOKENS + int(source_chars * _TRANSLATION_TOKENS_PER_CHAR),
+            "timeout": self.timeout,
+        }
+
+
+PROFILES = {
+    "fast": GenerationProfile("fast", temperature=0.3, tokens_per_question=110, tutor_max_tokens=400, timeout=15),
+    "balanced": GenerationProfile("balanced", temperature=0.7, tokens_per_question=160, tutor_max_tokens=900,
+                                  timeout=30),
+    "thorough": GenerationProfile("thorough", temperature=0.7, tokens_per_question=260, tutor_max_tokens=1800,
+                                  timeout=60),
+}
+
+
+def get_profile(name=None):
+    """Look up a profile by name; None selects DEFAULT_PROFILE."""
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown generation profile: {name}. Choose from {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+class ProfileMetrics:
+    """Per-profile call counts, latency, token usage and truncations."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def record(self, profile, kind, latency, usage=None, finish_reason=None, error=None):
+        with self._lock:
+            metrics = self._metrics.setdefault(profile, {
+                "calls": 0, "errors": 0, "timeouts": 0, "truncated": 0, "by_kind": {},
+                "latency_total": 0.0, "latency_max": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            })
+            metrics["calls"] += 1
+            metrics["by_kind"][kind] = metrics["by_kind"].get(kind, 0) + 1
+            metrics["latency_total"] += latency
+            metrics["latency_max"] = max(metrics["latency_max"], latency)
+            if error is not None:
+                metrics["errors"] += 1
+                if "timeout" in type(error).__name__.lower() or "timed out" in str(error).lower():
+                    metrics["timeouts"] += 1
+            if finish_reason == "length":
+                metrics["truncated"] += 1
+            if usage is not None:
+                metrics["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+                metrics["completion_tokens"] += getattr(usage, "completion_tokens", 0) or 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    **{key: value for key, value in metrics.items() if key != "latency_total"},
+                    "by_kind": dict(metrics["by_kind"]),
+                    "latency_avg": round(metrics["latency_total"] / metrics["calls"], 3),
+                    "latency_max": round(metrics["latency_max"], 3),
+                }
+                for name, metrics in self._metrics.items()
+            }
+
+
+profile_metrics = ProfileMetrics()
@@ -0,0 +1,377 @@
+import os
+import io
+import csv
+import json
+import html
+import argparse
+import logging
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from quiz_html import _QUIZ_HTML_HEAD, _QUIZ_HTML_TAIL, _format_question_html
+from quiz_model import as_question
+
+logger = logging.getLogger(__name__)
+
+# Questions are rendered in batches so a worker process gets enough work to
+# amortise the pickling cost, and only a bounded window of batches is in
+# flight at once so memory stays constant regardless of export size.
+DEFAULT_BATCH_SIZE = 200
+
+
+def _umask_file_mode():
+    """Permissions open() would give a new file: 0666 less the process umask."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+# mkstemp creates files as 0600; exports get the usual permissions instead.
+# Read once at import, as reading the umask briefly changes it.
+_FILE_MODE = _umask_file_mode()
+
+
+class QuizWriter:
+    """Base class for streaming quiz writers.
+
+    A writer renders a header, one chunk per question and a footer. Rendering
+    is pure (no file access) so batches can be rendered in worker processes.
+    """
+
+    extension = ".txt"
+
+    def header(self):
+        return ""
+
+    def render(self, index, question):
+        raise NotImplementedError
+
+    def footer(self):
+        return ""
+
+
+class HtmlQuizWriter(QuizWriter):
+    """Interactive HTML page, identical to `_format_quiz_with_reveal`."""
+
+    extension = ".html"
+
+    def header(self):
+        return _QUIZ_HTML_HEAD
+
+    def render(self, index, question):
+        return _format_question_html(index, question)
+
+    def footer(self):
+        return _QUIZ_HTML_TAIL
+
+
+class PrintableHtmlQuizWriter(QuizWriter):
+    """Static, script-free HTML suitable for printing exam papers."""
+
+    extension = ".html"
+
+    def header(self):
+        return (
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"UTF-8\">\n"
+            "<style>\n"
+            "body { font-family: Georgia, serif; color: #000; background: #fff; }\n"
+            ".question { page-break-inside: avoid; margin-bottom: 24px; }\n"
+            ".answer { font-size: 11px; color: #555; }\n"
+            "</style>\n</head>\n<body>\n"
+        )
+
+    def render(self, index, question):
+        options = "".join(
+            f"<li>{html.escape(option)}</li>\n" for option in question.options
+        )
+        return (
+            f"<div class=\"question\">\n"
+            f"<p><strong>{index}.</strong> {html.escape(question.question)}</p>\n"
+            f"<ol type=\"A\">\n{options}</ol>\n"
+            f"<p class=\"answer\">Answer: {html.escape(question.correct_answer)}</p>\n"
+            f"</div>\n"
+        )
+
+    def footer(self):
+        return "</body>\n</html>\n"
+
+
+class JsonlQuizWriter(QuizWriter):
+    """One JSON question object per line."""
+
+    extension = ".jsonl"
+
+    def render(self, index, question):
+        return json.dumps(question.to_dict(), ensure_ascii=False) + "\n"
+
+
+class CsvQuizWriter(QuizWriter):
+    """Flat CSV with one row per question and one column per option."""
+
+    extension = ".csv"
+    columns = ["index", "question", "option_a", "option_b", "option_c", "option_d",
+               "correct_answer", "explanation"]
+
+    def _row(self, values):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        return buffer.getvalue()
+
+    def header(self):
+        return self._row(self.columns)
+
+    def render(self, index, question):
+        options = (list(question.options) + ["", "", "", ""])[:4]
+        return self._row([index, question.question, *options,
+                          question.correct_answer, question.explanation])
+
+
+def _gift_escape(text):
+    """Escape the characters that have special meaning in Moodle GIFT."""
+    text = str(text)
+    for char in "\\~=#{}:":
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+class GiftQuizWriter(QuizWriter):
+    """Moodle GIFT import format."""
+
+    extension = ".gift"
+
+    def render(self, index, question):
+        lines = [f"::Q{index}:: {_gift_escape(question.question)} {{"]
+        for j, option in enumerate(question.options):
+            mark = "=" if j == question.correct_index else "~"
+            lines.append(f"  {mark}{_gift_escape(option)}")
+        if question.explanation:
+            lines.append(f"  ####{_gift_escape(question.explanation)}")
+        lines.append("}\n\n")
+        return "\n".join(lines)
+
+
+class QtiQuizWriter(QuizWriter):
+    """IMS QTI 1.2 assessment XML with single-choice items."""
+
+    extension = ".xml"
+
+    def header(self):
+        return (
+            "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+            "<questestinterop>\n"
+            "<assessment ident=\"quiz\" title=\"Quiz\">\n"
+            "<section ident=\"root_section\">\n"
+        )
+
+    def render(self, index, question):
+        esc = html.escape
+        labels = "".join(
+            f"<response_label ident=\"{j}\"><material><mattext>{esc(option)}</mattext>"
+            f"</material></response_label>\n"
+            for j, option in enumerate(question.options)
+        )
+        condition = (
+            f"<respcondition><conditionvar><varequal respident=\"response{index}\">"
+            f"{question.correct_index}</varequal></conditionvar>"
+            f"<setvar action=\"Set\">100</setvar></respcondition>\n"
+        )
+        return (
+            f"<item ident=\"q{index}\" title=\"Question {index}\">\n"
+            f"<presentation><material><mattext>{esc(question.question)}</mattext></material>\n"
+            f"<response_lid ident=\"response{index}\" rcardinality=\"Single\"><render_choice>\n"
+            f"{labels}</render_choice></response_lid></presentation>\n"
+            f"<resprocessing>{condition}</resprocessing>\n"
+            f"</item>\n"
+        )
+
+    def footer(self):
+        return "</section>\n</assessment>\n</questestinterop>\n"
+
+
+WRITERS = {
+    "html": HtmlQuizWriter,
+    "print": PrintableHtmlQuizWriter,
+    "jsonl": JsonlQuizWriter,
+    "csv": CsvQuizWriter,
+    "gift": GiftQuizWriter,
+    "qti": QtiQuizWriter,
+}
+
+
+def _batched(questions, batch_size):
+    """Group an iterable of questions into lists of at most `batch_size`."""
+    batch = []
+    for question in questions:
+        batch.append(question)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _render_batch(writer, start, batch):
+    """Render a batch of questions numbered from `start` (runs in workers)."""
+    return "".join(writer.render(start + offset, question) for offset, question in enumerate(batch))
+
+
+def _render_chunks(writer, questions, batch_size, workers):
+    """Yield rendered chunks in order, optionally across worker processes."""
+    start = 1
+    if workers <= 1:
+        for batch in _batched(questions, batch_size):
+            yield _render_batch(writer, start, batch)
+            start += len(batch)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for batch in _batched(questions, batch_size):
+            pending.append(pool.submit(_render_batch, writer, start, batch))
+            start += len(batch)
+            # Keep a bounded window in flight so output stays ordered and
+            # memory does not grow with the size of the export.
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class _counting:
+    """Iterator wrapper that counts the items it yields."""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.count = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = next(self._iterator)
+        self.count += 1
+        return item
+
+
+def _valid_questions(questions, skipped):
+    """Convert bank rows to Question objects, skipping (and recording) rows without a valid answer key."""
+    for row, question in enumerate(questions, 1):
+        try:
+            yield as_question(question)
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Skipping question {row}: {str(e)}")
+            skipped.append((row, str(e)))
+
+
+def export_questions(questions, file_path, fmt="html", batch_size=DEFAULT_BATCH_SIZE, workers=1, skipped=None):
+    """
+    Stream questions to a file in the requested format.
+
+    The output is written to a temporary file next to `file_path` and renamed
+    into place once complete, so readers never see a partially written export.
+
+    Args:
+        questions (iterable): Question objects or dictionaries (may be a generator)
+        file_path (str): Destination path
+        fmt (str): One of the keys of WRITERS
+        batch_size (int): Number of questions rendered per chunk
+        workers (int): Number of rendering processes (1 renders in-process)
+        skipped (list): If given, (row number, reason) of every question left out is appended;
+            a question whose correct answer matches no option is never written with a guessed key
+
+    Returns:
+        int: Number of questions written
+    """
+
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export format: {fmt}. Choose from {', '.join(WRITERS)}")
+
+    writer = WRITERS[fmt]()
+    skipped = [] if skipped is None else skipped
+    counted = _counting(_valid_questions(questions, skipped))
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".export-", suffix=writer.extension, dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            f.write(writer.header())
+            for chunk in _render_chunks(writer, counted, batch_size, workers):
+                f.write(chunk)
+            f.write(writer.footer())
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, _FILE_MODE)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    logger.info(f"Exported {counted.count} questions as {fmt} to {file_path}"
+                + (f", skipped {len(skipped)} invalid" if skipped else ""))
+    return counted.count
+
+
+def iter_questions_from_file(path):
+    """
+    Stream questions from a question bank file.
+
+    JSON Lines files are read one line at a time; plain JSON files must hold
+    a list of questions (or a {"quiz": [...]} API response) and are loaded whole.
+    """
+
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("quiz", [])
+    yield from data
+
+
+def iter_generated_questions(subject, level, total, per_request=10):
+    """Stream freshly generated questions by calling the LLM in small quizzes."""
+    from ai_engine import generate_quiz
+
+    remaining = total
+    while remaining > 0:
+        count = min(per_request, remaining)
+        result = generate_quiz(subject, level, count, reveal_answer=False)
+        yield from result["quiz"]
+        remaining -= count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk export quiz questions")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Question bank file (.json or .jsonl)")
+    source.add_argument("--subject", help="Generate questions for this subject")
+    parser.add_argument("--level", default="Beginner", help="Level used when generating")
+    parser.add_argument("--count", type=int, default=10, help="Number of questions to generate")
+    parser.add_argument("--format", dest="fmt", choices=sorted(WRITERS), default="html")
+    parser.add_argument("--output", required=True, help="Destination file")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Rendering processes; raise for very large exports")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        questions = iter_questions_from_file(args.input)
+    else:
+        questions = iter_generated_questions(args.subject, args.level, args.count)
+
+    skipped = []
+    written = export_questions(questions, args.output, args.fmt, args.batch_size, args.workers, skipped)
+    print(f"Wrote {written} questions to {args.output}")
+    for row, reason in skipped:
+        print(f"Skipped question {row}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+from html import escape
+
+# Interactive quiz HTML. Kept apart from ai_engine, which builds the LLM client
+# on import, so offline exports and page rendering work without OPENAI_API_KEY.
+_QUIZ_HTML_HEAD = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+      <meta charset="UTF-8">
+      <meta name="viewport" content="width=device-width, initial-scale=1.0">
+      <style>
+          body {
+            font-family: Arial, sans-serif;
+            color: white;
+            background-color: #121212;
+          }
+
+        .quiz-container {
+           max-width: 800px;
+           margin: 0 auto;
+           padding: 20px;
+        }
+
+        .question {
+            margin-bottom: 30px;
+            padding: 20px;
+            border: 1px solid #444;
+            border-radius: 10px;
+            background-color: #1e1e2f;
+        }
+
+        .question h3 {
+          margin-top: 0;
+          color: #90caf9
+        }
+
+        .options {
+          margin-left: 10px;
+        }
+
+        .option {
+           margin: 10px 0;
+           padding: 12px;
+           border: 1px solid #555;
+           border-radius: 6px;
+           cursor: pointer;
+           background-color: #2d2d44;
+           transition: background-color 0.2s;
+        }
+
+
+        .option:hover {
+           background-color: #3a3a5a;
+        }
+
+        .reveal-btn {
+          background-color: #2196f3;
+          color: white;
+          border: none;
+          padding: 10px 20px;
+          border-radius: 5px;
+          cursor: pointer;
+          font-weight: bold;
+          margin-top: 15px;
+          transition: background-color 0.2s;
+        }
+
+        .reveal-btn:hover {
+          background-color: #0d8bf2;
+        }
+
+        .answer-section {
+          margin-top: 20px;
+          border: 2px solid #ffeb3b;
+          border-radius: 8px;
+          padding: 0;
+          overflow: hidden;
+          display: none;
+        }
+
+        .answer-header {
+          background-color: #ffeb3b:
+          color: #000;
+          padding: 10px;
+          font-weight: bold;
+          font-size: 16px;
+          text-align: center;
+        }
+         
+        .answer-content {
+         padding: 15px;
+         background-color: #1a237e;
+        }
+
+        .correct-answer {
+           font-size: 18px;
+           font-weight: bold;
+           color: white;
+           margin-bottom: 15px;  
+        }
+
+        .explanation {
+          color: #e1f5fe;
+          font-size: 16px;
+          line-height: 1.5;
+        }
+
+        .selected-correct{
+          background-color: #1b5e20 !important;
+          border-color: #4caf50 !important;
+        }
+
+        .selected-incorrect {
+          background-color: #b71c1c !important;
+          border-color: #f44336 !important;
+        }
+
+      </style>
+
+    </head>
+    <body>
+          <div class="quiz-container">
+          <h2 style="color: #2196f3; text-align: center;
+          margin-bottom: 30px;">Interactive Quiz</h2>
+    """
+
+_QUIZ_HTML_TAIL = """
+           </div>
+           <script>
+               function selectOption(questionNum, optionNum, isCorrect) {
+                   const questionId = `question-${questionNum}`;
+                   const options = document.querySelectorAll(`#${questionId} .option`);
+
+                   // Reset all options
+                   options.forEach(option => {
+                       option.className = 'option';
+                   });
+
+                   // Highlight selected option
+                   const selectedOption = document.getElementById(`option-${questionNum}-${optionNum}`);
+                   if (isCorrect === 'true') {
+                       selectedOption.className = 'option selected-correct';
+                   } else {
+                       selectedOption.className = 'option selected-incorrect';
+                       // Show answer if incorrect
+                       revealAnswer(questionNum);
+                   }
+               }
+
+               function revealAnswer(questionNum) {
+                   const answerDiv = document.getElementById(`answer-${questionNum}`);
+                   answerDiv.style.display = 'block';
+
+                   // Scroll to answer
+                   setTimeout(() => {
+                       answerDiv.scrollIntoView({behavior: 'smooth', block: 'nearest'});
+                   }, 100);
+
+                   // Add animation for attention 
+                   answerDiv.animate([
+                       { transform: 'scale(1)', boxShadow: '0 0 0 rgba(255, 235, 59, 0)'},
+                       { transform: 'scale(1.02)', boxShadow: '0 0 20px rgba(255, 235, 59, 0.7)'}, 
+                       { transform: 'scale(1)', boxShadow: '0 0 10px rgba(255, 235, 59, 0.3)'}
+                   ], {
+                       duration: 1000,
+                       iterations: 1
+                   });
+               }
+           </script>
+        </body>
+        </html>
+    """
+
+
+def _format_question_html(i, question):
+    """
+    Format a single quiz question into its HTML fragment.
+
+    Args:
+       i (int): 1-based question number used in element ids
+       question (Question): The question to render
+
+    Question, option and explanation text is escaped: it comes from the LLM
+    or an imported bank and ends up on shared, publicly cached pages.
+
+    Returns:
+        str: HTML fragment for the question, its options and hidden answer
+    """
+
+    option_letters = ["A", "B", "C", "D"]
+    correct_index = question.correct_index
+
+    html = f"""
+             <div class="question" id="question-{i}">
+                <h3>Question {i}</h3>
+                <p>{escape(question.question)}</p>
+                <div class="options">
+        """
+
+    for j, option in enumerate(question.options):
+        is_correct = j == correct_index
+        html += f"""
+                <div class="option" id="option-{i}-{j}"
+                onclick="selectOption({i}, {j}, {str(is_correct).lower()})">
+                <strong>{option_letters[j]}.</strong>
+                {escape(option)}
+                </div>
+            """
+
+    html += f""" 
+                </div>
+                <button class="reveal-btn" onclick="revealAnswer({i})">SHOW ANSWER</button>
+                <div class="answer-section" id="answer-{i}">
+                    <div class="answer-header">CORRECT ANSWER</div>
+                    <div class="answer-content">
+                        <div class="correct-answer">
+                            {option_letters[correct_index]}. {escape(question.correct_answer)}
+                        </div>
+                        <div class="explanation">{escape(question.explanation)}</div>
+                    </div>
+                </div>
+            </div>
+        """
+
+    return html
+
+
+def _format_quiz_with_reveal(quiz_data):
+    """
+    Format quiz data into HTML with hidden answers that can be revealed on click.
+
+    Args:
+       quiz data (list): List of Question objects
+
+    Returns:
+        str: HTML string with quiz questions and hidden answers 
+    """
+
+    fragments = [_format_question_html(i, question) for i, question in enumerate(quiz_data, 1)]
+    return _QUIZ_HTML_HEAD + "".join(fragments) + _QUIZ_HTML_TAIL
@@ -0,0 +1,267 @@
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from array import array
+from dataclasses import dataclass
+
+from quiz_validation import normalize_correct_answer
+
+try:
+    import msgpack
+except ImportError:  # msgpack responses are optional
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Option strings repeat heavily across a bank ("True", "None of the above",
+# numbers, units...), so every option is interned and stored once
+_intern = sys.intern
+
+
+@dataclass(slots=True)
+class Question:
+    """
+    One multiple-choice question.
+
+    The correct answer is stored as an index into `options` rather than a
+    second copy of the string; `correct_answer` rebuilds it on access.
+    """
+
+    question: str
+    options: tuple
+    correct_index: int
+    explanation: str
+
+    @property
+    def correct_answer(self):
+        return self.options[self.correct_index]
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a question from the API/LLM dict shape, filling a default explanation.
+
+        A letter answer ("b", "Option B") is mapped onto its option first.
+
+        Raises:
+            ValueError: If the correct answer is not one of the options
+        """
+        options = tuple(_intern(str(option)) for option in data["options"])
+        correct = normalize_correct_answer({"correct_answer": data["correct_answer"], "options": list(options)})
+        correct = correct["correct_answer"]
+        if correct is None or str(correct) not in options:
+            raise ValueError(f"Correct answer {correct!r} is not one of the options")
+        correct = str(correct)
+        correct_index = options.index(correct)
+        explanation = data.get("explanation")
+        explanation = f"The correct answer is {correct}." if explanation is None else str(explanation)
+        return cls(str(data["question"]), options, correct_index, explanation)
+
+    def to_dict(self):
+        return {
+            "question": self.question,
+            "options": list(self.options),
+            "correct_answer": self.options[self.correct_index],
+            "explanation": self.explanation,
+        }
+
+
+def as_question(item):
+    """Accept either a Question or a question dict."""
+    return item if isinstance(item, Question) else Question.from_dict(item)
+
+
+def to_dicts(questions):
+    return [question.to_dict() for question in questions]
+
+
+def packb(payload):
+    """Serialize a response payload to msgpack."""
+    if msgpack is None:
+        raise RuntimeError("msgpack is not installed")
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+class QuestionTable:
+    """
+    Column-oriented question bank.
+
+    Question text and explanations are kept in lists, options as 32-bit ids
+    into a shared pool of unique strings and the correct answer as one byte,
+    so a bank of a million questions costs a few small arrays plus the
+    unique text. The columns serialize directly to msgpack.
+    """
+
+    def __init__(self):
+        self.texts = []
+        self.explanations = []
+        self.option_counts = array("B")
+        self.option_ids = array("I")
+        self.correct = array("B")
+        self.pool = []
+        self._pool_ids = {}
+        self._offsets = None
+
+    def __len__(self):
+        return len(self.texts)
+
+    def _option_id(self, option):
+        option_id = self._pool_ids.get(option)
+        if option_id is None:
+            option_id = self._pool_ids[option] = len(self.pool)
+            self.pool.append(option)
+        return option_id
+
+    def append(self, question):
+        question = as_question(question)
+        self.texts.append(question.question)
+        self.explanations.append(question.explanation)
+        self.option_counts.append(len(question.options))
+        self.option_ids.extend(self._option_id(option) for option in question.options)
+        self.correct.append(question.correct_index)
+        self._offsets = None
+
+    def extend(self, questions):
+        for question in questions:
+            self.append(question)
+
+    def _option_offsets(self):
+        if self._offsets is None:
+            offsets = array("I", [0])
+            total = 0
+            for count in self.option_counts:
+                total += count
+                offsets.append(total)
+            self._offsets = offsets
+        return self._offsets
+
+    def __getitem__(self, i):
+        offsets = self._option_offsets()
+        options = tuple(self.pool[j] for j in self.option_ids[offsets[i]:offsets[i + 1]])
+        return Question(self.texts[i], options, self.correct[i], self.explanations[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_columns(self):
+        return {
+            "texts": self.texts,
+            "explanations": self.explanations,
+            "option_counts": self.option_counts.tobytes(),
+            "option_ids": self.option_ids.tobytes(),
+            "correct": self.correct.tobytes(),
+            "pool": self.pool,
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        table = cls()
+        table.texts = list(columns["texts"])
+        table.explanations = list(columns["explanations"])
+        table.option_counts = array("B", columns["option_counts"])
+        table.option_ids = array("I", columns["option_ids"])
+        table.correct = array("B", columns["correct"])
+        table.pool = [_intern(option) for option in columns["pool"]]
+        table._pool_ids = {option: i for i, option in enumerate(table.pool)}
+        return table
+
+    def packb(self):
+        return packb(self.to_columns())
+
+    @classmethod
+    def unpackb(cls, data):
+        return cls.from_columns(msgpack.unpackb(data, raw=False))
+
+
+def _synthetic_bank(count):
+    """Question dicts with realistic option reuse, decoded from JSON like an LLM reply."""
+    shared = ["True", "False", "None of the above", "All of the above"]
+    rows = []
+    for i in range(count):
+        options = [f"{i % 997} units", f"{(i * 7) % 997} units", shared[i % 4], shared[(i + 1) % 4]]
+        rows.append({
+            "question": f"Question {i}: which value satisfies condition {i % 313}?",
+            "options": options,
+            "correct_answer": options[i % 4],
+            "explanation": f"Worked solution for question {i}.",
+        })
+    # Round-trip so strings are fresh objects, as they are after json.loads
+    return json.loads(json.dumps(rows))
+
+
+def _measure(build):
+    """Memory still held by the result of `build` once its temporaries are freed."""
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def _timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def benchmark(count=100_000):
+    """
+    Compare memory and (de)serialization cost of dicts, Question objects and a QuestionTable.
+
+    Returns:
+        dict: Bytes per question and seconds per operation for each representation
+    """
+
+    raw = json.dumps(_synthetic_bank(count))
+    dicts, dict_bytes = _measure(lambda: json.loads(raw))
+    questions, question_bytes = _measure(lambda: [Question.from_dict(item) for item in json.loads(raw)])
+    table, table_bytes = _measure(lambda: _fill_table(json.loads(raw)))
+    results = {
+        "questions": count,
+        "bytes_per_question": {
+            "dicts": round(dict_bytes / count, 1),
+            "question_objects": round(question_bytes / count, 1),
+            "question_table": round(table_bytes / count, 1),
+        },
+        "seconds": {},
+    }
+
+    seconds = results["seconds"]
+    encoded, seconds["json_dumps"] = _timed(lambda: json.dumps(dicts))
+    _, seconds["json_loads"] = _timed(lambda: json.loads(encoded))
+    results["payload_bytes"] = {"json": len(encoded.encode("utf-8"))}
+    if msgpack is not None:
+        packed, seconds["msgpack_dicts_pack"] = _timed(lambda: packb(dicts))
+        _, seconds["msgpack_dicts_unpack"] = _timed(lambda: msgpack.unpackb(packed, raw=False))
+        columns, seconds["msgpack_table_pack"] = _timed(table.packb)
+        _, seconds["msgpack_table_unpack"] = _timed(lambda: QuestionTable.unpackb(columns))
+        results["payload_bytes"]["msgpack_dicts"] = len(packed)
+        results["payload_bytes"]["msgpack_table"] = len(columns)
+    _, seconds["questions_to_dicts"] = _timed(lambda: to_dicts(questions))
+    for key, value in seconds.items():
+        seconds[key] = round(value, 4)
+    return results
+
+
+def _fill_table(items):
+    table = QuestionTable()
+    table.extend(items)
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark quiz question representations at bank scale")
+    parser.add_argument("--count", type=int, default=100_000, help="Number of synthetic questions")
+    args = parser.parse_args(argv)
+    print(json.dumps(benchmark(args.count), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from quiz_html import _QUIZ_HTML_HEAD, _QUIZ_HTML_TAIL, _format_question_html
+from quiz_store import quiz_id_for
+
+# Assembled quiz pages kept in memory, per (quiz, language, question order)
+QUIZ_PAGE_CACHE_SIZE = int(os.getenv("QUIZ_PAGE_CACHE_SIZE", "512"))
+# Rendered question fragments kept in memory, shared by every page using the question
+QUIZ_FRAGMENT_CACHE_SIZE = int(os.getenv("QUIZ_FRAGMENT_CACHE_SIZE", "8192"))
+# How long browsers and CDNs may hold a quiz page; a quiz ID never changes content
+QUIZ_HTML_MAX_AGE = int(os.getenv("QUIZ_HTML_MAX_AGE", "86400"))
+
+# Stands in for the question number while rendering, so a fragment can be
+# numbered for any position. A private-use character never appears in LLM text.
+_NUMBER_PLACEHOLDER = "\ue000"
+
+
+class _LRU:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class QuizPageCache:
+    """
+    Rendered quiz pages with question-level fragment reuse.
+
+    Every question is rendered once into a position-independent fragment,
+    keyed by its content. A page for any order or subset of questions is
+    then assembled by numbering and joining cached fragments, and the
+    assembled page is cached as well.
+    """
+
+    def __init__(self, page_cache_size=QUIZ_PAGE_CACHE_SIZE, fragment_cache_size=QUIZ_FRAGMENT_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._pages = _LRU(page_cache_size)
+        self._fragments = _LRU(fragment_cache_size)
+        self.hits = {"page": 0, "fragment": 0}
+        self.misses = {"page": 0, "fragment": 0}
+
+    def _fragment(self, question):
+        key = quiz_id_for([question])
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self.hits["fragment"] += 1
+                return fragment
+            self.misses["fragment"] += 1
+        fragment = _format_question_html(_NUMBER_PLACEHOLDER, question)
+        with self._lock:
+            self._fragments.put(key, fragment)
+        return fragment
+
+    @staticmethod
+    def _page_key(quiz_id, order, language):
+        page_key = (quiz_id, language, None if order is None else tuple(order))
+        etag = '"' + hashlib.sha256(repr(page_key).encode("utf-8")).hexdigest()[:24] + '"'
+        return page_key, etag
+
+    def get(self, quiz_id, order=None, language=None):
+        """Return a cached (html, etag), or None, without needing the questions."""
+        page_key, etag = self._page_key(quiz_id, order, language)
+        with self._lock:
+            page = self._pages.get(page_key)
+            if page is None:
+                self.misses["page"] += 1
+                return None
+            self.hits["page"] += 1
+        return page, etag
+
+    def render(self, quiz_id, questions, order=None, language=None, cache=True):
+        """
+        Assemble a quiz page from cached question fragments and cache the page.
+
+        Args:
+            quiz_id (str): Stored quiz ID, used in the page cache key and the ETag
+            questions (list): Question objects of the quiz, already in `language`
+            order (list): 0-based indices of the questions to show, in order; all if None
+            language (str): Language of `questions`, part of the cache key
+            cache (bool): False for a page that must not be served again, e.g. a partial translation
+
+        Returns:
+            tuple: (html, etag)
+        """
+
+        page_key, etag = self._page_key(quiz_id, order, language)
+        indices = range(len(questions)) if order is None else order
+        fragments = [self._fragment(questions[index]).replace(_NUMBER_PLACEHOLDER, str(number))
+                     for number, index in enumerate(indices, 1)]
+        page = _QUIZ_HTML_HEAD + "".join(fragments) + _QUIZ_HTML_TAIL
+        if cache:
+            with self._lock:
+                self._pages.put(page_key, page)
+        return page, etag
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pages": len(self._pages),
+                "fragments": len(self._fragments),
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+
+def parse_order(spec, count):
+    """
+    Parse a "3,1,2" question selection (1-based) into 0-based indices.
+
+    Raises:
+        ValueError: If an entry is not a number or out of range
+    """
+
+    if not spec:
+        return None
+    order = []
+    for part in spec.split(","):
+        number = int(part.strip())
+        if not 1 <= number <= count:
+            raise ValueError(f"Question {number} is out of range 1-{count}")
+        order.append(number - 1)
+    return order
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from quiz_model import Question, to_dicts
+
+logger = logging.getLogger(__name__)
+
+QUIZ_DB_PATH = os.getenv("QUIZ_DB_PATH", "quizzes.db")
+QUIZ_CACHE_SIZE = int(os.getenv("QUIZ_CACHE_SIZE", "1024"))
+
+
+def quiz_id_for(questions):
+    """Stable content-derived ID: the same questions always get the same ID."""
+    blob = json.dumps(to_dicts(questions), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+class QuizStore:
+    """
+    Generated quizzes persisted in SQLite with an in-memory LRU in front.
+
+    Records are dicts with quiz_id, subject, level, quiz (a list of Question
+    objects, so cached quizzes share interned option strings) and created_at.
+    """
+
+    def __init__(self, path=QUIZ_DB_PATH, cache_size=QUIZ_CACHE_SIZE):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS quizzes ("
+                "quiz_id TEXT PRIMARY KEY, subject TEXT, level TEXT, quiz TEXT, created_at REAL)"
+            )
+
+    def _remember(self, record):
+        self._cache[record["quiz_id"]] = record
+        self._cache.move_to_end(record["quiz_id"])
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def save(self, questions, subject, level):
+        """Persist a quiz of Question objects and return its ID."""
+        quiz_id = quiz_id_for(questions)
+        record = {"quiz_id": quiz_id, "subject": subject, "level": level,
+                  "quiz": questions, "created_at": time.time()}
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO quizzes VALUES (?, ?, ?, ?, ?)",
+                    (quiz_id, subject, level, json.dumps(to_dicts(questions), ensure_ascii=False), record["created_at"])
+                )
+            self._remember(record)
+        return quiz_id
+
+    def get(self, quiz_id):
+        """Return the stored quiz record, or None."""
+        with self._lock:
+            record = self._cache.get(quiz_id)
+            if record is not None:
+                self._cache.move_to_end(quiz_id)
+                return record
+            row = self._conn.execute(
+                "SELECT subject, level, quiz, created_at FROM quizzes WHERE quiz_id = ?", (quiz_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            record = {"quiz_id": quiz_id, "subject": row[0], "level": row[1],
+                      "quiz": [Question.from_dict(item) for item in json.loads(row[2])], "created_at": row[3]}
+            self._remember(record)
+            return record
+
+
+def bank_key(subject, level, num_questions):
+    return f"{subject.strip().lower()}|{level.strip().lower()}|{int(num_questions)}"
+
+
+class QuizBank:
+    """
+    Ready-to-serve quizzes per (subject, level, num_questions), filled ahead of demand.
+
+    Each banked quiz is served once. Entries reference quizzes in the
+    QuizStore, so the bank survives restarts along with them.
+    """
+
+    def __init__(self, store, path=QUIZ_DB_PATH):
+        self.store = store
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS quiz_bank ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, bank_key TEXT, quiz_id TEXT, created_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS quiz_bank_key ON quiz_bank (bank_key)")
+
+    def add(self, questions, subject, level):
+        quiz_id = self.store.save(questions, subject, level)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO quiz_bank (bank_key, quiz_id, created_at) VALUES (?, ?, ?)",
+                (bank_key(subject, level, len(questions)), quiz_id, time.time())
+            )
+        return quiz_id
+
+    def take(self, subject, level, num_questions):
+        """Remove and return the oldest banked quiz record for the key, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, quiz_id FROM quiz_bank WHERE bank_key = ? ORDER BY id LIMIT 1",
+                (bank_key(subject, level, num_questions),)
+            ).fetchone()
+            if row is None:
+                return None
+            with self._conn:
+                self._conn.execute("DELETE FROM quiz_bank WHERE id = ?", (row[0],))
+        return self.store.get(row[1])
+
+    def available(self, subject, level, num_questions):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM quiz_bank WHERE bank_key = ?", (bank_key(subject, level, num_questions),)
+            ).fetchone()[0]
+
+    def size(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM quiz_bank").fetchone()[0]
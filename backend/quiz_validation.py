@@ -0,0 +1,325 @@
+import re
+import sys
+import json
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Length limits for generated content (characters)
+MAX_QUESTION_LENGTH = 500
+MAX_OPTION_LENGTH = 200
+MAX_EXPLANATION_LENGTH = 1000
+NUM_OPTIONS = 4
+
+# MinHash parameters: 64 hashes split into 16 LSH bands of 4 rows gives a
+# ~50% chance of becoming a candidate pair at Jaccard 0.6 and ~99% at 0.85.
+SHINGLE_SIZE = 5
+NUM_HASHES = 64
+BANDS = 16
+DUPLICATE_THRESHOLD = 0.8
+# Larger LSH buckets are only compared against their first member, not pairwise
+MAX_BUCKET_PAIRS = 32
+
+_OPTION_LETTERS = ["A", "B", "C", "D"]
+_LETTER_ANSWER = re.compile(r"^\s*(?:option\s+)?([a-d])\s*[\).:]?\s*$", re.IGNORECASE)
+# Unicode-aware, so questions in Hindi or any other script keep their words
+_NON_WORD = re.compile(r"[\W_]+")
+
+# Fixed seed so signatures are comparable across processes and runs
+_rng = np.random.default_rng(20240611)
+# Full-width odd multipliers and offsets: with 32-bit ones the kept high bits
+# barely move between shingles that differ only in their last byte
+_HASH_A = _rng.integers(0, 2**64, size=NUM_HASHES, dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 2**64, size=NUM_HASHES, dtype=np.uint64)
+_SHINGLE_WEIGHTS = np.uint64(1000003) ** np.arange(SHINGLE_SIZE - 1, -1, -1, dtype=np.uint64)
+
+
+def normalize_correct_answer(question):
+    """
+    Map a letter answer ("a", "B", "Option C") onto the matching option text.
+
+    The quiz prompt historically asked for letters, so many completions use
+    them; everything downstream compares `correct_answer` with option text.
+    """
+
+    answer = question.get("correct_answer")
+    options = question.get("options")
+    if not isinstance(answer, str) or not isinstance(options, list) or answer in options:
+        return question
+
+    match = _LETTER_ANSWER.match(answer)
+    if match:
+        index = _OPTION_LETTERS.index(match.group(1).upper())
+        if index < len(options):
+            question["correct_answer"] = options[index]
+    return question
+
+
+def check_question(question):
+    """
+    Check a single question for structural and content problems.
+
+    Args:
+        question (dict): Question dictionary
+
+    Returns:
+        list: Human readable issues, empty if the question is valid
+    """
+
+    if not isinstance(question, dict):
+        return ["Quiz item must be a dictionary"]
+
+    issues = []
+    text = question.get("question")
+    options = question.get("options")
+    answer = question.get("correct_answer")
+
+    if not isinstance(text, str) or not text.strip():
+        issues.append("Question text is missing")
+    elif len(text) > MAX_QUESTION_LENGTH:
+        issues.append(f"Question text exceeds {MAX_QUESTION_LENGTH} characters")
+
+    if not isinstance(options, list) or len(options) != NUM_OPTIONS:
+        issues.append(f"Question must have exactly {NUM_OPTIONS} options")
+    elif not all(isinstance(option, str) and option.strip() for option in options):
+        issues.append("Options must be non-empty strings")
+    else:
+        if len({option.strip().lower() for option in options}) != len(options):
+            issues.append("Options must be unique")
+        if any(len(option) > MAX_OPTION_LENGTH for option in options):
+            issues.append(f"Option exceeds {MAX_OPTION_LENGTH} characters")
+        if answer not in options:
+            issues.append("Correct answer is not one of the options")
+
+    explanation = question.get("explanation")
+    if explanation is not None and (not isinstance(explanation, str) or len(explanation) > MAX_EXPLANATION_LENGTH):
+        issues.append(f"Explanation must be a string of at most {MAX_EXPLANATION_LENGTH} characters")
+
+    return issues
+
+
+def _normalize_text(text):
+    return _NON_WORD.sub(" ", str(text).casefold()).strip()
+
+
+def minhash_signatures(texts):
+    """
+    Compute MinHash signatures for a batch of texts in one vectorized pass.
+
+    Texts are normalized, concatenated into a single byte array and cut into
+    character shingles with a sliding window; shingles that would cross a
+    text boundary are masked out. Each shingle hash is permuted NUM_HASHES
+    times and reduced per text with `np.minimum.reduceat`.
+
+    Args:
+        texts (list): Strings to sign
+
+    Returns:
+        numpy.ndarray: (len(texts), NUM_HASHES) uint32 signature matrix
+    """
+
+    count = len(texts)
+    signatures = np.full((count, NUM_HASHES), np.iinfo(np.uint32).max, dtype=np.uint32)
+    if count == 0:
+        return signatures
+
+    # Pad short texts so every text yields at least one shingle
+    encoded = [_normalize_text(text).ljust(SHINGLE_SIZE).encode("utf-8") for text in texts]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=count)
+    data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+
+    windows = np.lib.stride_tricks.sliding_window_view(data, SHINGLE_SIZE)
+    shingles = windows @ _SHINGLE_WEIGHTS
+
+    # A shingle starting at position p belongs to text t if it ends inside t
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    owner = np.repeat(np.arange(count), lengths)[:len(shingles)]
+    position = np.arange(len(shingles)) - starts[owner]
+    shingle_counts = lengths - SHINGLE_SIZE + 1
+    shingles = shingles[position < shingle_counts[owner]]
+    offsets = np.concatenate(([0], np.cumsum(shingle_counts)[:-1]))
+
+    # Multiply-shift hashing: (a * x + b) mod 2^64, keep the high 32 bits.
+    # Chunked over hash functions to bound the temporary matrix size.
+    chunk = 16
+    for h in range(0, NUM_HASHES, chunk):
+        permuted = (shingles[:, None] * _HASH_A[None, h:h + chunk] + _HASH_B[None, h:h + chunk]) >> np.uint64(32)
+        signatures[:, h:h + chunk] = np.minimum.reduceat(permuted, offsets, axis=0).astype(np.uint32)
+
+    return signatures
+
+
+def _candidate_pairs(signatures):
+    """Return an (n, 2) array of unique index pairs sharing at least one LSH band."""
+    rows = NUM_HASHES // BANDS
+    count = len(signatures)
+    pairs = []
+    for band in range(BANDS):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+        if counts.max(initial=0) < 2:
+            continue
+        order = np.argsort(inverse.ravel(), kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        for bucket in np.flatnonzero(counts > 1):
+            members = order[bounds[bucket]:bounds[bucket + 1]]
+            if len(members) <= MAX_BUCKET_PAIRS:
+                first, second = np.triu_indices(len(members), 1)
+                pairs.append(members[first] * count + members[second])
+            else:
+                # A templated bank can put thousands of questions in one bucket;
+                # comparing every member with the first keeps this linear
+                pairs.append(members[0] * count + members[1:])
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    flat = np.unique(np.concatenate(pairs))
+    return np.stack((flat // count, flat % count), axis=1)
+
+
+def find_near_duplicates(signatures, threshold=DUPLICATE_THRESHOLD):
+    """
+    Find near-duplicate pairs among signed texts.
+
+    Returns:
+        list: (i, j, similarity) tuples with i < j and estimated Jaccard >= threshold
+    """
+
+    duplicates = []
+    candidates = _candidate_pairs(signatures)
+    for start in range(0, len(candidates), 65536):
+        block = candidates[start:start + 65536]
+        similarity = (signatures[block[:, 0]] == signatures[block[:, 1]]).mean(axis=1)
+        for (i, j), score in zip(block[similarity >= threshold], similarity[similarity >= threshold]):
+            duplicates.append((int(i), int(j), float(score)))
+    return duplicates
+
+
+class QuestionIndex:
+    """
+    MinHash index of accepted questions for cross-quiz duplicate checks.
+
+    With `max_size`, only the most recently added questions are kept, so an
+    index per subject and level stays bounded however many quizzes are made.
+    """
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD, max_size=None):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.signatures = np.empty((0, NUM_HASHES), dtype=np.uint32)
+        self.texts = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.texts)
+
+    def add(self, texts, signatures=None):
+        if signatures is None:
+            signatures = minhash_signatures(texts)
+        with self._lock:
+            self.signatures = np.vstack([self.signatures, signatures])
+            self.texts = self.texts + list(texts)
+            if self.max_size is not None and len(self.texts) > self.max_size:
+                self.signatures = self.signatures[-self.max_size:]
+                self.texts = self.texts[-self.max_size:]
+
+    def recent(self, count):
+        """The `count` most recently added question texts."""
+        with self._lock:
+            return self.texts[-count:] if count > 0 else []
+
+    def query(self, signatures):
+        """
+        Return, for each signature, the best matching indexed question or None.
+        """
+
+        with self._lock:
+            indexed, texts = self.signatures, self.texts
+        if len(texts) == 0 or len(signatures) == 0:
+            return [None] * len(signatures)
+
+        matches = []
+        # Compare a block of queries against the whole index at once, sized
+        # so the boolean comparison matrix stays around 4M elements
+        step = max(1, (1 << 22) // (len(texts) * NUM_HASHES))
+        for start in range(0, len(signatures), step):
+            block = signatures[start:start + step]
+            similarity = (block[:, None, :] == indexed[None, :, :]).mean(axis=2)
+            best = similarity.argmax(axis=1)
+            for row, column in enumerate(best):
+                score = float(similarity[row, column])
+                matches.append((texts[column], score) if score >= self.threshold else None)
+        return matches
+
+
+def validate_questions(questions, index=None, threshold=DUPLICATE_THRESHOLD):
+    """
+    Validate a batch of questions, including near-duplicate detection.
+
+    Letter answers are normalized in place before checking. A question that
+    near-duplicates an earlier question in the batch, or one already in
+    `index`, is reported as a duplicate; the earlier occurrence stays valid.
+
+    Args:
+        questions (list): Question dictionaries
+        index (QuestionIndex): Optional index of previously accepted questions
+        threshold (float): Estimated Jaccard similarity treated as duplicate
+
+    Returns:
+        list: One list of issues per question (empty list means valid)
+    """
+
+    issues = []
+    for question in questions:
+        if isinstance(question, dict):
+            normalize_correct_answer(question)
+        issues.append(check_question(question))
+
+    checkable = [i for i, question in enumerate(questions)
+                 if isinstance(question, dict) and isinstance(question.get("question"), str)]
+    if not checkable:
+        return issues
+
+    signatures = minhash_signatures([questions[i]["question"] for i in checkable])
+
+    for a, b, similarity in find_near_duplicates(signatures, threshold):
+        issues[checkable[b]].append(f"Near-duplicate of question {checkable[a] + 1} ({similarity:.0%} similar)")
+
+    if index is not None:
+        for position, match in zip(checkable, index.query(signatures)):
+            if match is not None:
+                issues[position].append(f"Near-duplicate of an existing question ({match[1]:.0%} similar)")
+
+    return issues
+
+
+def main(argv=None):
+    """
+    Validate a question bank file (.json or .jsonl) and print a summary.
+    With a second file, questions that near-duplicate its questions are reported too.
+    """
+    from quiz_export import iter_questions_from_file
+
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: python quiz_validation.py BANK_FILE [EXISTING_BANK_FILE]")
+        return 2
+
+    questions = list(iter_questions_from_file(argv[0]))
+    index = None
+    if len(argv) > 1:
+        index = QuestionIndex()
+        index.add([str(question.get("question", "")) for question in iter_questions_from_file(argv[1])])
+    issues = validate_questions(questions, index=index)
+    failing = [(i, problems) for i, problems in enumerate(issues) if problems]
+    for i, problems in failing[:50]:
+        print(f"#{i + 1}: {'; '.join(problems)}")
+    print(json.dumps({"questions": len(questions), "failing": len(failing)}))
+    return 1 if failing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import argparse
+import logging
+import threading
+import functools
+import unicodedata
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Directory of the on-disk index; retrieval is disabled when it does not exist
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "rag_index")
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+# Chunks scoring below this cosine similarity are left out of prompts; shared
+# stop words alone score up to about 0.15. `query --min-score 0` shows the scores.
+RAG_MIN_SCORE = float(os.getenv("RAG_MIN_SCORE", "0.15"))
+
+EMBED_DIM = 256
+CHUNK_WORDS = 200
+CHUNK_OVERLAP = 40
+
+# IVF layout: vectors are assigned to the nearest of NLIST centroids once the
+# index is large enough to train them; queries scan only NPROBE lists
+IVF_TRAIN_THRESHOLD = 10000
+IVF_MAX_LISTS = 1024
+IVF_VECTORS_PER_LIST = 256
+IVF_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 50000
+
+
+
+@functools.lru_cache(maxsize=None)
+def _token_pattern():
+    """
+    Words of any script: letters and digits plus combining marks.
+
+    `re` has no \\p{M}, and \\w alone cuts Devanagari and other scripts at
+    every vowel sign, so the mark ranges are collected once on first use.
+    """
+    ranges = []
+    for code in range(sys.maxunicode + 1):
+        if unicodedata.category(chr(code))[0] == "M":
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+    marks = "".join(re.escape(chr(start)) + ("-" + re.escape(chr(end)) if end > start else "")
+                    for start, end in ranges)
+    return re.compile(f"(?:[^\\W_]|[{marks}])+")
+
+
+def tokenize(text):
+    """Casefolded words of `text`, with accents composed so "café" stays one word."""
+    return _token_pattern().findall(unicodedata.normalize("NFKC", text).casefold())
+
+
+def iter_chunks(path, chunk_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """
+    Stream overlapping word chunks from a text file without reading it whole.
+
+    Yields:
+        str: Chunks of about `chunk_words` words
+    """
+
+    window = []
+    emitted = False
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            window.extend(line.split())
+            while len(window) >= chunk_words:
+                yield " ".join(window[:chunk_words])
+                emitted = True
+                window = window[chunk_words - overlap:]
+    # The tail is only worth a chunk if it holds more than the overlap already emitted
+    if len(window) > (overlap if emitted else 0):
+        yield " ".join(window)
+
+
+def embed(texts, dim=EMBED_DIM):
+    """
+    Hashed bag-of-words/bigram embedding (signed feature hashing), L2-normalized.
+
+    Needs no model download and runs at ingest speed on a CPU.
+
+    Returns:
+        numpy.ndarray: (len(texts), dim) float32
+    """
+
+    rows, cols, signs = [], [], []
+    for row, text in enumerate(texts):
+        tokens = tokenize(text)
+        features = tokens + [a + " " + b for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            h = zlib.crc32(feature.encode("utf-8"))
+            rows.append(row)
+            cols.append(h % dim)
+            signs.append(1.0 if (h >> 31) & 1 else -1.0)
+
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    if rows:
+        np.add.at(matrix, (np.array(rows), np.array(cols)), np.array(signs, dtype=np.float32))
+    # Sublinear term frequency, then unit length so dot product is cosine
+    matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def _kmeans(sample, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means on unit vectors; returns (k, dim) float32 centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=k)
+        empty = counts == 0
+        # Re-seed empty clusters from random sample points
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+
+class VectorIndex:
+    """
+    Append-only, memory-mapped IVF index of chunk vectors.
+
+    Files in the index directory:
+        meta.json      dimension, vector count, number of IVF lists
+        vectors.f16    (count, dim) float16 vectors, memory-mapped for queries
+        lists.i32      IVF list of each vector
+        centroids.npy  IVF centroids (absent until trained)
+        chunks.jsonl   chunk text and source, one line per vector
+        offsets.i64    byte offset of each line in chunks.jsonl
+    """
+
+    def __init__(self, directory, dim=EMBED_DIM):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        meta_path = self._path("meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        else:
+            meta = {"dim": dim, "count": 0, "nlist": 0}
+        self.dim = meta["dim"]
+        self.count = meta["count"]
+        self.nlist = meta["nlist"]
+        self.centroids = np.load(self._path("centroids.npy")) if self.nlist else None
+        self._open()
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open(self):
+        """(Re)map the data files and rebuild the in-memory inverted lists."""
+        if self.count:
+            self.vectors = np.memmap(self._path("vectors.f16"), dtype=np.float16, mode="r",
+                                     shape=(self.count, self.dim))
+            self.offsets = np.fromfile(self._path("offsets.i64"), dtype=np.int64, count=self.count)
+        else:
+            self.vectors = np.empty((0, self.dim), dtype=np.float16)
+            self.offsets = np.empty(0, dtype=np.int64)
+
+        self.list_ids = None
+        if self.nlist:
+            lists = np.fromfile(self._path("lists.i32"), dtype=np.int32, count=self.count)
+            order = np.argsort(lists, kind="stable").astype(np.int32)
+            bounds = np.searchsorted(lists[order], np.arange(self.nlist + 1))
+            self.list_ids = [order[bounds[i]:bounds[i + 1]] for i in range(self.nlist)]
+
+    def _write_meta(self):
+        tmp = self._path("meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "count": self.count, "nlist": self.nlist}, f)
+        os.replace(tmp, self._path("meta.json"))
+
+    def add(self, texts, sources=None, vectors=None):
+        """Append chunks (embedding them unless vectors are given)."""
+        if not texts:
+            return
+        if vectors is None:
+            vectors = embed(texts, self.dim)
+        sources = sources or [None] * len(texts)
+
+        with self._lock:
+            with open(self._path("chunks.jsonl"), "ab") as f:
+                position = f.tell()
+                lines = [(json.dumps({"text": t, "source": s}, ensure_ascii=False) + "\n").encode("utf-8")
+                         for t, s in zip(texts, sources)]
+                lengths = np.fromiter((len(line) for line in lines), dtype=np.int64, count=len(lines))
+                f.write(b"".join(lines))
+            offsets = position + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+            with open(self._path("vectors.f16"), "ab") as f:
+                f.write(np.asarray(vectors, dtype=np.float16).tobytes())
+            with open(self._path("offsets.i64"), "ab") as f:
+                f.write(offsets.astype(np.int64).tobytes())
+            if self.nlist:
+                with open(self._path("lists.i32"), "ab") as f:
+                    f.write(self._assign(np.asarray(vectors, dtype=np.float32)).tobytes())
+
+            self.count += len(texts)
+            self._write_meta()
+            self._open()
+            # Train once the index is big enough, and retrain whenever it has
+            # outgrown its lists so each probe keeps scanning a bounded slice
+            target = min(IVF_MAX_LISTS, self.count // IVF_VECTORS_PER_LIST)
+            if self.count >= IVF_TRAIN_THRESHOLD and self.nlist < target // 2:
+                self._train()
+
+    def _assign(self, vectors):
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 65536):
+            block = vectors[start:start + 65536]
+            assignment[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignment
+
+    def _train(self):
+        """Train IVF centroids on a sample and assign every stored vector."""
+        nlist = min(IVF_MAX_LISTS, self.count // IVF_VECTORS_PER_LIST)
+        rng = np.random.default_rng(0)
+        sample_ids = np.sort(rng.choice(self.count, size=min(KMEANS_SAMPLE, self.count), replace=False))
+        sample = np.asarray(self.vectors[sample_ids], dtype=np.float32)
+        logger.info(f"Training IVF index with {nlist} lists on {len(sample)} vectors")
+        self.centroids = _kmeans(sample, nlist)
+        np.save(self._path("centroids.npy"), self.centroids)
+
+        lists = np.concatenate([
+            self._assign(np.asarray(self.vectors[start:start + 262144], dtype=np.float32))
+            for start in range(0, self.count, 262144)
+        ])
+        lists.astype(np.int32).tofile(self._path("lists.i32"))
+        self.nlist = nlist
+        self._write_meta()
+        self._open()
+
+    def search(self, query_vector, k=RAG_TOP_K, nprobe=IVF_NPROBE):
+        """
+        Return the ids and cosine scores of the k nearest chunks.
+        """
+
+        if self.count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = np.asarray(query_vector, dtype=np.float32)
+        if self.nlist:
+            probe = np.argpartition(self.centroids @ query, -min(nprobe, self.nlist))[-nprobe:]
+            # Sorted ids turn the gather into a forward scan over the memory map
+            ids = np.sort(np.concatenate([self.list_ids[p] for p in probe]))
+            scores = self.vectors[ids].astype(np.float32) @ query
+        else:
+            ids = np.arange(self.count)
+            scores = self.vectors.astype(np.float32) @ query
+
+        k = min(k, len(ids))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(scores, -k)[-k:]
+        top = top[np.argsort(scores[top])[::-1]]
+        return ids[top], scores[top]
+
+    def chunk(self, vector_id):
+        with open(self._path("chunks.jsonl"), "rb") as f:
+            f.seek(int(self.offsets[vector_id]))
+            return json.loads(f.readline())
+
+    def query(self, text, k=RAG_TOP_K, min_score=RAG_MIN_SCORE):
+        """Top-k chunks for a text query scoring at least `min_score`, as dicts with text, source and score."""
+        ids, scores = self.search(embed([text], self.dim)[0], k)
+        return [dict(self.chunk(i), score=float(s)) for i, s in zip(ids, scores) if s >= min_score]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The shared index, or None when no index has been built."""
+    global _index
+    if _index is None and os.path.exists(os.path.join(RAG_INDEX_DIR, "meta.json")):
+        with _index_lock:
+            if _index is None:
+                _index = VectorIndex(RAG_INDEX_DIR)
+    return _index
+
+
+def retrieve_context(query, k=RAG_TOP_K, min_score=RAG_MIN_SCORE):
+    """Relevant course material for a prompt, or an empty list without an index or a relevant chunk."""
+    index = get_index()
+    if index is None or index.count == 0:
+        return []
+    return index.query(query, k, min_score)
+
+
+def ingest(paths, directory=RAG_INDEX_DIR, batch_size=1024):
+    """Chunk and index text files in batches, keeping memory bounded."""
+    index = VectorIndex(directory)
+    added = 0
+    for path in paths:
+        batch = []
+        for chunk in iter_chunks(path):
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                index.add(batch, [path] * len(batch))
+                added += len(batch)
+                batch = []
+        index.add(batch, [path] * len(batch))
+        added += len(batch)
+        logger.info(f"Indexed {path}")
+    return added
+
+
+def benchmark(directory, total, queries=200, dim=EMBED_DIM, batch_size=100000):
+    """Build a synthetic clustered index of `total` chunks and time queries."""
+    index = VectorIndex(directory, dim)
+    rng = np.random.default_rng(1)
+    topics = rng.standard_normal((2000, dim)).astype(np.float32)
+
+    def sample(n):
+        vectors = topics[rng.integers(0, len(topics), n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    started = time.perf_counter()
+    while index.count < total:
+        n = min(batch_size, total - index.count)
+        index.add([f"synthetic chunk {index.count + i}" for i in range(n)], vectors=sample(n))
+    build_seconds = time.perf_counter() - started
+
+    latencies = []
+    for query in sample(queries):
+        t0 = time.perf_counter()
+        ids, _ = index.search(query)
+        [index.chunk(i) for i in ids]
+        latencies.append((time.perf_counter() - t0) * 1000)
+    latencies.sort()
+    return {
+        "chunks": index.count,
+        "nlist": index.nlist,
+        "build_seconds": round(build_seconds, 1),
+        "query_p50_ms": round(latencies[len(latencies) // 2], 3),
+        "query_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local retrieval index over course materials")
+    parser.add_argument("--index", default=RAG_INDEX_DIR, help="Index directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_cmd = commands.add_parser("ingest", help="Add text files to the index")
+    ingest_cmd.add_argument("paths", nargs="+")
+    query_cmd = commands.add_parser("query", help="Show the top chunks for a query")
+    query_cmd.add_argument("text")
+    query_cmd.add_argument("-k", type=int, default=RAG_TOP_K)
+    query_cmd.add_argument("--min-score", type=float, default=RAG_MIN_SCORE)
+    bench_cmd = commands.add_parser("bench", help="Benchmark query latency on a synthetic index")
+    bench_cmd.add_argument("--chunks", type=int, default=1000000)
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        print(f"Indexed {ingest(args.paths, args.index)} chunks into {args.index}")
+    elif args.command == "query":
+        for hit in VectorIndex(args.index).query(args.text, args.k, args.min_score):
+            print(f"[{hit['score']:.3f}] {hit['source']}: {hit['text'][:200]}")
+    else:
+        print(json.dumps(benchmark(args.index, args.chunks), indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import os
+import hmac
+import json
+import time
+import sqlite3
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# API keys of schools or classes, e.g. {"<secret key>": "school-a"}; a request
+# is billed to the tenant of the key it sends in TENANT_KEY_HEADER
+TENANT_API_KEYS = json.loads(os.getenv("TENANT_API_KEYS", "{}"))
+TENANT_KEY_HEADER = os.getenv("TENANT_KEY_HEADER", "X-API-Key")
+# Request header naming the tenant directly; only honoured behind a proxy that
+# authenticates clients and sets it (TRUST_TENANT_HEADER=1), as clients can forge it
+TENANT_HEADER = os.getenv("TENANT_HEADER", "X-Tenant-ID")
+TRUST_TENANT_HEADER = os.getenv("TRUST_TENANT_HEADER", "0") == "1"
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+# Prefetch and warm-up generations run outside any request
+BACKGROUND_TENANT = "background"
+
+# Upstream tokens a tenant may use per rolling hour; 0 means unlimited
+TENANT_TOKENS_PER_HOUR = int(os.getenv("TENANT_TOKENS_PER_HOUR", "0"))
+# Concurrent generations per tenant and endpoint
+TENANT_MAX_IN_FLIGHT = int(os.getenv("TENANT_MAX_IN_FLIGHT", "2"))
+# Per-tenant overrides, e.g. {"school-a": {"tokens_per_hour": 500000, "max_in_flight": 4}}
+TENANT_QUOTAS = json.loads(os.getenv("TENANT_QUOTAS", "{}"))
+
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "usage.db")
+USAGE_BUCKET_SECONDS = int(os.getenv("USAGE_BUCKET_SECONDS", "60"))
+USAGE_FLUSH_SECONDS = float(os.getenv("USAGE_FLUSH_SECONDS", "10"))
+# Usage buckets older than this are deleted from usage.db; 0 keeps them forever
+USAGE_RETENTION_DAYS = float(os.getenv("USAGE_RETENTION_DAYS", "90"))
+
+_QUOTA_WINDOW_SECONDS = 3600
+_PRUNE_INTERVAL_SECONDS = 3600
+
+current_tenant = contextvars.ContextVar("tenant", default=BACKGROUND_TENANT)
+
+
+class QuotaExceeded(Exception):
+    """Raised when a tenant has used up its token quota for the rolling hour."""
+
+    def __init__(self, tenant, retry_after):
+        super().__init__(f"Tenant {tenant} exceeded its hourly token quota")
+        self.tenant = tenant
+        self.retry_after = retry_after
+
+
+class UnknownCredential(Exception):
+    """Raised when a request sends an API key that belongs to no tenant."""
+
+
+def resolve_tenant(headers):
+    """
+    The tenant a request is billed to, from its credential rather than a claim.
+
+    Requests without a key share DEFAULT_TENANT (and its quota), unless
+    TRUST_TENANT_HEADER is set and TENANT_HEADER names the tenant.
+
+    Raises:
+        UnknownCredential: If the request sends a key not in TENANT_API_KEYS
+    """
+    key = headers.get(TENANT_KEY_HEADER)
+    if key:
+        # Compare against every key in constant time so timing reveals nothing about them
+        tenant = None
+        for candidate, name in TENANT_API_KEYS.items():
+            if hmac.compare_digest(candidate.encode("utf-8"), key.encode("utf-8")):
+                tenant = name
+        if tenant is None:
+            raise UnknownCredential(f"Unknown {TENANT_KEY_HEADER}")
+        return tenant
+    if TRUST_TENANT_HEADER:
+        return headers.get(TENANT_HEADER) or DEFAULT_TENANT
+    return DEFAULT_TENANT
+
+
+def quota_for(tenant):
+    """Token and concurrency limits of a tenant, with TENANT_QUOTAS overrides applied."""
+    overrides = TENANT_QUOTAS.get(tenant, {})
+    return {
+        "tokens_per_hour": overrides.get("tokens_per_hour", TENANT_TOKENS_PER_HOUR),
+        "max_in_flight": overrides.get("max_in_flight", TENANT_MAX_IN_FLIGHT),
+    }
+
+
+@contextmanager
+def tenant_scope(tenant):
+    """Attribute upstream calls made inside the block to `tenant`."""
+    token = current_tenant.set(tenant or DEFAULT_TENANT)
+    try:
+        yield
+    finally:
+        current_tenant.reset(token)
+
+
+# Counter columns of a usage bucket, in storage order
+_COUNTERS = ("requests", "errors", "cache_hits", "prompt_tokens", "completion_tokens", "latency_total")
+
+
+class UsageStore:
+    """
+    Per-tenant usage in fixed time buckets (USAGE_BUCKET_SECONDS), in SQLite.
+
+    Each tenant has at most one row per bucket, so storage grows with active
+    tenants and time, not with request volume. Counts are aggregated in
+    memory and flushed every few seconds; the token totals of the last hour
+    are also kept in memory for quota checks, and tenants idle for an hour
+    are dropped from it. Buckets older than `retention_days` are deleted.
+    """
+
+    def __init__(self, path=USAGE_DB_PATH, bucket_seconds=USAGE_BUCKET_SECONDS, flush_seconds=USAGE_FLUSH_SECONDS,
+                 retention_days=USAGE_RETENTION_DAYS):
+        self.bucket_seconds = bucket_seconds
+        self.flush_seconds = flush_seconds
+        self.retention_days = retention_days
+        self._pruned_at = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pending = {}
+        self._recent_tokens = {}
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS usage (tenant TEXT, bucket INTEGER, requests INTEGER, errors INTEGER, "
+                "cache_hits INTEGER, prompt_tokens INTEGER, completion_tokens INTEGER, latency_total REAL, "
+                "latency_max REAL, PRIMARY KEY (tenant, bucket)) WITHOUT ROWID"
+            )
+            # Quotas are per rolling hour, so they carry over a restart
+            since = self._bucket(time.time() - _QUOTA_WINDOW_SECONDS)
+            for tenant, bucket, tokens in self._conn.execute(
+                "SELECT tenant, bucket, prompt_tokens + completion_tokens FROM usage WHERE bucket >= ?", (since,)
+            ):
+                self._recent_tokens.setdefault(tenant, {})[bucket] = tokens
+
+    def _bucket(self, timestamp):
+        return int(timestamp // self.bucket_seconds) * self.bucket_seconds
+
+    def _counters(self, tenant):
+        bucket = self._bucket(time.time())
+        counters = self._pending.get((tenant, bucket))
+        if counters is None:
+            counters = self._pending[(tenant, bucket)] = {**dict.fromkeys(_COUNTERS, 0), "latency_max": 0.0}
+        return bucket, counters
+
+    def record(self, tenant, latency, usage=None, error=None):
+        """Account one upstream call; `usage` is the response.usage object, if any."""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        with self._lock:
+            bucket, counters = self._counters(tenant)
+            counters["requests"] += 1
+            counters["errors"] += 1 if error is not None else 0
+            counters["prompt_tokens"] += prompt_tokens
+            counters["completion_tokens"] += completion_tokens
+            counters["latency_total"] += latency
+            counters["latency_max"] = max(counters["latency_max"], latency)
+            recent = self._recent_tokens.setdefault(tenant, {})
+            recent[bucket] = recent.get(bucket, 0) + prompt_tokens + completion_tokens
+
+    def record_cache_hit(self, tenant):
+        """Account a request served from a cache or bank without an upstream call."""
+        with self._lock:
+            _, counters = self._counters(tenant)
+            counters["cache_hits"] += 1
+
+    def tokens_used(self, tenant, window=_QUOTA_WINDOW_SECONDS):
+        since = self._bucket(time.time() - window)
+        with self._lock:
+            recent = self._recent_tokens.get(tenant, {})
+            for bucket in [bucket for bucket in recent if bucket < since]:
+                del recent[bucket]
+            if not recent:
+                self._recent_tokens.pop(tenant, None)
+            return sum(recent.values())
+
+    def check_quota(self, tenant):
+        """
+        Raises:
+            QuotaExceeded: If the tenant used its tokens_per_hour in the last hour
+        """
+        limit = quota_for(tenant)["tokens_per_hour"]
+        if not limit or self.tokens_used(tenant) < limit:
+            return
+        with self._lock:
+            oldest = min(self._recent_tokens[tenant])
+        # Tokens are freed when the oldest bucket leaves the window
+        retry_after = max(1, int(oldest + _QUOTA_WINDOW_SECONDS + self.bucket_seconds - time.time()))
+        raise QuotaExceeded(tenant, retry_after)
+
+    def _prune(self):
+        """Forget idle tenants and delete expired buckets (called with the lock held)."""
+        now = time.time()
+        if self._pruned_at is not None and now - self._pruned_at < _PRUNE_INTERVAL_SECONDS:
+            return
+        self._pruned_at = now
+        since = self._bucket(now - _QUOTA_WINDOW_SECONDS)
+        for tenant in list(self._recent_tokens):
+            recent = {bucket: tokens for bucket, tokens in self._recent_tokens[tenant].items() if bucket >= since}
+            if recent:
+                self._recent_tokens[tenant] = recent
+            else:
+                del self._recent_tokens[tenant]
+        if self.retention_days > 0:
+            with self._conn:
+                deleted = self._conn.execute("DELETE FROM usage WHERE bucket < ?",
+                                             (self._bucket(now - self.retention_days * 86400),)).rowcount
+            if deleted:
+                logger.info(f"Deleted {deleted} usage buckets older than {self.retention_days:g} days")
+
+    def flush(self):
+        with self._lock:
+            self._prune()
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            rows = [(tenant, bucket, *(counters[name] for name in _COUNTERS), counters["latency_max"])
+                    for (tenant, bucket), counters in pending.items()]
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (tenant, bucket) DO UPDATE SET "
+                    + ", ".join(f"{name} = {name} + excluded.{name}" for name in _COUNTERS)
+                    + ", latency_max = MAX(latency_max, excluded.latency_max)",
+                    rows,
+                )
+
+    def report(self, tenant=None, since=None):
+        """
+        Usage totals per tenant since `since` (a timestamp; the last 24 hours if None).
+
+        Returns:
+            dict: Tenant -> requests, errors, cache hits, tokens, latency and quota
+        """
+
+        self.flush()
+        since = self._bucket(since if since is not None else time.time() - 24 * 3600)
+        query = ("SELECT tenant, SUM(requests), SUM(errors), SUM(cache_hits), SUM(prompt_tokens), "
+                 "SUM(completion_tokens), SUM(latency_total), MAX(latency_max) FROM usage WHERE bucket >= ?")
+        params = [since]
+        if tenant is not None:
+            query += " AND tenant = ?"
+            params.append(tenant)
+        with self._lock:
+            rows = self._conn.execute(query + " GROUP BY tenant", params).fetchall()
+
+        report = {}
+        for name, requests, errors, cache_hits, prompt_tokens, completion_tokens, latency_total, latency_max in rows:
+            report[name] = {
+                "upstream_calls": requests,
+                "errors": errors,
+                "cache_hits": cache_hits,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "latency_avg": round(latency_total / requests, 3) if requests else None,
+                "latency_max": round(latency_max, 3),
+                "tokens_last_hour": self.tokens_used(name),
+                "quota": quota_for(name),
+            }
+        return report
+
+    def start(self):
+        if self._thread is None and self.flush_seconds > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name="usage", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+        self._thread = None
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_seconds):
+            self.flush()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_usage_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = UsageStore()
+        return _store
@@ -0,0 +1,283 @@
+import os
+import re
+import sys
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from quiz_model import Question
+
+logger = logging.getLogger(__name__)
+
+# Content is generated once in this language and translated for every other one
+TRANSLATION_SOURCE_LANGUAGE = os.getenv("TRANSLATION_SOURCE_LANGUAGE", "English")
+# "memory" translates through the segment cache; "off" disables translation and
+# tutoring answers are generated directly in the requested language
+TRANSLATION_MODE = os.getenv("TRANSLATION_MODE", "memory")
+TRANSLATION_DB_PATH = os.getenv("TRANSLATION_DB_PATH", "translations.db")
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "50000"))
+# Segments per translation request, and a cap on their combined length
+TRANSLATION_BATCH_SIZE = int(os.getenv("TRANSLATION_BATCH_SIZE", "40"))
+TRANSLATION_BATCH_CHARS = 6000
+TRANSLATION_MAX_WORKERS = 4
+
+_CODE_FENCE = re.compile(r"(```[\s\S]*?```)")
+_PARAGRAPH_BREAK = re.compile(r"(\n\s*\n)")
+# Segments with no letters (numbers, formulas, punctuation) are left as they are
+_HAS_LETTERS = re.compile(r"[^\W\d_]")
+_JSON_ARRAY = re.compile(r"\[\s*\{.*\}\s*\]", re.DOTALL)
+
+
+class TranslationIncomplete(Exception):
+    """Raised when some segments of a text could not be translated."""
+
+    def __init__(self, language, count):
+        super().__init__(f"{count} segment(s) could not be translated to {language}; please retry")
+        self.language = language
+        self.count = count
+
+
+def needs_translation(language):
+    return (TRANSLATION_MODE == "memory" and bool(language)
+            and language.strip().lower() != TRANSLATION_SOURCE_LANGUAGE.lower())
+
+
+def segment_key(text):
+    """Translation memory key: hash of the exact source segment."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+
+
+def split_segments(text):
+    """
+    Split markdown into translatable paragraphs and the separators between them.
+
+    Returns:
+        list: (piece, translatable) pairs whose pieces join back to `text`
+    """
+
+    pieces = []
+    for block in _CODE_FENCE.split(text):
+        if block.startswith("```"):
+            pieces.append((block, False))
+            continue
+        for part in _PARAGRAPH_BREAK.split(block):
+            if part:
+                pieces.append((part, bool(_HAS_LETTERS.search(part)) and not _PARAGRAPH_BREAK.fullmatch(part)))
+    return pieces
+
+
+class TranslationMemory:
+    """
+    Segment translations keyed by (source hash, language).
+
+    Persisted in SQLite with an in-memory LRU in front, so a segment is only
+    ever translated once per language.
+    """
+
+    def __init__(self, path=TRANSLATION_DB_PATH, cache_size=TRANSLATION_CACHE_SIZE):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                "source_hash TEXT, language TEXT, source TEXT, translation TEXT, "
+                "PRIMARY KEY (source_hash, language))"
+            )
+
+    def _remember(self, key, translation):
+        self._cache[key] = translation
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def lookup(self, hashes, language):
+        """Return {source_hash: translation} for the hashes already translated."""
+        found = {}
+        with self._lock:
+            missing = []
+            for source_hash in hashes:
+                translation = self._cache.get((source_hash, language))
+                if translation is None:
+                    missing.append(source_hash)
+                else:
+                    self._cache.move_to_end((source_hash, language))
+                    found[source_hash] = translation
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT source_hash, translation FROM segments WHERE language = ? "
+                    f"AND source_hash IN ({','.join('?' * len(chunk))})", (language, *chunk)
+                ).fetchall()
+                for source_hash, translation in rows:
+                    self._remember((source_hash, language), translation)
+                    found[source_hash] = translation
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def store(self, language, pairs):
+        """Save (source, translation) pairs."""
+        rows = [(segment_key(source), language, source, translation) for source, translation in pairs]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT OR REPLACE INTO segments VALUES (?, ?, ?, ?)", rows)
+            for source_hash, _, _, translation in rows:
+                self._remember((source_hash, language), translation)
+
+    def stats(self):
+        with self._lock:
+            return {"cached_segments": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_translation_memory():
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = TranslationMemory()
+        return _memory
+
+
+def _create_translation_prompt(segments, language):
+    """Helper function to create a batched segment translation prompt"""
+
+    items = json.dumps([{"id": i, "text": text} for i, text in enumerate(segments)], ensure_ascii=False)
+    return f"""
+    Translate the "text" of every item below from {TRANSLATION_SOURCE_LANGUAGE} to {language}.
+    Keep markdown, LaTeX, code, numbers and proper nouns unchanged. Do not merge or split items.
+
+    RESPONSE FORMAT (JSON array only, same ids):
+    [{{"id": 0, "text": "translated text"}}]
+
+    ITEMS:
+    {items}
+    """
+
+
+def _parse_translations(response_content, count):
+    fenced = re.search(r"```json\s*(\[[\s\S]*?\])\s*```", response_content)
+    if fenced:
+        content = fenced.group(1)
+    else:
+        raw = _JSON_ARRAY.search(response_content)
+        content = raw.group(0) if raw else response_content
+
+    items = json.loads(content)
+    translations = {}
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and isinstance(item.get("id"), int) and 0 <= item["id"] < count \
+                and isinstance(item.get("text"), str) and item["text"].strip():
+            translations[item["id"]] = item["text"]
+    return translations
+
+
+def _batches(segments):
+    batch, size = [], 0
+    for segment in segments:
+        if batch and (len(batch) >= TRANSLATION_BATCH_SIZE or size + len(segment) > TRANSLATION_BATCH_CHARS):
+            yield batch
+            batch, size = [], 0
+        batch.append(segment)
+        size += len(segment)
+    if batch:
+        yield batch
+
+
+def _translate_batch(batch, language, complete):
+    try:
+        translations = _parse_translations(complete(_create_translation_prompt(batch, language)), len(batch))
+    except Exception as e:
+        logger.warning(f"Translation batch to {language} failed: {str(e)}")
+        return []
+    if len(translations) < len(batch):
+        logger.warning(f"Translation to {language} returned {len(translations)} of {len(batch)} segments")
+    return [(batch[i], text) for i, text in translations.items()]
+
+
+def translate_segments(segments, language, complete, memory=None, failed=None):
+    """
+    Translate a list of segments, calling the LLM only for ones not in memory.
+
+    Segments the LLM fails to translate are returned unchanged and not cached,
+    so they are retried next time.
+
+    Args:
+        segments (list): Source texts
+        language (str): Target language
+        complete (callable): prompt -> completion text
+        memory (TranslationMemory): Defaults to the shared memory
+        failed (list): If given, segments left untranslated are appended to it
+
+    Returns:
+        list: Translations in the order of `segments`
+    """
+
+    memory = memory or get_translation_memory()
+    unique = list(dict.fromkeys(s for s in segments if _HAS_LETTERS.search(s)))
+    keys = {segment: segment_key(segment) for segment in unique}
+    known = memory.lookup(list(keys.values()), language)
+    translated = {segment: known[key] for segment, key in keys.items() if key in known}
+
+    missing = [segment for segment in unique if segment not in translated]
+    if missing:
+        logger.info(f"Translating {len(missing)} new segment(s) to {language} ({len(translated)} cached)")
+        batches = list(_batches(missing))
+        with ThreadPoolExecutor(max_workers=min(TRANSLATION_MAX_WORKERS, len(batches))) as pool:
+            # Batches run in copies of the caller's context (e.g. the tenant being billed)
+            contexts = [contextvars.copy_context() for _ in batches]
+            for pairs in pool.map(lambda context, batch: context.run(_translate_batch, batch, language, complete),
+                                  contexts, batches):
+                if pairs:
+                    memory.store(language, pairs)
+                    translated.update(pairs)
+
+    if failed is not None:
+        failed.extend(segment for segment in missing if segment not in translated)
+    return [translated.get(segment, segment) for segment in segments]
+
+
+def translate_text(text, language, complete, memory=None, failed=None):
+    """
+    Translate markdown paragraph by paragraph, leaving code blocks untouched.
+
+    Paragraphs left in the source language are appended to `failed`, if given.
+    """
+    pieces = split_segments(text)
+    sources = [piece for piece, translatable in pieces if translatable]
+    translations = iter(translate_segments(sources, language, complete, memory, failed))
+    return "".join(next(translations) if translatable else piece for piece, translatable in pieces)
+
+
+def translate_questions(questions, language, complete, memory=None, failed=None):
+    """
+    Translate quiz questions, options and explanations as one batch of segments.
+
+    The correct answer is kept as an option index, so it survives translation.
+    Segments left in the source language are appended to `failed`, if given.
+    """
+
+    segments = []
+    for question in questions:
+        segments.append(question.question)
+        segments.extend(question.options)
+        segments.append(question.explanation)
+
+    translations = iter(translate_segments(segments, language, complete, memory, failed))
+    translated = []
+    for question in questions:
+        text = next(translations)
+        options = tuple(sys.intern(next(translations)) for _ in question.options)
+        translated.append(Question(text, options, question.correct_index, next(translations)))
+    return translated
@@ -0,0 +1,71 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+TUTOR_CACHE_DB_PATH = os.getenv("TUTOR_CACHE_DB_PATH", "tutor_cache.db")
+# Source-language tutoring answers kept in memory in front of SQLite
+TUTOR_CANONICAL_CACHE_SIZE = int(os.getenv("TUTOR_CANONICAL_CACHE_SIZE", "256"))
+
+
+def answer_key(*fields):
+    blob = json.dumps(fields, ensure_ascii=False)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:24]
+
+
+class TutorAnswerCache:
+    """
+    Source-language tutoring answers, persisted so they survive restarts.
+
+    Translations of an answer are cached separately, per segment, by the
+    translation memory.
+    """
+
+    def __init__(self, path=TUTOR_CACHE_DB_PATH, cache_size=TUTOR_CANONICAL_CACHE_SIZE):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, created_at REAL)"
+            )
+
+    def _remember(self, key, answer):
+        self._cache[key] = answer
+        self._cache.move_to_end(key)
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+    def get(self, key):
+        with self._lock:
+            answer = self._cache.get(key)
+            if answer is not None:
+                self._cache.move_to_end(key)
+                return answer
+            row = self._conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key, answer):
+        with self._lock:
+            with self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)", (key, answer, time.time()))
+            self._remember(key, answer)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tutor_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TutorAnswerCache()
+        return _cache
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from access_log import AccessLog, is_redacted
+from hotkeys import HotKeyTracker
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+# How many of the most requested quiz keys and tutoring questions to warm
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+# Only requests this recent count towards popularity
+WARMUP_WINDOW_HOURS = float(os.getenv("WARMUP_WINDOW_HOURS", "24"))
+WARMUP_MAX_CONCURRENCY = int(os.getenv("WARMUP_MAX_CONCURRENCY", "2"))
+# Upstream generations per minute the warm-up may start
+WARMUP_MAX_PER_MINUTE = float(os.getenv("WARMUP_MAX_PER_MINUTE", "20"))
+WARMUP_CHECKPOINT_PATH = os.getenv("WARMUP_CHECKPOINT_PATH", "warmup_checkpoint.json")
+# Banked quizzes kept ready per popular (subject, level, num_questions)
+WARMUP_QUIZZES_PER_KEY = int(os.getenv("WARMUP_QUIZZES_PER_KEY", "2"))
+
+_BUSY_BACKOFF_SECONDS = 1.0
+
+_QUIZ_FIELDS = ("subject", "level", "num_questions")
+_TUTOR_FIELDS = ("subject", "level", "question", "learning_style", "background", "profile")
+
+
+def plan_from_entries(entries, top_n=WARMUP_TOP_N, quizzes_per_key=WARMUP_QUIZZES_PER_KEY):
+    """
+    Turn access log entries into an ordered list of warm-up tasks.
+
+    Quiz keys and tutoring questions are ranked by request count and the
+    two rankings interleaved (see `plan_from_keys`), so the hottest content
+    of either kind goes first.
+
+    Returns:
+        list: Tasks as dicts with id, kind and params
+    """
+
+    quiz_counts = Counter()
+    tutor_counts = Counter()
+    for entry in entries:
+        if entry.get("kind") == "quiz":
+            quiz_counts[tuple(entry.get(field) for field in _QUIZ_FIELDS)] += 1
+        elif entry.get("kind") == "tutor":
+            tutor_counts[tuple(entry.get(field) for field in _TUTOR_FIELDS)] += 1
+
+    quiz_keys = [key for key, _ in quiz_counts.most_common(top_n)]
+    tutor_keys = [key for key, _ in tutor_counts.most_common(top_n)]
+    return plan_from_keys(quiz_keys, tutor_keys, quizzes_per_key)
+
+
+def plan_from_keys(quiz_keys, tutor_keys, quizzes_per_key=WARMUP_QUIZZES_PER_KEY):
+    """
+    Build warm-up tasks from quiz and tutoring key tuples, each ranked hottest first.
+
+    Tutoring keys recorded with a redacted question cannot be replayed and are
+    skipped; their answers are already kept in the persistent tutor cache.
+    """
+    tutor_keys = [key for key in tutor_keys if not any(is_redacted(value) for value in key)]
+
+    def quiz_task(key, copy):
+        return {"id": f"quiz:{json.dumps(key, ensure_ascii=False)}:{copy}", "kind": "quiz",
+                "params": dict(zip(_QUIZ_FIELDS, key))}
+
+    def tutor_task(key):
+        return {"id": f"tutor:{json.dumps(key, ensure_ascii=False)}", "kind": "tutor",
+                "params": dict(zip(_TUTOR_FIELDS, key))}
+
+    # One quiz per key first, so breadth comes before extra copies
+    plan = []
+    for rank in range(max(len(quiz_keys), len(tutor_keys))):
+        if rank < len(quiz_keys):
+            plan.append(quiz_task(quiz_keys[rank], 0))
+        if rank < len(tutor_keys):
+            plan.append(tutor_task(tutor_keys[rank]))
+    for copy in range(1, quizzes_per_key):
+        plan.extend(quiz_task(key, copy) for key in quiz_keys)
+    return plan
+
+
+class WarmupRunner:
+    """
+    Pre-generates popular content in a background thread after startup.
+
+    Progress is checkpointed to a JSON file after every task, so a restart
+    during warm-up resumes where it stopped instead of starting over. The
+    runner yields to foreground traffic whenever `is_busy` returns True.
+
+    Args:
+        handlers (dict): Maps a task kind to a callable taking the task params as kwargs
+        plan (callable): Returns the list of tasks to run
+        is_busy (callable): Returns True while requests are queueing for the upstream
+    """
+
+    def __init__(self, handlers, plan, is_busy=None, checkpoint_path=WARMUP_CHECKPOINT_PATH,
+                 max_concurrency=WARMUP_MAX_CONCURRENCY, max_per_minute=WARMUP_MAX_PER_MINUTE,
+                 max_age=WARMUP_WINDOW_HOURS * 3600):
+        self.handlers = handlers
+        self._plan = plan
+        self._is_busy = is_busy or (lambda: False)
+        self.checkpoint_path = checkpoint_path
+        self.max_concurrency = max_concurrency
+        self.interval = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._next_start = 0.0
+        self.status = "idle"
+        self.tasks = []
+        self.done = set()
+        self.failed = set()
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def shutdown(self):
+        self._stop.set()
+        self._thread = None
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return set()
+        if time.time() - checkpoint.get("updated_at", 0) > self.max_age:
+            return set()
+        return set(checkpoint.get("done", []))
+
+    def _save_checkpoint(self):
+        checkpoint = {"done": sorted(self.done), "planned": len(self.tasks), "updated_at": time.time()}
+        tmp_path = self.checkpoint_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(checkpoint, f, ensure_ascii=False)
+            os.replace(tmp_path, self.checkpoint_path)
+        except OSError as e:
+            logger.warning(f"Failed to write warm-up checkpoint: {str(e)}")
+
+    def _wait_for_turn(self):
+        """Block until the rate budget and foreground load allow another generation."""
+        while not self._stop.is_set():
+            if self._is_busy():
+                self._stop.wait(_BUSY_BACKOFF_SECONDS)
+                continue
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._next_start:
+                    self._next_start = now + self.interval
+                    return True
+                delay = self._next_start - now
+            self._stop.wait(delay)
+        return False
+
+    def _run_task(self, task):
+        if not self._wait_for_turn():
+            return
+        try:
+            self.handlers[task["kind"]](**task["params"])
+        except Exception as e:
+            logger.warning(f"Warm-up task {task['id']} failed: {str(e)}")
+            with self._lock:
+                self.failed.add(task["id"])
+            return
+        with self._lock:
+            self.done.add(task["id"])
+            self._save_checkpoint()
+
+    def run(self):
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            self.tasks = self._plan()
+            planned = {task["id"] for task in self.tasks}
+            self.done = self._load_checkpoint() & planned
+            pending = [task for task in self.tasks if task["id"] not in self.done]
+            logger.info(f"Warm-up: {len(self.tasks)} task(s) planned, {len(pending)} to run")
+
+            with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="warmup") as pool:
+                list(pool.map(self._run_task, pending))
+            self.status = "stopped" if self._stop.is_set() else "finished"
+        except Exception as e:
+            logger.error(f"Warm-up failed: {str(e)}")
+            self.status = "failed"
+        self.finished_at = time.time()
+
+    def stats(self):
+        with self._lock:
+            planned = len(self.tasks)
+            return {
+                "status": self.status,
+                "planned": planned,
+                "completed": len(self.done),
+                "failed": len(self.failed),
+                "coverage": round(len(self.done) / planned, 3) if planned else None,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+
+def recent_plan(access_log=None, window_hours=WARMUP_WINDOW_HOURS, top_n=WARMUP_TOP_N):
+    """Plan warm-up tasks from the access log entries of the last `window_hours`."""
+    access_log = access_log or AccessLog()
+    return plan_from_entries(access_log.entries(since=time.time() - window_hours * 3600), top_n)
+
+
+def hot_key_plan(tracker, top_n=WARMUP_TOP_N, access_log=None):
+    """
+    Plan warm-up tasks from the persisted heavy hitters of a HotKeyTracker.
+
+    The sketches cover traffic from before the restart in bounded memory, so
+    the access log is only replayed while they are still empty.
+    """
+    quiz_keys = [key for key, _ in tracker.top("quiz", top_n)]
+    tutor_keys = [key for key, _ in tracker.top("tutor", top_n)]
+    if not quiz_keys and not tutor_keys:
+        return recent_plan(access_log, top_n=top_n)
+    return plan_from_keys(quiz_keys, tutor_keys)
+
+
+def main(argv=None):
+    """Print the warm-up plan the server would run: python warmup.py [--top N]"""
+    parser = argparse.ArgumentParser(description="Show the warm-up plan derived from recent traffic")
+    parser.add_argument("--top", type=int, default=WARMUP_TOP_N, help="Top quiz keys and tutoring questions")
+    parser.add_argument("--hours", type=float, default=WARMUP_WINDOW_HOURS, help="Access log window")
+    parser.add_argument("--from-log", action="store_true", help="Replay the access log instead of the hot key sketches")
+    args = parser.parse_args(argv)
+    if args.from_log:
+        plan = recent_plan(window_hours=args.hours, top_n=args.top)
+    else:
+        plan = hot_key_plan(HotKeyTracker(persist_seconds=0), top_n=args.top)
+    for task in plan:
+        print(json.dumps(task, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
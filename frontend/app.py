@@ -1,22 +1,130 @@
+import uuid
 import streamlit as st
 import requests
-import uuid
-import random
+from requests.adapters import HTTPAdapter
 from streamlit.components.v1 import html
 
 # Page configuration
 st.set_page_config(page_title="AI Tutor", layout="wide")
 
-# Backend connection check function
+API_ENDPOINT = "http://127.0.0.1:8000"
+
+# (connect, read) timeouts in seconds; generation can take a while upstream
+HEALTH_TIMEOUT = (1, 2)
+GENERATION_TIMEOUT = (3.05, 120)
+
+# How long identical tutor answers / quizzes are served from the cache
+TUTOR_CACHE_TTL = 3600
+QUIZ_CACHE_TTL = 600
+
+
+@st.cache_resource
+def get_http_session():
+    """One pooled keep-alive session shared by every rerun and browser tab."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Backend connection check function (cached briefly, so the status may be up to 15s old)
+@st.cache_data(ttl=15, show_spinner=False)
 def check_backend_connection():
     try:
-        response = requests.get("http://127.0.0.1:8000/health")
+        response = get_http_session().get(f"{API_ENDPOINT}/health", timeout=HEALTH_TIMEOUT)
         if response.status_code == 200:
             return True, "✅ Backend is connected!"
         return False, f"❌ Backend error: {response.text}"
     except Exception as e:
         return False, f"❌ Cannot connect to backend: {str(e)}"
 
+
+def _post(path, payload):
+    response = get_http_session().post(f"{API_ENDPOINT}{path}", json=payload, timeout=GENERATION_TIMEOUT)
+    if response.status_code != 200:
+        # Raising keeps failed calls out of the st.cache_data cache
+        raise RuntimeError(f"Error from server: {response.text}")
+    return response.json()
+
+
+@st.cache_data(ttl=TUTOR_CACHE_TTL, show_spinner=False)
+def fetch_tutor_response(subject, level, question, learning_style, background, language):
+    return _post("/tutor", {
+        "subject": subject,
+        "level": level,
+        "learning_style": learning_style,
+        "language": language,
+        "background": background,
+        "question": question
+    })
+
+
+def request_quiz(subject, level, num_questions, language, session_id):
+    # session_id lets the backend prepare the session's next quiz in the background
+    return _post("/quiz", {
+        "subject": subject,
+        "level": level,
+        "num_questions": num_questions,
+        "language": language,
+        "reveal_format": True,
+        "session_id": session_id
+    })
+
+
+class PartialTranslation(Exception):
+    """A quiz with segments left in the source language; carries it without caching it."""
+
+    def __init__(self, result):
+        super().__init__(f"{result.get('untranslated')} segment(s) could not be translated")
+        self.result = result
+
+
+@st.cache_data(ttl=QUIZ_CACHE_TTL, show_spinner=False)
+def fetch_quiz(subject, level, num_questions, language, _session_id):
+    # Shared by every session asking for the same quiz; the leading underscore
+    # keeps the session ID out of the cache key
+    result = request_quiz(subject, level, num_questions, language, _session_id)
+    if result.get("untranslated"):
+        # Raising keeps a partly translated quiz out of the cache; the caller still shows it
+        raise PartialTranslation(result)
+    return result
+
+
+def submit_answers(quiz_id, session_id, answers):
+    # Not cached: every submission is scored, and a single student's score
+    # steers the level of the next quiz the backend prepares for this session
+    return _post("/grade", {
+        "quiz_id": quiz_id,
+        "session_id": session_id,
+        "submissions": [{"student_id": session_id, "answers": answers}]
+    })
+
+
+def show_score(quiz_id, answers):
+    try:
+        result = submit_answers(quiz_id, st.session_state.session_id, answers)
+        student = result["students"][0]
+        st.info(f"Score: {student['correct']}/{student['total']} ({student['percent']:.0f}%). "
+                "Your next quiz adapts to this score.")
+    except Exception as e:
+        st.error(f"Error submitting answers: {str(e)}")
+
+
+def estimate_quiz_height(quiz):
+    """Size the quiz iframe from its content instead of a fixed height per question."""
+    height = 120
+    for q in quiz:
+        height += 200 + 24 * (len(q["question"]) // 90)
+        height += sum(52 + 22 * (len(str(option)) // 90) for option in q["options"])
+    return min(height, 4000)
+
+
+if "quiz_round" not in st.session_state:
+    st.session_state.quiz_round = 0
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
 # App title and header
 st.title("AI-Powered Tutor & Quiz App")
 
@@ -37,9 +145,6 @@ with st.sidebar:
         else:
             st.error(message)
 
-# Main content area
-API_ENDPOINT = "http://127.0.0.1:8000"
-
 # Tabs for Question and Quiz
 tab1, tab2 = st.tabs(["Ask a Question", "Take a Quiz"])
 
@@ -48,26 +153,19 @@ with tab1:
     question = st.text_area("What would you like to learn today?", "Explain Newton's Second Law of Motion.")
     
     if st.button("Get Answer"):
-        try:
-            response = requests.post(
-                f"{API_ENDPOINT}/tutor",
-                json={
-                    "subject": subject,
-                    "level": level,
-                    "learning_style": learning_style,
-                    "language": language,
-                    "background": background,
-                    "question": question
-                }
-            )
-            if response.status_code == 200:
-                st.success("Here's your personalized explanation:")
-                st.markdown(response.json().get("response", "No response from server"), unsafe_allow_html=True)
-            else:
-                st.error(f"Error from server: {response.text}")
-        except Exception as e:
-            st.error(f"Error getting explanation: {str(e)}")
-            st.info(f"Make sure the backend server is running at {API_ENDPOINT}")
+        with st.spinner("Generating personalized explanation..."):
+            try:
+                st.session_state.tutor_response = fetch_tutor_response(
+                    subject, level, question, learning_style, background, language
+                )
+            except Exception as e:
+                st.session_state.pop("tutor_response", None)
+                st.error(f"Error getting explanation: {str(e)}")
+                st.info(f"Make sure the backend server is running at {API_ENDPOINT}")
+
+    if "tutor_response" in st.session_state:
+        st.success("Here's your personalized explanation:")
+        st.markdown(st.session_state.tutor_response.get("response", "No response from server"), unsafe_allow_html=True)
 
 with tab2:
     st.header("Take a Quiz")
@@ -82,54 +180,84 @@ with tab2:
         quiz_button = st.button("Generate Quiz", use_container_width=True)
     
     if quiz_button:
+        st.session_state.quiz_round += 1
+        quiz_settings = (subject, level, num_questions, language)
         with st.spinner("Creating quiz questions..."):
             try:
-                # Request quiz with interactive answer reveal format
-                response = requests.post(f"{API_ENDPOINT}/quiz", json={
-                    "subject": subject,
-                    "level": level,
-                    "num_questions": num_questions,
-                    "reveal_format": True
-                })
-                
-                if response.status_code == 200:
-                    response_data = response.json()
-                    st.success("Quiz generated! Try answering these questions:")
-
-                    # Check if we have formatted quiz HTML
-                    if "formatted_quiz" in response_data and response_data["formatted_quiz"]:
-                        # Display using HTML component
-                        html(response_data["formatted_quiz"], height=num_questions * 300)
-                    # Check if we have quiz data
-                    elif "quiz" in response_data and response_data["quiz"]:
-                        # Fallback to simple display if formatted quiz isn't available
-                        for i, q in enumerate(response_data["quiz"]):
-                            with st.expander(f"Question {i+1}: {q['question']}", expanded=True):
-                                # Generate a random session ID to avoid conflicts between questions
-                                session_id = str(uuid.uuid4())
-
-                                # Display options as radio buttons
-                                selected = st.radio(
-                                    "Select your answer:", 
-                                    q["options"], 
-                                    key=f"q_{session_id}",
-                                    index=None  # No default selection
-                                )
-
-                                # Check answer button
-                                if st.button("Check Answer", key=f"check_{session_id}"):
-                                    if selected == q["correct_answer"]:
-                                        st.success(f"Correct! {q.get('explanation', '')}")
-                                    else:
-                                        st.error(f"Incorrect. The correct answer is: {q['correct_answer']}")
-                    else:
-                        st.error("Unexpected response format from the server")
+                # Request quiz with interactive answer reveal format. The first quiz for
+                # these settings may come from the cache; asking again means a new one.
+                if st.session_state.get("quiz_settings") == quiz_settings:
+                    st.session_state.quiz = request_quiz(*quiz_settings, st.session_state.session_id)
                 else:
-                    st.error(f"Error from server: {response.text}")
-
+                    try:
+                        st.session_state.quiz = fetch_quiz(*quiz_settings, st.session_state.session_id)
+                    except PartialTranslation as e:
+                        st.session_state.quiz = e.result
+                st.session_state.quiz_settings = quiz_settings
             except Exception as e:
+                st.session_state.pop("quiz", None)
+                st.session_state.pop("quiz_settings", None)
                 st.error(f"Error generating quiz: {str(e)}")
                 st.info(f"Make sure the backend server is running at {API_ENDPOINT}")
+
+    # The quiz lives in session state so widget clicks rerun without refetching
+    if "quiz" in st.session_state:
+        response_data = st.session_state.quiz
+        quiz_round = st.session_state.quiz_round
+        st.success("Quiz generated! Try answering these questions:")
+        if response_data.get("partial"):
+            st.warning("Some questions could not be generated in time, so this quiz is shorter than requested.")
+        if response_data.get("untranslated"):
+            st.warning("Part of this quiz could not be translated and is shown in English. "
+                       "Generate it again for a full translation.")
+
+        # Check if we have formatted quiz HTML
+        if "formatted_quiz" in response_data and response_data["formatted_quiz"]:
+            # Display using HTML component
+            html(response_data["formatted_quiz"], height=estimate_quiz_height(response_data["quiz"]), scrolling=True)
+
+            # Clicks inside the HTML component stay in the browser, so answers are submitted here
+            if response_data.get("quiz_id"):
+                with st.form(key=f"answers_{quiz_round}"):
+                    st.markdown("**Submit your answers for a score**")
+                    letters = ["A", "B", "C", "D", "E", "F"]
+                    answers = [
+                        st.radio(f"Question {i+1}", letters[:len(q["options"])], index=None, horizontal=True,
+                                 key=f"answer_{quiz_round}_{i}")
+                        for i, q in enumerate(response_data["quiz"])
+                    ]
+                    if st.form_submit_button("Submit Answers"):
+                        show_score(response_data["quiz_id"], answers)
+        # Check if we have quiz data
+        elif "quiz" in response_data and response_data["quiz"]:
+            # Fallback to simple display if formatted quiz isn't available
+            selections = []
+            for i, q in enumerate(response_data["quiz"]):
+                with st.expander(f"Question {i+1}: {q['question']}", expanded=True):
+                    # Stable keys per quiz round keep selections across reruns
+                    key = f"{quiz_round}_{i}"
+
+                    # Display options as radio buttons
+                    selected = st.radio(
+                        "Select your answer:", 
+                        q["options"], 
+                        key=f"q_{key}",
+                        index=None  # No default selection
+                    )
+                    selections.append(None if selected is None else q["options"].index(selected))
+
+                    # Check answer button
+                    if st.button("Check Answer", key=f"check_{key}"):
+                        if selected == q["correct_answer"]:
+                            st.success(f"Correct! {q.get('explanation', '')}")
+                        else:
+                            st.error(f"Incorrect. The correct answer is: {q['correct_answer']}")
+
+            if response_data.get("quiz_id") and st.button("Submit Answers", key=f"submit_{quiz_round}"):
+                show_score(response_data["quiz_id"], selections)
+        else:
+            st.error("Unexpected response format from the server")
+
 # Footer
 st.markdown("---")
 st.markdown("Powered by AI - Your Personal Learning Assistant")
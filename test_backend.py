@@ -1,5 +1,14 @@
-import requests
+import os
+import sys
 import json
+import time
+import asyncio
+import tempfile
+import threading
+
+import requests
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
 
 def test_quiz_endpoint():
     url = "http://127.0.0.1:8000/quiz"
@@ -18,5 +27,879 @@ def test_quiz_endpoint():
     except Exception as e:
         print(f"Error: {str(e)}")
 
+def test_quiz_job_endpoint():
+    url = "http://127.0.0.1:8000/jobs/quiz"
+    payload = {
+        "subject": "Mathematics",
+        "level": "Beginner",
+        "num_questions": 2
+    }
+
+    try:
+        job = requests.post(url, json=payload).json()
+        print(f"Submitted job: {job['job_id']}")
+        for _ in range(60):
+            job = requests.get(f"http://127.0.0.1:8000/jobs/{job['job_id']}").json()
+            if job["status"] in ("completed", "failed"):
+                break
+            time.sleep(1)
+        print(json.dumps(job, indent=2))
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+def _import_backend():
+    """Import the backend app in-process, with its state files in a temporary directory."""
+    state_dir = tempfile.mkdtemp(prefix="ai-tutor-test-")
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ.setdefault("WARMUP_ENABLED", "0")
+    for name, file_name in [("QUIZ_DB_PATH", "quizzes.db"), ("CURRICULUM_DB_PATH", "curriculum.db"),
+                            ("TRANSLATION_DB_PATH", "translations.db"), ("TUTOR_CACHE_DB_PATH", "tutor_cache.db"),
+                            ("USAGE_DB_PATH", "usage.db"), ("ACCESS_LOG_PATH", "access_log.jsonl"),
+                            ("HOTKEYS_PATH", "hot_keys.json"), ("WARMUP_CHECKPOINT_PATH", "warmup.json")]:
+        os.environ.setdefault(name, os.path.join(state_dir, file_name))
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import main
+    return main
+
+
+def test_disconnect_abandons_generation():
+    """A client that hangs up mid-generation gets a 499 and its generation is abandoned."""
+    main = _import_backend()
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_generation(*args):
+        started.set()
+        release.wait(10)
+        return "too late"
+
+    original = main.generate_tutoring_response
+    main.generate_tutoring_response = slow_generation
+    body = json.dumps({"subject": "Math", "level": "Beginner", "question": "What is a prime?"}).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": "/tutor", "raw_path": b"/tutor", "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000), "server": ("127.0.0.1", 8000),
+    }
+    sent = []
+
+    async def run():
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            # The client drops the connection once the generation is under way
+            while not started.is_set():
+                await asyncio.sleep(0.01)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await asyncio.wait_for(main.app(scope, receive, send), timeout=5)
+        assert sent[0]["type"] == "http.response.start"
+        assert sent[0]["status"] == 499
+        # The worker thread cannot be interrupted, so its slot stays taken until it returns
+        generation = scope["state"]["generation"]
+        assert not generation.done()
+        assert controller.in_flight == 1
+        release.set()
+        await asyncio.wait({generation}, timeout=5)
+        assert controller.in_flight == 0
+
+    controller = main.admission_controllers["tutor"]
+    try:
+        asyncio.run(run())
+    finally:
+        release.set()
+        main.generate_tutoring_response = original
+
+
+def test_non_english_questions_are_not_duplicates():
+    """Questions in non-Latin scripts are compared by their words, not flattened to nothing."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from quiz_validation import validate_questions
+
+    def question(text):
+        return {"question": text, "options": ["1", "2", "3", "4"], "correct_answer": "1"}
+
+    questions = [
+        question("प्रकाश संश्लेषण में पौधे किस गैस का उपयोग करते हैं?"),
+        question("भारत की राजधानी कौन सा शहर है?"),
+        question("¿Cuál es la capital de Francia?"),
+        question("光合作用需要哪种气体？"),
+        question("प्रकाश संश्लेषण में पौधे किस गैस का उपयोग करते हैं?"),
+    ]
+    issues = validate_questions(questions)
+    assert issues[:4] == [[], [], [], []]
+    assert any("Near-duplicate of question 1" in issue for issue in issues[4])
+
+
+def test_jobs_are_shared_fairly_between_tenants():
+    """A tenant submitting after another's batch runs next, not after the whole batch."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from jobs import JobRunner, MemoryJobStore
+
+    gate = threading.Event()
+    busy = threading.Event()
+    order = []
+
+    def handler(name, tenant=None):
+        busy.set()
+        gate.wait(5)
+        order.append(name)
+        return {}
+
+    runner = JobRunner(MemoryJobStore(), {"quiz": handler}, max_workers=1)
+    try:
+        jobs = [runner.submit("quiz", {"name": "a0", "tenant": "school-a"})]
+        # school-b arrives while school-a's first job is already running
+        busy.wait(5)
+        jobs += [runner.submit("quiz", {"name": f"a{index}", "tenant": "school-a"}) for index in range(1, 4)]
+        jobs.append(runner.submit("quiz", {"name": "b0", "tenant": "school-b"}))
+        gate.set()
+        deadline = time.time() + 5
+        while len(order) < len(jobs) and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        runner.shutdown()
+    assert order == ["a0", "b0", "a1", "a2", "a3"]
+
+
+def test_full_admission_queue_makes_room_for_another_tenant():
+    """One tenant filling the wait queue cannot lock other tenants out of it."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from admission import AdmissionController, Overloaded
+
+    async def run():
+        controller = AdmissionController("quiz", max_in_flight=1, max_queue=4, queue_deadline=60,
+                                         tenant_max_queue=4)
+        started = await controller.acquire("school-a")
+        waiters = [asyncio.ensure_future(controller.acquire("school-a")) for _ in range(4)]
+        await asyncio.sleep(0)
+        assert controller.waiting == 4
+
+        # A newcomer that is rejected anyway sheds nobody
+        controller.service_time = 100
+        rejected = await asyncio.gather(controller.acquire("school-b"), return_exceptions=True)
+        assert isinstance(rejected[0], Overloaded) and rejected[0].reason == "estimated queue time exceeds deadline"
+        assert controller.waiting == 4 and not any(waiter.done() for waiter in waiters)
+        controller.service_time = 1
+
+        other = asyncio.ensure_future(controller.acquire("school-b"))
+        await asyncio.sleep(0)
+        assert controller.waiting == 4
+        shed = await asyncio.gather(waiters[-1], return_exceptions=True)
+        assert isinstance(shed[0], Overloaded)
+
+        # Slots then alternate between the tenants
+        controller.release(started, "school-a")
+        started = await asyncio.wait_for(waiters[0], timeout=1)
+        controller.release(started, "school-a")
+        await asyncio.wait_for(other, timeout=1)
+        assert controller.stats()["tenants"]["school-b"]["in_flight"] == 1
+        for waiter in waiters[1:-1]:
+            waiter.cancel()
+        await asyncio.gather(*waiters[1:-1], return_exceptions=True)
+
+    asyncio.run(run())
+
+
+def test_usage_store_forgets_idle_tenants_and_expired_buckets():
+    """Quota memory holds only tenants active in the last hour; usage rows expire after the retention."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from tenants import UsageStore
+
+    path = os.path.join(tempfile.mkdtemp(prefix="ai-tutor-usage-"), "usage.db")
+    store = UsageStore(path, bucket_seconds=60, flush_seconds=0, retention_days=1)
+    now = time.time()
+    with store._conn:
+        store._conn.execute("INSERT INTO usage VALUES ('old-school', ?, 1, 0, 0, 10, 10, 1.0, 1.0)",
+                            (store._bucket(now - 3 * 86400),))
+    store._recent_tokens["idle-school"] = {store._bucket(now - 2 * 3600): 50}
+    store.record("busy-school", 0.1, usage=type("Usage", (), {"prompt_tokens": 5})())
+    store.flush()
+
+    assert set(store._recent_tokens) == {"busy-school"}
+    assert set(store.report(since=0)) == {"busy-school"}
+    assert store.tokens_used("busy-school") == 5
+
+
+def test_translated_quiz_is_graded_in_its_language():
+    """Option text submitted in the served language scores like the source text."""
+    from fastapi.testclient import TestClient
+
+    main = _import_backend()
+    from quiz_model import Question
+    from translation import get_translation_memory
+
+    question = Question("What is the capital of France?", ("Berlin", "Paris", "Rome", "Madrid"), 1,
+                        "Paris is the capital of France.")
+    quiz_id = main.quiz_store.save([question], "Geography", "Beginner")
+    get_translation_memory().store("Spanish", [
+        ("What is the capital of France?", "¿Cuál es la capital de Francia?"), ("Berlin", "Berlín"),
+        ("Paris", "París"), ("Rome", "Roma"), ("Madrid", "Madrid"),
+        ("Paris is the capital of France.", "París es la capital de Francia."),
+    ])
+
+    with TestClient(main.app) as client:
+        def grade(answer, language=None):
+            response = client.post("/grade", json={"quiz_id": quiz_id, "language": language,
+                                                   "submissions": [{"student_id": "s1", "answers": [answer]}]})
+            assert response.status_code == 200
+            return response.json()["students"][0]["correct"]
+
+        assert grade("París", "Spanish") == 1
+        assert grade("B", "Spanish") == 1
+        assert grade(1) == 1
+        assert grade("París") == 0
+
+
+def test_irrelevant_course_material_is_left_out():
+    """Only chunks scoring at least min_score are retrieved."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from retrieval import VectorIndex, ingest
+
+    directory = tempfile.mkdtemp(prefix="ai-tutor-rag-")
+    notes = os.path.join(directory, "history.txt")
+    with open(notes, "w", encoding="utf-8") as f:
+        f.write("The French Revolution began in 1789 when the people of Paris stormed the Bastille. " * 10)
+    ingest([notes], os.path.join(directory, "index"))
+    index = VectorIndex(os.path.join(directory, "index"))
+
+    assert index.query("History When did the French Revolution start?", min_score=0.15)
+    assert index.query("Mathematics What is a prime number?", min_score=0.15) == []
+    assert len(index.query("Mathematics What is a prime number?", min_score=-1)) == 1
+
+
+def test_llm_corpus_is_one_gzip_stream_and_replay_misses_are_reported():
+    """Records share one gzip stream that is readable before close; strict replay rejects unknown prompts."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import types
+    import zlib
+
+    from llm_replay import RecordingClient, ReplayClient, ReplayMiss, iter_corpus
+
+    def create(model, messages, **params):
+        message = types.SimpleNamespace(content=f"answer to {messages[-1]['content']}")
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=None)
+
+    upstream = types.SimpleNamespace(chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create)))
+    path = os.path.join(tempfile.mkdtemp(prefix="ai-tutor-corpus-"), "corpus.jsonl.gz")
+    recorder = RecordingClient(upstream, path)
+    for prompt in ("one", "two", "three"):
+        recorder.chat.completions.create(model="m", messages=[{"role": "user", "content": prompt}])
+    # Readable while still open, as after a crash
+    assert [record["content"] for record in iter_corpus(path)] == ["answer to one", "answer to two", "answer to three"]
+    recorder.close()
+    with open(path, "rb") as f:
+        stream = zlib.decompressobj(wbits=31)
+        stream.decompress(f.read())
+    assert stream.eof and stream.unused_data == b""
+
+    replay = ReplayClient(path, speed=0)
+    reply = replay.chat.completions.create(model="m", messages=[{"role": "user", "content": "two"}])
+    assert reply.choices[0].message.content == "answer to two"
+    replay.chat.completions.create(model="m", messages=[{"role": "user", "content": "unknown"}])
+    assert (replay.hits, replay.misses) == (1, 1)
+
+    strict = ReplayClient(path, speed=0, strict=True)
+    try:
+        strict.chat.completions.create(model="m", messages=[{"role": "user", "content": "unknown"}])
+    except ReplayMiss:
+        pass
+    else:
+        raise AssertionError("strict replay answered an unknown prompt")
+    assert strict.misses == 1
+
+
+def test_course_material_in_other_scripts_is_retrievable():
+    """Hindi and accented text embeds to whole words, so it can be found again."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from retrieval import VectorIndex, embed, ingest, tokenize
+
+    assert tokenize("न्यूटन का दूसरा नियम") == ["न्यूटन", "का", "दूसरा", "नियम"]
+    assert tokenize("La théorie de l'évolution") == ["la", "théorie", "de", "l", "évolution"]
+    assert abs(embed(["दूसरा नियम"])).sum() > 0
+
+    directory = tempfile.mkdtemp(prefix="ai-tutor-rag-")
+    notes = os.path.join(directory, "physics.txt")
+    with open(notes, "w", encoding="utf-8") as f:
+        f.write("न्यूटन का दूसरा नियम कहता है कि बल द्रव्यमान और त्वरण का गुणनफल है। " * 10)
+    ingest([notes], os.path.join(directory, "index"))
+    index = VectorIndex(os.path.join(directory, "index"))
+    assert index.query("न्यूटन का दूसरा नियम क्या है?")
+
+
+def test_partly_translated_quiz_page_is_not_cached():
+    """A page with segments left in the source language is neither cached nor immutable."""
+    from fastapi.testclient import TestClient
+
+    main = _import_backend()
+    import ai_engine
+    import tenants
+    from quiz_model import Question
+    from translation import get_translation_memory
+
+    question = Question("Which gas do plants absorb?", ("Oxygen", "Carbon dioxide", "Nitrogen", "Helium"), 1,
+                        "Plants absorb carbon dioxide.")
+    quiz_id = main.quiz_store.save([question], "Biology", "Beginner")
+
+    def unavailable(prompt):
+        raise Exception("translation service unavailable")
+
+    original = ai_engine._request_translation
+    ai_engine._request_translation = unavailable
+    try:
+        with TestClient(main.app) as client:
+            response = client.get(f"/quiz-html/{quiz_id}", params={"language": "German"})
+            assert response.status_code == 200
+            assert response.headers["cache-control"] == "no-store"
+            assert "etag" not in response.headers
+            assert main.quiz_pages.get(quiz_id, None, "German") is None
+
+            get_translation_memory().store("German", [
+                ("Which gas do plants absorb?", "Welches Gas nehmen Pflanzen auf?"), ("Oxygen", "Sauerstoff"),
+                ("Carbon dioxide", "Kohlendioxid"), ("Nitrogen", "Stickstoff"), ("Helium", "Helium"),
+                ("Plants absorb carbon dioxide.", "Pflanzen nehmen Kohlendioxid auf."),
+            ])
+            response = client.get(f"/quiz-html/{quiz_id}", params={"language": "German"})
+            assert "immutable" in response.headers["cache-control"]
+            assert "Kohlendioxid" in response.text
+
+            # Serving a stored quiz in another language counts against the tenant's token quota
+            tenants.TENANT_QUOTAS["over-quota"] = {"tokens_per_hour": 1}
+            tenants.TENANT_API_KEYS["over-quota-key"] = "over-quota"
+            main.usage_store.record("over-quota", 0.1, usage=type("Usage", (), {"prompt_tokens": 5})())
+            headers = {tenants.TENANT_KEY_HEADER: "over-quota-key"}
+            assert client.get(f"/quiz/{quiz_id}", params={"language": "German"}, headers=headers).status_code == 429
+            assert client.get(f"/quiz/{quiz_id}", headers=headers).status_code == 200
+
+            # The tenant comes from the key: naming one in a header or guessing a key does not bill it
+            forged = {tenants.TENANT_HEADER: "school-b"}
+            assert client.get(f"/quiz/{quiz_id}", params={"language": "German"}, headers=forged).status_code == 200
+            assert "school-b" not in main.usage_store.report()
+            guessed = {tenants.TENANT_KEY_HEADER: "not-a-key"}
+            assert client.get(f"/quiz/{quiz_id}", headers=guessed).status_code == 401
+    finally:
+        ai_engine._request_translation = original
+        tenants.TENANT_QUOTAS.pop("over-quota", None)
+        tenants.TENANT_API_KEYS.pop("over-quota-key", None)
+
+
+def test_partial_translations_are_reported_and_metered():
+    """A quiz with failed segments says so, and grading in another language counts against the quota."""
+    from fastapi.testclient import TestClient
+
+    main = _import_backend()
+    import ai_engine
+    import tenants
+    from quiz_model import Question
+
+    question = Question("Which planet is largest?", ("Mars", "Jupiter", "Venus", "Mercury"), 1,
+                        "Jupiter is the largest planet.")
+    quiz_id = main.quiz_store.save([question], "Astronomy", "Beginner")
+
+    def unavailable(prompt):
+        raise Exception("translation service unavailable")
+
+    original = ai_engine._request_translation, ai_engine._generate_tutoring_text
+    ai_engine._request_translation = unavailable
+    ai_engine._generate_tutoring_text = lambda *args: "Jupiter is the largest planet."
+    try:
+        with TestClient(main.app) as client:
+            tutor = {"subject": "Astronomy", "level": "Beginner", "question": "Which planet is largest?",
+                     "learning_style": "Text-based", "background": "Beginner", "language": "Italian"}
+            response = client.post("/tutor", json=tutor)
+            assert response.status_code == 503
+            assert "retry-after" in response.headers
+
+            response = client.get(f"/quiz/{quiz_id}", params={"language": "Italian"})
+            assert response.status_code == 200
+            assert response.json()["untranslated"] > 0
+            assert client.get(f"/quiz/{quiz_id}").json()["untranslated"] == 0
+
+            tenants.TENANT_QUOTAS["grading-over-quota"] = {"tokens_per_hour": 1}
+            tenants.TENANT_API_KEYS["grading-key"] = "grading-over-quota"
+            main.usage_store.record("grading-over-quota", 0.1, usage=type("Usage", (), {"prompt_tokens": 5})())
+            headers = {tenants.TENANT_KEY_HEADER: "grading-key"}
+            grade = {"quiz_id": quiz_id, "language": "Italian", "submissions": [{"student_id": "s1", "answers": ["B"]}]}
+            assert client.post("/grade", json=grade, headers=headers).status_code == 429
+    finally:
+        ai_engine._request_translation, ai_engine._generate_tutoring_text = original
+        tenants.TENANT_QUOTAS.pop("grading-over-quota", None)
+        tenants.TENANT_API_KEYS.pop("grading-key", None)
+
+
+def test_job_callbacks_cannot_target_internal_addresses():
+    """Callback URLs must be http(s) and resolve to public addresses unless allowlisted."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from jobs import JobRunner, MemoryJobStore, check_callback_url
+
+    runner = JobRunner(MemoryJobStore(), {"quiz": lambda **payload: {}}, max_workers=1)
+    try:
+        for url in ["http://169.254.169.254/latest/meta-data", "http://localhost:8000/admin/usage",
+                    "http://10.0.0.5/hook", "http://[::1]/", "http://2130706433/", "file:///etc/passwd"]:
+            try:
+                runner.submit("quiz", {}, callback_url=url)
+            except ValueError:
+                continue
+            raise AssertionError(f"{url} was accepted")
+    finally:
+        runner.shutdown()
+    assert check_callback_url("http://127.0.0.1:9000/", allowed_hosts={"127.0.0.1"}) is None
+
+
+def test_job_callbacks_connect_to_the_checked_address():
+    """A callback goes to the vetted address, whatever the host resolves to later, with its own Host header."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    import jobs
+
+    received = []
+
+    class Receiver(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append((self.headers["Host"], self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    original = jobs.check_callback_url
+    # The check vetted this address; the host itself resolves nowhere
+    jobs.check_callback_url = lambda url: "127.0.0.1"
+    runner = jobs.JobRunner(jobs.MemoryJobStore(), {"quiz": lambda **payload: {}}, max_workers=1)
+    try:
+        job = {"job_id": "j1", "kind": "quiz", "status": jobs.COMPLETED, "result": {}, "error": None,
+               "created_at": 0, "updated_at": 0, "callback_url": f"http://hooks.invalid:{port}/done"}
+        runner._send_callback(job)
+    finally:
+        jobs.check_callback_url = original
+        runner.shutdown()
+        server.shutdown()
+    assert received and received[0][0] == f"hooks.invalid:{port}"
+    assert json.loads(received[0][1])["job_id"] == "j1"
+
+
+def test_quiz_without_valid_questions_is_an_error_not_placeholders():
+    """When no generated question survives validation, /quiz fails and stores nothing."""
+    from fastapi.testclient import TestClient
+
+    main = _import_backend()
+    import ai_engine
+
+    original = ai_engine._request_quiz_completion
+    ai_engine._request_quiz_completion = lambda *args: "I cannot write a quiz about that."
+    try:
+        with TestClient(main.app) as client:
+            response = client.post("/quiz", json={"subject": "Alchemy", "level": "Beginner", "num_questions": 3,
+                                                  "session_id": "s-alchemy"})
+    finally:
+        ai_engine._request_quiz_completion = original
+    assert response.status_code == 500
+    assert "Sample" not in response.text
+    assert "s-alchemy" not in main.quiz_prefetcher._slots
+
+
+def test_admin_endpoints_need_a_token_and_never_see_student_questions():
+    """Hot keys and usage are admin-only; stored request keys hold digests, not question text."""
+    from fastapi.testclient import TestClient
+
+    main = _import_backend()
+    question = "My name is Priya Sharma and I failed my algebra exam, what is a quadratic?"
+    main._record_request("tutor", subject="Math", level="Beginner", question=question,
+                         learning_style="Text-based", background="Unknown", profile=None)
+    main.hot_keys.save()
+
+    original = main.ADMIN_TOKEN
+    try:
+        with TestClient(main.app) as client:
+            main.ADMIN_TOKEN = None
+            assert client.get("/admin/hot-keys").status_code == 403
+            main.ADMIN_TOKEN = "s3cret"
+            assert client.get("/admin/usage").status_code == 401
+            assert client.get("/admin/hot-keys", headers={"Authorization": "Bearer wrong"}).status_code == 401
+            response = client.get("/admin/hot-keys", headers={"Authorization": "Bearer s3cret"})
+            assert response.status_code == 200
+            assert response.json()["tutor"]["top"]
+            assert client.get("/admin/usage", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+    finally:
+        main.ADMIN_TOKEN = original
+
+    assert "Priya" not in response.text
+    for path in (main.hot_keys.path, main.access_log.path):
+        with open(path, "r", encoding="utf-8") as f:
+            assert "Priya" not in f.read()
+
+
+def test_quiz_pages_escape_generated_text():
+    """Markup in question, option or explanation text is shown as text on shared quiz pages."""
+    from fastapi.testclient import TestClient
+
+    main = _import_backend()
+    from quiz_model import Question
+
+    payload = "<img src=x onerror=alert(1)>"
+    question = Question(f"Which tag is this? {payload}", ("<script>alert(2)</script>", "<b>", "<i>", "<u>"), 0,
+                        f"Explanation {payload}")
+    quiz_id = main.quiz_store.save([question], "HTML", "Beginner")
+    with TestClient(main.app) as client:
+        page = client.get(f"/quiz-html/{quiz_id}").text
+    assert "<img" not in page and "<script>alert" not in page
+    assert "&lt;img src=x onerror=alert(1)&gt;" in page
+    assert "&lt;script&gt;alert(2)&lt;/script&gt;" in page
+
+
+def test_study_plan_breaks_prerequisite_cycles():
+    """A prerequisite cycle from the LLM is broken at one edge, keeping every other edge in order."""
+    _import_backend()
+    from curriculum import CurriculumStore, build_study_plan
+
+    store = CurriculumStore(os.path.join(tempfile.mkdtemp(prefix="ai-tutor-curriculum-"), "curriculum.db"))
+
+    def node(title, *prerequisites):
+        return {"id": title.lower(), "title": title, "description": "", "hours": 3.0,
+                "prerequisites": [p.lower() for p in prerequisites]}
+
+    store.add_nodes("Math", "Beginner", [
+        node("Fractions", "Ratios"), node("Decimals", "Fractions"), node("Ratios", "Decimals"),
+        node("Percentages", "Ratios"), node("Counting"),
+    ])
+    plan = build_study_plan(store, "Math", "Beginner", hours_per_week=6)["plan"]
+
+    position = {step["topic"]: step["step"] for step in plan}
+    assert len(position) == 5
+    for step in plan:
+        for prerequisite in step["prerequisites"]:
+            assert position[prerequisite] < step["step"]
+    assert sum(len(step["prerequisites"]) for step in plan) == 3
+    assert [step["week"] for step in plan] == [1, 1, 2, 2, 3]
+
+
+def test_minhash_estimates_track_exact_jaccard():
+    """Questions differing in one character are not estimated as identical."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from quiz_validation import SHINGLE_SIZE, _normalize_text, minhash_signatures
+
+    def shingles(text):
+        text = _normalize_text(text).ljust(SHINGLE_SIZE)
+        return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+    pairs = [(f"What is the derivative of x^{n}?", f"What is the derivative of x^{n + 1}?") for n in range(2, 9)]
+    pairs += [(f"What is {n} times 12?", f"What is {n} times 13?") for n in range(10, 20)]
+    pairs += [("Which gas do plants absorb during photosynthesis?", "Which gas do plants release during photosynthesis?")]
+    errors = []
+    for first, second in pairs:
+        exact = len(shingles(first) & shingles(second)) / len(shingles(first) | shingles(second))
+        signatures = minhash_signatures([first, second])
+        estimate = (signatures[0] == signatures[1]).mean()
+        assert estimate < 1.0
+        errors.append(abs(estimate - exact))
+    assert sum(errors) / len(errors) < 0.06
+
+
+def test_export_skips_questions_without_a_valid_answer_key():
+    """A letter answer is mapped onto its option; an answer matching no option is never exported as option A."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from quiz_export import export_questions
+
+    options = ["Berlin", "Paris", "Rome", "Madrid"]
+    bank = [
+        {"question": "What is the capital of France?", "options": options, "correct_answer": "b"},
+        {"question": "What is the capital of Italy?", "options": options, "correct_answer": "Lyon"},
+    ]
+    path = os.path.join(tempfile.mkdtemp(prefix="ai-tutor-export-"), "bank.gift")
+    skipped = []
+    assert export_questions(bank, path, "gift", skipped=skipped) == 1
+    with open(path, encoding="utf-8") as f:
+        exported = f.read()
+    assert "=Paris" in exported and "=Berlin" not in exported
+    assert "Italy" not in exported
+    assert [row for row, _ in skipped] == [2]
+
+
+def test_export_runs_offline_with_the_usual_file_mode():
+    """Exporting a bank needs no OpenAI key, and the file is created with the umask's permissions."""
+    import stat
+    import subprocess
+
+    directory = tempfile.mkdtemp(prefix="ai-tutor-export-")
+    bank = os.path.join(directory, "bank.jsonl")
+    with open(bank, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"question": "2 + 2?", "options": ["3", "4", "5", "6"], "correct_answer": "4"}) + "\n")
+    output = os.path.join(directory, "quiz.html")
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+    subprocess.run([sys.executable, "-c", "import os, sys; os.umask(0o022); sys.argv[0] = 'quiz_export.py'; "
+                    "import quiz_export; quiz_export.main(sys.argv[1:])",
+                    "--input", bank, "--format", "html", "--output", output],
+                   cwd=BACKEND_DIR, env=env, check=True, capture_output=True)
+    assert stat.S_IMODE(os.stat(output).st_mode) == 0o644
+
+
+def test_grade_steers_only_the_session_it_came_from():
+    """A quiz served to several sessions retargets the prefetch of the grading session alone."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from prefetch import QuizPrefetcher
+
+    prefetcher = QuizPrefetcher(lambda subject, level, num_questions, reveal: {"level": level},
+                                max_per_minute=600)
+    try:
+        for session_id in ("first", "second"):
+            prefetcher.schedule(session_id, "Math", "Beginner", 3, True, quiz_id="shared-quiz")
+        prefetcher.record_accuracy("shared-quiz", "second", 1.0)
+        prefetcher.record_accuracy("shared-quiz", "stranger", 0.0)
+
+        assert prefetcher._slots["first"].level == "Beginner"
+        assert prefetcher._slots["second"].level == "Intermediate"
+    finally:
+        prefetcher.shutdown()
+
+
+def test_topic_ids_keep_non_latin_titles_and_symbols_apart():
+    """Hindi titles and symbol-only differences get distinct topic ids."""
+    _import_backend()
+    from curriculum import topic_id
+
+    titles = ["C", "C++", "C#", "प्रकाश संश्लेषण", "गुरुत्वाकर्षण", "***", "Équations différentielles"]
+    ids = [topic_id(title) for title in titles]
+    assert all(ids) and len(set(ids)) == len(ids)
+    assert topic_id("Newton's Laws") == topic_id("newton's  laws") == "newton-s-laws"
+
+
+def test_grading_scores_students_and_questions():
+    """Text, letter and index answers are scored; unknown and missing answers count as unanswered."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import numpy as np
+
+    from grading import grade_submissions, item_statistics
+    from quiz_model import Question
+
+    questions = [Question("First?", ("a", "b", "c", "d"), 0, ""), Question("Second?", ("w", "x", "y", "z"), 2, "")]
+    result = grade_submissions(questions, [
+        {"student_id": "s1", "answers": ["a", "C"]},
+        {"student_id": "s2", "answers": [1, " Y "]},
+        {"student_id": "s3", "answers": ["neither"]},
+    ])
+    assert [student["correct"] for student in result["students"]] == [2, 1, 0]
+    assert [student["percent"] for student in result["students"]] == [100.0, 50.0, 0.0]
+    assert [question["difficulty"] for question in result["questions"]] == [0.333, 0.667]
+    assert result["questions"][0]["option_counts"] == [1, 1, 0, 0]
+    assert [question["unanswered"] for question in result["questions"]] == [1, 1]
+    assert result["summary"]["mean_percent"] == 50.0
+
+    # Strong students get the first item right; everyone gets the last one right
+    correct = np.array([[1, 1, 1], [1, 1, 1], [0, 0, 1], [0, 1, 1]], dtype=bool)
+    difficulty, discrimination = item_statistics(correct)
+    assert difficulty.tolist() == [0.5, 0.75, 1.0]
+    assert discrimination[0] > 0.5 and np.isnan(discrimination[2])
+
+
+def test_prefetcher_serves_expires_and_respects_its_budget():
+    """A finished prefetch is claimed once, a changed request cancels it, and no budget means no prefetch."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from prefetch import QuizPrefetcher, next_level
+
+    assert next_level("Beginner", 0.9) == "Intermediate"
+    assert next_level("Advanced", 0.9) == "Advanced"
+    assert next_level("Intermediate", 0.2) == "Beginner"
+    assert next_level("Intermediate", 0.6) == "Intermediate"
+
+    def generate(subject, level, num_questions, reveal):
+        return {"quiz": [], "level": level}
+
+    prefetcher = QuizPrefetcher(generate, max_per_minute=60, ttl=60)
+    try:
+        prefetcher.schedule("s1", "Physics", "Beginner", 5, True)
+        prefetcher._slots["s1"].future.result(timeout=1)
+        assert prefetcher.claim("s1", "Physics", "Beginner", 5, True).result()["level"] == "Beginner"
+        assert prefetcher.claim("s1", "Physics", "Beginner", 5, True) is None
+
+        prefetcher.schedule("s2", "Physics", "Beginner", 5, True)
+        assert prefetcher.claim("s2", "Chemistry", "Beginner", 5, True) is None
+        assert prefetcher.counters["cancelled"] == 1 and "s2" not in prefetcher._slots
+    finally:
+        prefetcher.shutdown()
+
+    expiring = QuizPrefetcher(generate, max_per_minute=60, ttl=0)
+    try:
+        expiring.schedule("s1", "Physics", "Beginner", 5, True)
+        assert expiring.claim("s1", "Physics", "Beginner", 5, True) is None
+        assert expiring.counters["expired"] == 1
+    finally:
+        expiring.shutdown()
+
+    no_budget = QuizPrefetcher(generate, max_per_minute=0)
+    no_budget.schedule("s1", "Physics", "Beginner", 5, True)
+    assert no_budget.counters["skipped"] == 1 and not no_budget._slots
+
+
+def test_translation_memory_translates_each_segment_once():
+    """Known segments come from the memory (also after a restart); failed ones are retried, not stored."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from translation import TranslationMemory, translate_segments
+
+    prompts = []
+
+    def complete(prompt):
+        prompts.append(prompt)
+        items = json.loads(prompt.split("ITEMS:", 1)[1])
+        return json.dumps([{"id": item["id"], "text": item["text"].upper()} for item in items
+                           if item["text"] != "untranslatable"])
+
+    path = os.path.join(tempfile.mkdtemp(prefix="ai-tutor-tm-"), "translations.db")
+    memory = TranslationMemory(path, cache_size=2)
+    failed = []
+    result = translate_segments(["force", "mass", "force", "42", "untranslatable"], "Loud", complete, memory, failed)
+    assert result == ["FORCE", "MASS", "FORCE", "42", "untranslatable"]
+    assert failed == ["untranslatable"] and len(prompts) == 1
+
+    assert translate_segments(["mass", "force"], "Loud", complete, memory) == ["MASS", "FORCE"]
+    assert len(prompts) == 1
+    translate_segments(["untranslatable"], "Loud", complete, memory)
+    assert len(prompts) == 2
+
+    restarted = TranslationMemory(path, cache_size=2)
+    assert translate_segments(["force", "mass"], "Loud", complete, restarted) == ["FORCE", "MASS"]
+    assert len(prompts) == 2 and restarted.hits == 2
+    assert restarted.lookup([], "Other") == {}
+
+
+def test_generation_profiles_bound_tokens_and_record_metrics():
+    """Token caps follow the request size, unknown profiles are rejected and metrics count timeouts."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import profiles
+    from profiles import QUIZ_STOP, ProfileMetrics, get_profile
+
+    assert get_profile() is profiles.PROFILES[profiles.DEFAULT_PROFILE]
+    try:
+        get_profile("turbo")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown profile accepted")
+
+    fast = get_profile("fast")
+    assert fast.quiz_params(3)["max_tokens"] == 40 + 3 * fast.tokens_per_question
+    assert fast.quiz_params(10)["max_tokens"] > fast.quiz_params(3)["max_tokens"]
+    assert fast.quiz_params(3)["stop"] == [QUIZ_STOP]
+    assert fast.translation_params(500) == {"temperature": 0, "max_tokens": 600, "timeout": fast.timeout}
+
+    metrics = ProfileMetrics()
+    usage = type("Usage", (), {"prompt_tokens": 10, "completion_tokens": 20})()
+    metrics.record("fast", "quiz", 1.0, usage=usage, finish_reason="length")
+    metrics.record("fast", "tutor", 3.0, error=TimeoutError("Request timed out"))
+    snapshot = metrics.snapshot()["fast"]
+    assert (snapshot["calls"], snapshot["errors"], snapshot["timeouts"], snapshot["truncated"]) == (2, 1, 1, 1)
+    assert snapshot["by_kind"] == {"quiz": 1, "tutor": 1}
+    assert snapshot["latency_avg"] == 2.0 and snapshot["completion_tokens"] == 20
+
+
+def test_warmup_resumes_from_its_checkpoint():
+    """Completed tasks are skipped after a restart; failed ones and stale checkpoints are run again."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from warmup import WarmupRunner, plan_from_keys
+
+    plan = plan_from_keys([("Physics", "Beginner", 5)], [("Physics", "Beginner", "What is force?", "Text-based",
+                                                           "Unknown", None)], quizzes_per_key=2)
+    assert [task["kind"] for task in plan] == ["quiz", "tutor", "quiz"]
+
+    checkpoint = os.path.join(tempfile.mkdtemp(prefix="ai-tutor-warmup-"), "checkpoint.json")
+    calls = []
+
+    def quiz(**params):
+        calls.append("quiz")
+
+    def broken_tutor(**params):
+        calls.append("tutor")
+        raise Exception("upstream down")
+
+    first = WarmupRunner({"quiz": quiz, "tutor": broken_tutor}, lambda: plan, checkpoint_path=checkpoint,
+                         max_concurrency=1, max_per_minute=0)
+    first.run()
+    assert first.stats()["completed"] == 2 and first.stats()["failed"] == 1
+
+    calls.clear()
+    second = WarmupRunner({"quiz": quiz, "tutor": lambda **params: calls.append("tutor")}, lambda: plan,
+                          checkpoint_path=checkpoint, max_concurrency=1, max_per_minute=0)
+    second.run()
+    assert calls == ["tutor"] and second.stats()["coverage"] == 1.0
+
+    calls.clear()
+    stale = WarmupRunner({"quiz": quiz, "tutor": lambda **params: calls.append("tutor")}, lambda: plan,
+                         checkpoint_path=checkpoint, max_concurrency=1, max_per_minute=0, max_age=-1)
+    stale.run()
+    assert len(calls) == 3
+
+
+def test_hot_key_sketches_estimate_within_their_bounds():
+    """Count-Min never undercounts, HyperLogLog is within a few percent, and the tracker survives a restart."""
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from hotkeys import CountMinSketch, HotKeyTracker, HyperLogLog, TopK
+
+    sketch = CountMinSketch(width=256, depth=4)
+    for i in range(2000):
+        sketch.add(f"key-{i % 200}")
+    sketch.add("hot", 500)
+    estimates = [sketch.estimate(f"key-{i}") for i in range(200)]
+    assert min(estimates) >= 10 and sum(estimates) / len(estimates) < 10 + 0.05 * sketch.total
+    assert 500 <= sketch.estimate("hot") < 520
+    restored = CountMinSketch.from_dict(sketch.to_dict())
+    assert restored.estimate("hot") == sketch.estimate("hot") and restored.total == sketch.total
+
+    distinct = HyperLogLog()
+    for i in range(20000):
+        distinct.add(f"user-{i}")
+    assert abs(distinct.count() - 20000) < 0.05 * 20000
+    assert HyperLogLog.from_dict(distinct.to_dict()).count() == distinct.count()
+
+    top = TopK(2)
+    for key, count in [("a", 5), ("b", 3), ("c", 9), ("d", 1)]:
+        top.offer(key, count)
+    assert top.most_common() == [("c", 9), ("a", 5)]
+
+    path = os.path.join(tempfile.mkdtemp(prefix="ai-tutor-hot-"), "hot_keys.json")
+    tracker = HotKeyTracker(path, top_k=5, persist_seconds=0, half_life_hours=1)
+    for _ in range(8):
+        tracker.record("quiz", ("Physics", "Beginner", 5))
+    tracker.record("quiz", ("Biology", "Beginner", 5))
+    tracker.save()
+    reloaded = HotKeyTracker(path, top_k=5, persist_seconds=0, half_life_hours=1)
+    assert reloaded.top("quiz", 1) == [(("Physics", "Beginner", 5), 8)]
+    assert reloaded.snapshot()["quiz"]["distinct_keys"] == 2
+
+    # A half-life later, counts are halved
+    reloaded.aged_at -= 3600
+    reloaded.save()
+    assert reloaded.top("quiz", 1) == [(("Physics", "Beginner", 5), 4)]
+
+
 if __name__ == "__main__":
     test_quiz_endpoint()
+    test_quiz_job_endpoint()